@@ -1,6 +1,6 @@
 export type AppLanguage = "fr" | "en";
 
-const DEFAULT_TRANSLATE_API_URL = "/api/deepl";
+const DEFAULT_TRANSLATE_API_URL = "/api/translate";
 
 const translateApiUrl = (
   import.meta.env.VITE_TRANSLATE_API_URL ?? DEFAULT_TRANSLATE_API_URL
@@ -15,6 +15,10 @@ type LibreTranslateItem = {
   translatedText?: string;
 };
 
+type BackendTranslateResponse = {
+  translations?: string[];
+};
+
 type DeepLResponse = {
   translations?: Array<{
     text?: string;
@@ -35,6 +39,10 @@ export async function translateBatch(
     return new Map();
   }
 
+  if (isBackendTranslateUrl(translateApiUrl)) {
+    return translateWithBackend(sourceTexts, sourceLanguage, targetLanguage);
+  }
+
   if (isDeepLApiUrl(translateApiUrl)) {
     return translateWithDeepL(sourceTexts, sourceLanguage, targetLanguage);
   }
@@ -42,6 +50,44 @@ export async function translateBatch(
   return translateWithLibreTranslate(sourceTexts, sourceLanguage, targetLanguage);
 }
 
+// Back Django (/translate) : mémoire de traduction côté serveur, seuls les
+// textes jamais traduits partent vers DeepL
+async function translateWithBackend(
+  sourceTexts: string[],
+  sourceLanguage: AppLanguage,
+  targetLanguage: AppLanguage,
+): Promise<Map<string, string>> {
+  const response = await fetch(translateApiUrl, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+    },
+    body: JSON.stringify({
+      texts: sourceTexts,
+      source: sourceLanguage,
+      target: targetLanguage,
+    }),
+  });
+
+  if (!response.ok) {
+    throw new Error(`Translate API error: ${response.status}`);
+  }
+
+  const body = (await response.json()) as BackendTranslateResponse;
+  const translatedTexts = body.translations ?? [];
+
+  if (translatedTexts.length !== sourceTexts.length) {
+    throw new Error("Translate API response mismatch.");
+  }
+
+  const translatedBySource = new Map<string, string>();
+  sourceTexts.forEach((sourceText, index) => {
+    translatedBySource.set(sourceText, decodeHtmlEntities(translatedTexts[index] ?? sourceText));
+  });
+
+  return translatedBySource;
+}
+
 async function translateWithDeepL(
   sourceTexts: string[],
   sourceLanguage: AppLanguage,
@@ -141,6 +187,10 @@ async function translateWithLibreTranslate(
   return translatedBySource;
 }
 
+function isBackendTranslateUrl(url: string): boolean {
+  return url.startsWith("/api/translate");
+}
+
 function isDeepLApiUrl(url: string): boolean {
   if (url.startsWith("/api/deepl")) {
     return true;
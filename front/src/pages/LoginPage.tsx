@@ -42,7 +42,8 @@ export default function LoginPage() {
     }
 
     if (response.ok) {
-      return payload.name;
+      const body = (await response.json()) as { token: string };
+      return { name: payload.name, token: body.token };
     }
 
     const body = (await response.json().catch(() => null)) as
@@ -107,8 +108,9 @@ export default function LoginPage() {
               setIsSubmitting(true);
 
               try {
-                const connectedName = await submitLogin();
-                sessionStorage.setItem("auth_name", connectedName);
+                const session = await submitLogin();
+                sessionStorage.setItem("auth_name", session.name);
+                sessionStorage.setItem("auth_token", session.token);
                 setSuccessMessage(t("Connexion validee."));
                 navigateTo("/profil");
               } catch (error) {
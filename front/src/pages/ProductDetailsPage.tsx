@@ -28,6 +28,8 @@ type ApiProduct = {
   price: string | number;
   card_image?: string | null;
   stock_count?: number | null;
+  description?: string;
+  images?: { url: string; is_card: boolean }[];
 };
 
 export default function ProductDetailsPage({ productId }: ProductDetailsPageProps) {
@@ -218,9 +220,11 @@ function normalizeApiProduct(row: ApiProduct): Product {
     sports: row.sports,
     levels: row.levels,
     name: row.name,
-    description: fallback?.description ?? "",
+    description: row.description || fallback?.description || "",
     price: Number.isFinite(parsedPrice) ? parsedPrice : fallback?.price ?? 0,
-    images: fallback?.images ?? (row.card_image ? [row.card_image] : []),
+    images: row.images?.length
+      ? row.images.map((image) => image.url)
+      : fallback?.images ?? (row.card_image ? [row.card_image] : []),
     stockCount:
       typeof row.stock_count === "number" && Number.isFinite(row.stock_count)
         ? row.stock_count
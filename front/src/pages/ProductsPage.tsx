@@ -224,41 +224,34 @@ export default function ProductsPage() {
     latestRequestIdRef.current = requestId;
 
     const fetchFilteredProducts = async () => {
-      const levelsToQuery = selectedLevels.length > 0 ? selectedLevels : [null];
-
       try {
-        const requests = levelsToQuery.map(async (level) => {
-          const params = new URLSearchParams();
-          if (selectedSport !== "ALL") {
-            params.set("sport", selectedSport);
-          }
-          if (level) {
-            params.set("level", level);
-          }
-          if (debouncedMinPrice > minProductPrice) {
-            params.set("minPrice", String(debouncedMinPrice));
-          }
-          if (debouncedMaxPrice < maxProductPrice) {
-            params.set("maxPrice", String(debouncedMaxPrice));
-          }
-
-          const url = params.toString() ? `/api/products?${params.toString()}` : "/api/products";
-          const response = await fetch(url);
-
-          if (!response.ok) {
-            throw new Error("products");
-          }
-
-          return (await response.json()) as ApiProduct[];
-        });
-
-        const resolved = await Promise.all(requests);
+        const params = new URLSearchParams();
+        if (selectedSport !== "ALL") {
+          params.set("sport", selectedSport);
+        }
+        for (const level of selectedLevels) {
+          params.append("level", level);
+        }
+        if (debouncedMinPrice > minProductPrice) {
+          params.set("minPrice", String(debouncedMinPrice));
+        }
+        if (debouncedMaxPrice < maxProductPrice) {
+          params.set("maxPrice", String(debouncedMaxPrice));
+        }
+
+        const url = params.toString() ? `/api/products?${params.toString()}` : "/api/products";
+        const response = await fetch(url);
+
+        if (!response.ok) {
+          throw new Error("products");
+        }
+
+        const payload = (await response.json()) as ApiProduct[];
         if (requestId !== latestRequestIdRef.current) {
           return;
         }
 
-        const merged = resolved.flat();
-        const normalized = normalizeApiProducts(merged);
+        const normalized = normalizeApiProducts(payload);
         setApiProducts(normalized);
         if (
           selectedSport === "ALL" &&
@@ -871,7 +864,10 @@ function normalizeApiProducts(rows: ApiProduct[]): Product[] {
       name: row.name,
       description: fallback?.description ?? "",
       price: Number.isFinite(parsedPrice) ? parsedPrice : fallback?.price ?? 0,
-      images: fallback?.images ?? (row.card_image ? [row.card_image] : []),
+      // Variante redimensionnée servie par le back (/images/...) : préférée aux images pleine taille
+      images: row.card_image?.startsWith("/images/")
+        ? [`/api${row.card_image}`]
+        : fallback?.images ?? (row.card_image ? [row.card_image] : []),
       stockCount:
         typeof row.stock_count === "number" && Number.isFinite(row.stock_count)
           ? row.stock_count
@@ -27,6 +27,12 @@ const fallbackSports = [
   "TENNIS",
 ];
 
+// Jeton delivre par /login, verifie par le back sur les routes /user
+const authHeaders = (): Record<string, string> => {
+  const token = sessionStorage.getItem("auth_token") ?? "";
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
+
 export default function ProfilePage() {
   const { t } = useLanguage();
   const [user, setUser] = useState<ApiUser | null>(null);
@@ -52,7 +58,9 @@ export default function ProfilePage() {
       }
 
       try {
-        const response = await fetch(`/api/user/:name?name=${encodeURIComponent(connectedName)}`);
+        const response = await fetch(`/api/user/:name?name=${encodeURIComponent(connectedName)}`, {
+          headers: authHeaders(),
+        });
         if (!response.ok) {
           throw new Error("user");
         }
@@ -142,6 +150,7 @@ export default function ProfilePage() {
         method: "PUT",
         headers: {
           "Content-Type": "application/json",
+          ...authHeaders(),
         },
         body: JSON.stringify(payload),
       });
@@ -1,7 +1,9 @@
 from django.contrib import admin
 
-from equipements.models import User
+from equipements.models import Store, User
 
 # Register your models here.
 admin.site.register(User)
+# Coordonnées des magasins (recherche des magasins proches)
+admin.site.register(Store)
 
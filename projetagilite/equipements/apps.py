@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class EquipementsConfig(AppConfig):
     name = 'equipements'
+
+    def ready(self):
+        from equipements import signals  # noqa: F401
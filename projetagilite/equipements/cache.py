@@ -0,0 +1,125 @@
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+
+def cache_key(product_id, lang=None):
+    if lang is None or lang == settings.CATALOG_SOURCE_LANGUAGE:
+        return product_id
+    return (product_id, lang)
+
+def detail_key(product_id, lang=None):
+    # Fiche complète du produit (equipements/detail.py)
+    return ("detail", product_id, lang or settings.CATALOG_SOURCE_LANGUAGE)
+
+def product_keys(product_id):
+    # Clés de toutes les langues d'un produit, lignes de liste et fiches
+    return [
+        key for lang in settings.CATALOG_LANGUAGES
+        for key in (cache_key(product_id, lang), detail_key(product_id, lang))
+    ]
+
+class CatalogCache:
+    # Cache LRU en mémoire (par processus) des lignes produit déjà sérialisées,
+    # indexées par id (langue source) ou par (id, langue), cf. cache_key(),
+    # et des fiches produit (detail_key()). L'invalidation est faite par les signaux de
+    # equipements/signals.py à chaque écriture sur le catalogue ; les écritures
+    # faites ailleurs (autre processus, import en masse) sont détectées par
+    # sync() via CatalogVersion.
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._rows = OrderedDict()
+        self._lock = Lock()
+        # Incrémenté à chaque invalidation : une ligne chargée pendant une
+        # écriture concurrente n'est pas mise en cache (elle peut être périmée).
+        self._generation = 0
+        # Dernière version du catalogue vue, et écritures de ce processus depuis
+        self._version = None
+        self._local_writes = 0
+
+    def get_many(self, product_ids, loader):
+        # Renvoie les lignes dans l'ordre de product_ids. Les absents sont
+        # chargés en un seul appel à loader(ids manquants) -> {id: ligne} ;
+        # un id que loader ne renvoie pas (produit inexistant) est ignoré.
+        found = {}
+        with self._lock:
+            for product_id in product_ids:
+                row = self._rows.get(product_id)
+                if row is not None:
+                    self._rows.move_to_end(product_id)
+                    found[product_id] = row
+            self.hits += len(found)
+            self.misses += len(product_ids) - len(found)
+            generation = self._generation
+
+        missing = [product_id for product_id in product_ids if product_id not in found]
+        if missing:
+            loaded = loader(missing)
+            self.set_many(loaded, generation)
+            found.update(loaded)
+        return [found[product_id] for product_id in product_ids if product_id in found]
+
+    def set_many(self, rows, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            for product_id, row in rows.items():
+                self._rows[product_id] = row
+                self._rows.move_to_end(product_id)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+    def invalidate(self, product_id):
+        # Appelé pour chaque écriture locale, qui incrémente aussi CatalogVersion
+        with self._lock:
+            for key in product_keys(product_id):
+                self._rows.pop(key, None)
+            self._generation += 1
+            self._local_writes += 1
+
+    def invalidate_many(self, product_ids):
+        # Écriture en masse locale accompagnée d'un seul CatalogVersion.bump()
+        with self._lock:
+            for product_id in product_ids:
+                for key in product_keys(product_id):
+                    self._rows.pop(key, None)
+            self._generation += 1
+            self._local_writes += 1
+
+    def record_write(self):
+        # Écriture locale sans ligne en cache concernée (magasins), accompagnée
+        # d'un CatalogVersion.bump() : ne doit pas passer pour une écriture d'un autre processus
+        with self._lock:
+            self._local_writes += 1
+
+    def sync(self, version):
+        # Si la version a avancé plus que nos propres écritures, un autre
+        # processus a modifié le catalogue : le cache entier est périmé.
+        with self._lock:
+            if self._version is None or version != self._version + self._local_writes:
+                self._rows.clear()
+                self._generation += 1
+            self._version = version
+            self._local_writes = 0
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+            self._generation += 1
+            self._version = None
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._rows),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+catalog_cache = CatalogCache(getattr(settings, "CATALOG_CACHE_SIZE", 10000))
@@ -0,0 +1,108 @@
+import gzip
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # dépendance optionnelle : gzip seul sans elle
+    brotli = None
+
+class CompressedResponses:
+    # Corps de réponses catalogue déjà compressés (gzip, brotli), par processus,
+    # indexés par (version du catalogue, langue, chemin, paramètres). La
+    # compression n'est faite qu'une fois par version ; un changement de
+    # version vide le cache. LRU borné en octets.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._version = None
+        self._lock = Lock()
+
+    def get(self, version, key):
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._size = 0
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, version, key, entry):
+        size = sum(len(body) for body in entry["bodies"].values())
+        with self._lock:
+            if version != self._version or size > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous["size"]
+            self._entries[key] = {**entry, "size": size}
+            self._size += size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted["size"]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._version = None
+
+compressed_responses = CompressedResponses(getattr(settings, "COMPRESSED_RESPONSES_MAX_BYTES", 64 * 1024 * 1024))
+
+def compress(content):
+    bodies = {"identity": content}
+    if len(content) >= settings.COMPRESSION_MIN_SIZE:
+        bodies["gzip"] = gzip.compress(content, settings.GZIP_LEVEL, mtime=0)
+        if brotli is not None:
+            bodies["br"] = brotli.compress(content, quality=settings.BROTLI_QUALITY)
+    return bodies
+
+def accepted_encodings(header):
+    # Accept-Encoding: "br;q=1.0, gzip" -> {"br", "gzip"} (q=0 exclu)
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        if not name.strip():
+            continue
+        params = params.strip()
+        weight = params[2:] if params.startswith("q=") else "1"
+        try:
+            if float(weight) > 0:
+                accepted.add(name.strip().lower())
+        except ValueError:
+            continue
+    return accepted
+
+def precompressed(view):
+    # À placer sous catalog_condition (request.catalog_version et catalog_lang
+    # déjà connus, 304 traités avant). Seules les réponses 200 sont gardées.
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        version = request.catalog_version
+        key = (request.catalog_lang, request.path, tuple((name, tuple(values)) for name, values in sorted(request.GET.lists())))
+        entry = compressed_responses.get(version, key)
+        if entry is None:
+            response = await view(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            entry = {"content_type": response["Content-Type"], "bodies": await sync_to_async(compress)(response.content)}
+            compressed_responses.set(version, key, entry)
+
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        encoding = next((name for name in ("br", "gzip") if name in entry["bodies"] and name in accepted), "identity")
+        response = HttpResponse(entry["bodies"][encoding], content_type=entry["content_type"])
+        if encoding != "identity":
+            response["Content-Encoding"] = encoding
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+    return inner
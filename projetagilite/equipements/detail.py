@@ -0,0 +1,109 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from equipements.cache import catalog_cache, detail_key
+from equipements.images import card_image_url, variant_url_expression
+from equipements.models import (
+    LEVEL_BITS,
+    SPORT_BITS,
+    Product,
+    ProductFeatures,
+    ProductImages,
+    ProductStoreStock,
+    ProductTranslation,
+)
+from equipements.translation import source_digest
+
+# Colonnes de Product renvoyées par la fiche produit
+DETAIL_FIELDS = (
+    "id", "sku", "name", "description", "category", "brand", "price", "rating", "review_count",
+    "warranty_months", "delivery_days", "in_stock", "stock_count", "sports_mask", "levels_mask",
+)
+
+def mask_values(mask, bits):
+    # Sports / niveaux relus depuis les masques dénormalisés (pas de jointure),
+    # triés comme dans les listes
+    return sorted(value for value, bit in bits.items() if mask & bit)
+
+def grouped(rows):
+    groups = defaultdict(list)
+    for product_id, *values in rows:
+        groups[product_id].append(values[0] if len(values) == 1 else values)
+    return groups
+
+def product_details(product_ids, lang=None):
+    # Fiches complètes en 4 requêtes, quel que soit le nombre de produits et de
+    # lignes liées : produits (et traductions), caractéristiques, images, stock
+    # par magasin. -> {detail_key: fiche}, produits inexistants absents
+    products = Product.objects.filter(pk__in=product_ids).annotate(card_image_url=card_image_url())
+    translated = lang is not None and lang != settings.CATALOG_SOURCE_LANGUAGE
+    if translated:
+        translations = ProductTranslation.objects.filter(product=OuterRef("pk"), lang=lang)
+        products = products.annotate(
+            translated_name=Subquery(translations.values("name")),
+            translated_description=Subquery(translations.values("description")),
+            translated_features=Subquery(translations.values("features")),
+            translated_source_digest=Subquery(translations.values("source_digest")),
+        )
+    rows = list(products.values(*DETAIL_FIELDS, "card_image_url", *(
+        ("translated_name", "translated_description", "translated_features", "translated_source_digest")
+        if translated else ()
+    )))
+    if not rows:
+        return {}
+
+    product_ids = [row["id"] for row in rows]
+    features = grouped(
+        ProductFeatures.objects.filter(product_id__in=product_ids)
+        .order_by("product_id", "position")
+        .values_list("product_id", "feature")
+    )
+    # URLs des variantes redimensionnées lues avec les images (NULL si pas encore construites)
+    variants = list(settings.IMAGE_VARIANTS)
+    images = grouped(
+        ProductImages.objects.filter(product_id__in=product_ids)
+        .order_by("product_id", "position")
+        .values_list("product_id", "image_url", "is_card", *(
+            variant_url_expression(OuterRef("image_url"), variant) for variant in variants
+        ))
+    )
+    store_stock = grouped(
+        ProductStoreStock.objects.filter(product_id__in=product_ids)
+        .order_by("product_id", "store")
+        .values_list("product_id", "store_id", "stock")
+    )
+
+    details = {}
+    for row in rows:
+        product_id = row["id"]
+        product_features = features[product_id]
+        if translated:
+            translation = [row.pop(field) for field in (
+                "translated_name", "translated_description", "translated_features", "translated_source_digest")]
+            # Traduction périmée (champs source modifiés depuis translate_catalog) : langue source
+            if translation[3] == source_digest(row["name"], row["description"], product_features):
+                row["name"], row["description"], product_features = translation[:3]
+        row["card_image"] = row.pop("card_image_url")
+        row["price"] = str(row["price"])
+        row["sports"] = mask_values(row.pop("sports_mask"), SPORT_BITS)
+        row["levels"] = mask_values(row.pop("levels_mask"), LEVEL_BITS)
+        details[detail_key(product_id, lang)] = {
+            **row,
+            "features": product_features,
+            "images": [
+                {"url": url, "is_card": is_card, "variants": {
+                    variant: variant_url for variant, variant_url in zip(variants, variant_urls) if variant_url
+                }}
+                for url, is_card, *variant_urls in images[product_id]
+            ],
+            "store_stock": [{"store_name": name, "stock": stock} for name, stock in store_stock[product_id]],
+        }
+    return details
+
+def cached_product_details(product_ids, lang=None):
+    # Même cache (et mêmes invalidations) que les lignes de liste : une
+    # écriture sur le produit ou une de ses tables liées retire sa fiche.
+    load = lambda missing: product_details([product_id for _, product_id, _ in missing], lang)
+    return catalog_cache.get_many([detail_key(product_id, lang) for product_id in product_ids], load)
@@ -0,0 +1,108 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, router
+
+from equipements.cache import CatalogCache
+from equipements.models import LEVEL_BITS, SPORT_BITS, Product
+
+# Résultats par (version du catalogue et sa date, filtres) : une écriture
+# change la version, les entrées périmées ne sont plus lues et sortent du LRU.
+facet_cache = CatalogCache(getattr(settings, "FACET_CACHE_SIZE", 256))
+CENT = Decimal("0.01")
+
+def wanted_bits(bits, values):
+    wanted = 0
+    for value in values:
+        wanted |= bits.get(value.upper(), 0)
+    return wanted
+
+def quantize_price(value):
+    # Même forme que le prix des produits ("12.50")
+    return None if value is None else Decimal(str(value)).quantize(CENT)
+
+def price_groups(minPrice, maxPrice):
+    # Une seule requête : produits regroupés par (masques, tranche de prix,
+    # dans le filtre de prix ?), quelques centaines de groupes au plus dont
+    # découlent toutes les facettes. Le GROUP BY interne suit l'ordre de
+    # l'index couvrant product_filter_idx (pas de tri sur tout le catalogue).
+    edges = settings.FACET_PRICE_BUCKETS
+    connection = connections[router.db_for_read(Product)]
+    table = connection.ops.quote_name(Product._meta.db_table)
+    params = []
+    bucket = "CASE"
+    for i in range(len(edges) - 1):
+        bucket += " WHEN price < %s THEN %s"
+        params += [edges[i + 1], i]
+    bucket += " ELSE %s END"
+    params.append(len(edges) - 1)
+    in_price = []
+    if minPrice is not None:
+        in_price.append("price >= %s")
+        params.append(minPrice)
+    if maxPrice is not None:
+        in_price.append("price <= %s")
+        params.append(maxPrice)
+    sql = (
+        f"SELECT sports_mask, levels_mask, {bucket}, {' AND '.join(in_price) or '1'}, SUM(n), MIN(price), MAX(price) "
+        f"FROM (SELECT sports_mask, levels_mask, price, COUNT(*) AS n FROM {table} "
+        f"GROUP BY sports_mask, levels_mask, price) GROUP BY 1, 2, 3, 4"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+def compute_facets(sport=None, level=None, minPrice=None, maxPrice=None):
+    # Facettes "disjonctives" : les comptes d'une dimension ignorent son propre
+    # filtre (mais pas les autres), pour afficher les autres choix possibles.
+    sport_bits = wanted_bits(SPORT_BITS, sport or [])
+    level_bits = wanted_bits(LEVEL_BITS, level or [])
+    edges = settings.FACET_PRICE_BUCKETS
+
+    total = 0
+    sports = dict.fromkeys(SPORT_BITS, 0)
+    levels = dict.fromkeys(LEVEL_BITS, 0)
+    buckets = [0] * len(edges)
+    low = high = None
+    for sports_mask, levels_mask, bucket, in_price, count, group_low, group_high in price_groups(minPrice, maxPrice):
+        sport_ok = not sport or sports_mask & sport_bits
+        level_ok = not level or levels_mask & level_bits
+        if sport_ok and level_ok and in_price:
+            total += count
+        if level_ok and in_price:
+            for value, bit in SPORT_BITS.items():
+                if sports_mask & bit:
+                    sports[value] += count
+        if sport_ok and in_price:
+            for value, bit in LEVEL_BITS.items():
+                if levels_mask & bit:
+                    levels[value] += count
+        if sport_ok and level_ok:
+            buckets[bucket] += count
+            low = group_low if low is None else min(low, group_low)
+            high = group_high if high is None else max(high, group_high)
+
+    return {
+        "total": total,
+        "sports": sports,
+        "levels": levels,
+        "price": {
+            "min": quantize_price(low),
+            "max": quantize_price(high),
+            "buckets": [
+                {"min": edge, "max": edges[i + 1] if i + 1 < len(edges) else None, "count": buckets[i]}
+                for i, edge in enumerate(edges)
+            ],
+        },
+    }
+
+def cached_facets(version, sport=None, level=None, minPrice=None, maxPrice=None):
+    key = (
+        version,
+        tuple(sorted(value.upper() for value in sport or [])),
+        tuple(sorted(value.upper() for value in level or [])),
+        minPrice,
+        maxPrice,
+    )
+    loader = lambda keys: {key: compute_facets(sport, level, minPrice, maxPrice)}
+    return facet_cache.get_many([key], loader)[0]
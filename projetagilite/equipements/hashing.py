@@ -0,0 +1,22 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+# Pool borné dédié au hachage des mots de passe (PBKDF2, coûteux en CPU mais
+# hors GIL) : les handlers async attendent le résultat sans bloquer la boucle,
+# et une rafale de /login n'occupe jamais plus de PASSWORD_HASHING_WORKERS threads.
+executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASHING_WORKERS,
+    thread_name_prefix="password-hashing",
+)
+
+async def run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+async def check_password(password, encoded):
+    return await run(hashers.check_password, password, encoded)
+
+async def make_password(password):
+    return await run(hashers.make_password, password)
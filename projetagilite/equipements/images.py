@@ -0,0 +1,166 @@
+import hashlib
+import os
+import tempfile
+from io import BytesIO
+from pathlib import Path
+from urllib.error import URLError
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.db.models import CharField, F, Func, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from equipements.cache import catalog_cache
+from equipements.models import CatalogVersion, ImageVariant, Product, ProductImages
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # dépendance optionnelle : images d'origine seules sans elle
+    Image = None
+
+# Les fichiers ne changent jamais sous une même empreinte : servis avec un cache
+# navigateur d'un an (immutable)
+VARIANT_URL = "/images/:digest?digest="
+VARIANT_CONTENT_TYPE = "image/webp"
+
+class ImageVariantError(Exception):
+    pass
+
+def variant_url(digest):
+    return f"{VARIANT_URL}{digest}"
+
+def variant_path(digest):
+    return Path(settings.IMAGE_CACHE_DIR) / digest[:2] / f"{digest}.webp"
+
+def variant_digest(source_url, variant):
+    return Subquery(ImageVariant.objects.filter(source_url=source_url, variant=variant).values("digest")[:1])
+
+def variant_url_expression(source_url, variant):
+    # URL de la variante calculée en SQL, NULL si elle n'existe pas encore
+    return Func(
+        Value(VARIANT_URL), variant_digest(source_url, variant),
+        template="(%(expressions)s)", arg_joiner=" || ", output_field=CharField(),
+    )
+
+def card_image_url():
+    # Vignette "card" de Product.card_image si elle est construite, image
+    # d'origine sinon ; lue dans la même requête que le produit
+    return Coalesce(variant_url_expression(OuterRef("card_image"), "card"), F("card_image"), output_field=CharField())
+
+def read_source(url):
+    # URL http(s), ou chemin relatif à IMAGE_SOURCE_ROOT (images importées)
+    limit = settings.IMAGE_MAX_SOURCE_BYTES
+    try:
+        if url.startswith(("http://", "https://")):
+            with urlopen(url, timeout=settings.IMAGE_FETCH_TIMEOUT) as response:
+                data = response.read(limit + 1)
+        else:
+            root = Path(settings.IMAGE_SOURCE_ROOT).resolve()
+            path = (root / url.lstrip("/")).resolve()
+            if not path.is_relative_to(root):
+                raise ImageVariantError(f"{url} : chemin hors de IMAGE_SOURCE_ROOT")
+            with open(path, "rb") as source:
+                data = source.read(limit + 1)
+    except (URLError, OSError, ValueError) as exc:
+        raise ImageVariantError(f"{url} : {exc}") from exc
+    if len(data) > limit:
+        raise ImageVariantError(f"{url} : plus de {limit} octets")
+    return data
+
+def decode(data):
+    if Image is None:
+        raise ImageVariantError("Pillow n'est pas installé")
+    try:
+        image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        raise ImageVariantError(f"image illisible : {exc}") from exc
+    return image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+def render(image, max_side):
+    # Réduction seulement (jamais d'agrandissement), proportions gardées
+    variant = image.copy()
+    variant.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    variant.save(buffer, "WEBP", quality=settings.IMAGE_VARIANT_QUALITY, method=4)
+    return buffer.getvalue(), variant.size
+
+def store(content):
+    # Nom = empreinte du contenu : un fichier déjà présent n'est pas réécrit
+    digest = hashlib.sha256(content).hexdigest()
+    path = variant_path(digest)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Écriture atomique : un fichier servi est toujours complet
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            file.write(content)
+        os.replace(tmp, path)
+    return digest
+
+def build_variants(url, variants=None):
+    # Variantes d'une image (toutes par défaut), la source lue et décodée une
+    # seule fois -> {variante: empreinte}
+    image = decode(read_source(url))
+    rows = []
+    for name in variants or settings.IMAGE_VARIANTS:
+        content, (width, height) = render(image, settings.IMAGE_VARIANTS[name])
+        rows.append(ImageVariant(
+            source_url=url, variant=name, digest=store(content), width=width, height=height, size=len(content),
+        ))
+    ImageVariant.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["source_url", "variant"],
+        update_fields=["digest", "width", "height", "size", "created_at"],
+    )
+    return {row.variant: row.digest for row in rows}
+
+def catalog_image_urls():
+    cards = Product.objects.exclude(card_image=None).exclude(card_image="").values_list("card_image", flat=True)
+    return set(cards) | set(ProductImages.objects.values_list("image_url", flat=True))
+
+def build_catalog_variants(force=False):
+    # Images du catalogue sans toutes leurs variantes sur disque (toutes si
+    # force). Une image illisible est ignorée -> (images traitées, erreurs)
+    urls = catalog_image_urls()
+    if not force:
+        built = {}
+        for url, digest in ImageVariant.objects.filter(variant__in=list(settings.IMAGE_VARIANTS)).values_list(
+                "source_url", "digest"):
+            # Fichier absent (cache vidé, autre machine) : reconstruit
+            if variant_path(digest).exists():
+                built[url] = built.get(url, 0) + 1
+        urls = {url for url in urls if built.get(url, 0) < len(settings.IMAGE_VARIANTS)}
+    done, errors = [], []
+    for url in sorted(urls):
+        try:
+            build_variants(url)
+            done.append(url)
+        except ImageVariantError as exc:
+            errors.append(str(exc))
+    if done:
+        catalog_cache.clear()
+        CatalogVersion.bump()
+    return len(done), errors
+
+# Les requêtes GET ne font que lire : construction et publication des
+# variantes (nouvelle version du catalogue) par build_image_variants seulement
+
+def find_variant_url(source_url, variant):
+    # -> URL de la variante, l'image d'origine si elle n'est pas encore
+    # construite, None si l'image n'est pas du catalogue (pas de redirection arbitraire)
+    digest = ImageVariant.objects.filter(source_url=source_url, variant=variant).values_list("digest", flat=True).first()
+    if digest is not None:
+        return variant_url(digest)
+    if (Product.objects.filter(card_image=source_url).exists()
+            or ProductImages.objects.filter(image_url=source_url).exists()):
+        return source_url
+    return None
+
+def read_variant(digest):
+    # -> contenu du fichier, None s'il n'est pas (ou plus) sur disque
+    try:
+        with open(variant_path(digest), "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
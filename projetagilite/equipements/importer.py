@@ -0,0 +1,311 @@
+import csv
+import json
+import uuid
+
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from equipements.cache import catalog_cache
+from equipements.recommendations import rebuild_recommendations
+from equipements.models import (
+    LEVEL_BITS,
+    SPORT_BITS,
+    CatalogVersion,
+    Product,
+    ProductFeatures,
+    ProductImages,
+    ProductLevels,
+    ProductSports,
+    ProductStoreStock,
+    Sport,
+    SportLevel,
+)
+
+PRODUCT_FIELDS = [
+    "sku", "name", "description", "category", "brand", "price", "rating", "review_count",
+    "warranty_months", "delivery_days", "in_stock", "stock_count", "card_image",
+]
+CHILD_MODELS = [ProductSports, ProductLevels, ProductFeatures, ProductImages, ProductStoreStock]
+
+# Colonnes écrites, clé de conflit et colonnes mises à jour en cas de conflit
+TABLES = {
+    Product: (["id", *PRODUCT_FIELDS, "sports_mask", "levels_mask"], ["id"], PRODUCT_FIELDS),
+    ProductSports: (["product_id", "sport"], ["product_id", "sport"], []),
+    ProductLevels: (["product_id", "level"], ["product_id", "level"], []),
+    ProductFeatures: (["product_id", "position", "feature"], ["product_id", "position"], ["feature"]),
+    ProductImages: (["product_id", "position", "image_url", "is_card"], ["product_id", "position"], ["image_url", "is_card"]),
+    ProductStoreStock: (["product_id", "store_name", "stock"], ["product_id", "store_name"], ["stock"]),
+}
+FIXTURE_MODELS = {f"equipements.{model._meta.model_name}": model for model in [Product, *CHILD_MODELS]}
+
+# Séparateurs des colonnes multi-valeurs en CSV : "BEGINNER|EXPERT", "Lille:3|Paris:0"
+CSV_LIST_SEPARATOR = "|"
+CSV_STOCK_SEPARATOR = ":"
+
+class CatalogImportError(ValueError):
+    pass
+
+# --- Lecture en flux -------------------------------------------------------
+
+def iter_ndjson(stream):
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise CatalogImportError(f"ligne {line_number} : {exc}") from exc
+
+def iter_json_array(stream, chunk_size=1 << 16):
+    # Décode un tableau JSON élément par élément, sans charger tout le fichier
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+    started = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            if buffer[position] == "," and not started:
+                raise CatalogImportError("JSON invalide : ',' inattendue")
+            position += 1
+        if position >= len(buffer):
+            if eof:
+                raise CatalogImportError("JSON invalide : tableau non terminé")
+            fill()
+            continue
+        if not started:
+            if buffer[position] != "[":
+                raise CatalogImportError("JSON invalide : un tableau d'objets est attendu")
+            started = True
+            position += 1
+            continue
+        if buffer[position] == "]":
+            return
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as exc:
+            if eof:
+                raise CatalogImportError(f"JSON invalide : {exc}") from exc
+            fill()
+            continue
+        position = end
+        yield record
+
+def iter_csv(stream):
+    for row in csv.DictReader(stream):
+        record = {key: value for key, value in row.items() if value not in (None, "")}
+        for key in ("sports", "levels", "features", "images"):
+            if key in record:
+                record[key] = record[key].split(CSV_LIST_SEPARATOR)
+        if "store_stock" in record:
+            record["store_stock"] = dict(
+                item.rsplit(CSV_STOCK_SEPARATOR, 1)
+                for item in record["store_stock"].split(CSV_LIST_SEPARATOR)
+            )
+        yield record
+
+READERS = {"json": iter_json_array, "ndjson": iter_ndjson, "csv": iter_csv}
+
+# --- Conversion des enregistrements en tuples de colonnes ---------------------
+# Pas d'instance de modèle : à 100k+ produits, leur construction par l'ORM
+# coûte plus cher que l'écriture elle-même.
+
+def truthy(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "oui", "yes")
+    return bool(value)
+
+# Conversion (to_python) et validateurs (prix >= 0, ...) de chaque colonne, comme
+# Product.objects.create ; card_image peut être un chemin relatif, il n'est pas validé.
+CONVERTERS = [
+    (field.name, field.get_default(), field.to_python, field.validators if field.name != "card_image" else [])
+    for field in (Product._meta.get_field(name) for name in PRODUCT_FIELDS)
+]
+SPORTS = frozenset(Sport.values)
+LEVELS = frozenset(SportLevel.values)
+
+def product_row(product_id, fields):
+    product_id = str(product_id or uuid.uuid4())
+    row = [product_id]
+    for name, default, to_python, validators in CONVERTERS:
+        value = fields.get(name, default)
+        try:
+            value = to_python(truthy(value) if name == "in_stock" else value)
+            for validator in validators:
+                validator(value)
+        except ValidationError as exc:
+            raise CatalogImportError(f"produit {product_id}, {name} : {exc.messages}") from exc
+        row.append(value)
+    # Masques recalculés après écriture des sports / niveaux (refresh_masks)
+    return (*row, 0, 0)
+
+def choice(value, choices, product_id):
+    value = str(value).upper()
+    if value not in choices:
+        raise CatalogImportError(f"produit {product_id} : valeur inconnue {value!r}")
+    return value
+
+def image_rows(product_id, images, card_image):
+    rows = []
+    for position, image in enumerate(images, start=1):
+        if isinstance(image, str):
+            image = {"image_url": image, "is_card": image == card_image}
+        rows.append((product_id, position, image["image_url"], truthy(image.get("is_card", False))))
+    return rows
+
+def store_stock_rows(product_id, store_stock):
+    if isinstance(store_stock, dict):
+        store_stock = [{"store_name": name, "stock": stock} for name, stock in store_stock.items()]
+    return [(product_id, row["store_name"], int(row["stock"])) for row in store_stock]
+
+def product_record(record):
+    # Enregistrement "imbriqué" : un produit et toutes ses tables liées
+    product = product_row(record.get("id"), record)
+    product_id = product[0]
+    children = {
+        ProductSports: [(product_id, choice(sport, SPORTS, product_id)) for sport in record.get("sports", [])],
+        ProductLevels: [(product_id, choice(level, LEVELS, product_id)) for level in record.get("levels", [])],
+        ProductFeatures: [
+            (product_id, position, feature)
+            for position, feature in enumerate(record.get("features", []), start=1)
+        ],
+        ProductImages: image_rows(product_id, record.get("images", []), record.get("card_image")),
+        ProductStoreStock: store_stock_rows(product_id, record.get("store_stock", [])),
+    }
+    return product, children
+
+def fixture_record(record):
+    # Ligne au format `dumpdata` (cf. dumpdjango.json) : (modèle, tuple),
+    # ou None si le modèle ne fait pas partie du catalogue.
+    model = FIXTURE_MODELS.get(record["model"])
+    if model is None:
+        return None
+    if model is Product:
+        return Product, product_row(record["pk"], record["fields"])
+    fields = dict(record["fields"], product_id=record["fields"]["product"])
+    if "store" in fields:
+        # ProductStoreStock exporté depuis la clé étrangère vers Store
+        fields["store_name"] = fields["store"]
+    columns, _, _ = TABLES[model]
+    return model, tuple(fields[column] for column in columns)
+
+# --- Écriture par lots -------------------------------------------------------
+
+def upsert_sql(model):
+    # INSERT ... ON CONFLICT (SQLite >= 3.24) préparé une fois par table
+    quote = connection.ops.quote_name
+    columns, conflict, update = TABLES[model]
+    if update:
+        action = "DO UPDATE SET " + ", ".join(f"{quote(c)} = excluded.{quote(c)}" for c in update)
+    else:
+        action = "DO NOTHING"
+    return (
+        f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(quote(c) for c in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({', '.join(quote(c) for c in conflict)}) {action}"
+    )
+
+def delete_children(cursor, product_ids):
+    # DELETE direct : QuerySet.delete() déclencherait un signal par ligne
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    for model in CHILD_MODELS:
+        table = connection.ops.quote_name(model._meta.db_table)
+        cursor.execute(f"DELETE FROM {table} WHERE product_id IN ({placeholders})", product_ids)
+
+def mask_of(model, field, bits):
+    # Somme des bits des lignes du produit (= OU binaire, la clé primaire les rend uniques)
+    bit = Case(*[When(**{field: value}, then=Value(b)) for value, b in bits.items()], default=Value(0))
+    masks = (
+        model.objects.filter(product=OuterRef("pk"))
+        .values("product")
+        .annotate(mask=Sum(bit))
+        .values("mask")
+    )
+    return Coalesce(Subquery(masks, output_field=IntegerField()), Value(0))
+
+def refresh_masks(product_ids):
+    # Un seul UPDATE ensembliste pour tout le lot
+    Product.objects.filter(pk__in=product_ids).update(
+        sports_mask=mask_of(ProductSports, "sport", SPORT_BITS),
+        levels_mask=mask_of(ProductLevels, "level", LEVEL_BITS),
+    )
+
+class CatalogImporter:
+    # Accumule les enregistrements et les écrit par lots de batch_size,
+    # chaque lot dans sa propre transaction (mémoire constante).
+
+    def __init__(self, batch_size=500, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.imported = 0
+        self.skipped = 0
+        self.statements = {model: upsert_sql(model) for model in TABLES}
+        self._reset()
+
+    def _reset(self):
+        self.rows = {model: [] for model in TABLES}
+        self.replaced = []
+        self.touched = set()
+        self.pending = 0
+
+    def add(self, record):
+        if "model" in record:
+            parsed = fixture_record(record)
+            if parsed is None:
+                self.skipped += 1
+                return
+            model, row = parsed
+            self.rows[model].append(row)
+            self.touched.add(row[0])
+        else:
+            product, children = product_record(record)
+            self.rows[Product].append(product)
+            self.replaced.append(product[0])
+            self.touched.add(product[0])
+            for model, rows in children.items():
+                self.rows[model].extend(rows)
+        self.pending += 1
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        # Tables liées écrites avant les produits (clés étrangères vérifiées au
+        # commit) : un nouveau produit est alors indexé pour la recherche une
+        # seule fois, avec ses caractéristiques (cf. migration 0006).
+        with transaction.atomic(), connection.cursor() as cursor:
+            if self.replaced:
+                delete_children(cursor, self.replaced)
+            for model in CHILD_MODELS:
+                if self.rows[model]:
+                    cursor.executemany(self.statements[model], self.rows[model])
+            if self.rows[Product]:
+                cursor.executemany(self.statements[Product], self.rows[Product])
+            refresh_masks(list(self.touched))
+        self.imported += self.pending
+        if self.progress:
+            self.progress(self.imported)
+        self._reset()
+
+    def run(self, records):
+        try:
+            for record in records:
+                self.add(record)
+            self.flush()
+        finally:
+            # Les écritures en masse n'envoient pas de signaux : invalidation
+            # globale, même si un enregistrement invalide arrête l'import après
+            # des lots déjà validés
+            if self.imported:
+                CatalogVersion.bump()
+                catalog_cache.clear()
+                rebuild_recommendations()
+        return self.imported
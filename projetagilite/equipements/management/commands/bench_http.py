@@ -0,0 +1,118 @@
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Client:
+    # Client HTTP/1.1 minimal (keep-alive), une connexion par client simulé
+    def __init__(self, host, port, headers=""):
+        self.host = host
+        self.port = port
+        self.headers = headers
+        self.reader = self.writer = None
+
+    async def request(self, method, target, body=b""):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(
+            f"{method} {target} HTTP/1.1\r\nHost: {self.host}\r\n{self.headers}"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure débit et latences (p50 / p99) d'un serveur lancé à part (WSGI ou ASGI, "
+        "cf. README) sous N clients concurrents."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="ex: http://127.0.0.1:8000/products?limit=20")
+        parser.add_argument("--method", default="GET")
+        parser.add_argument("--data", default="", help="Corps JSON (POST / PUT)")
+        parser.add_argument("--header", action="append", default=[], help='En-tête "Nom: valeur" (répétable)')
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--warmup", type=int, default=50)
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme != "http" or not url.hostname:
+            raise CommandError("URL http:// attendue")
+        if options["data"]:
+            try:
+                json.loads(options["data"])
+            except ValueError as exc:
+                raise CommandError(f"--data n'est pas du JSON valide : {exc}") from exc
+        if any(":" not in header for header in options["header"]):
+            raise CommandError('--header attendu sous la forme "Nom: valeur"')
+        options["headers"] = "".join(f"{header.strip()}\r\n" for header in options["header"])
+        try:
+            latencies, errors, elapsed = asyncio.run(self.run(
+                url.hostname, url.port or 80, url.path + (f"?{url.query}" if url.query else ""),
+                options["method"].upper(), options["data"].encode(), options,
+            ))
+        except OSError as exc:
+            raise CommandError(f"Serveur injoignable : {exc}") from exc
+        if len(latencies) < 2:
+            raise CommandError("Pas assez de réponses pour calculer des percentiles")
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{len(latencies)} requêtes, {options['concurrency']} clients : "
+            f"{len(latencies) / elapsed:.0f} req/s, p50 {percentiles[49]:.1f} ms, "
+            f"p99 {percentiles[98]:.1f} ms, max {max(latencies):.1f} ms, {errors} erreurs"
+        )
+
+    async def run(self, host, port, target, method, body, options):
+        latencies = []
+        errors = 0
+        remaining = options["requests"]
+
+        async def worker():
+            nonlocal errors, remaining
+            client = Client(host, port, options["headers"])
+            try:
+                while remaining > 0:
+                    remaining -= 1
+                    start = time.perf_counter()
+                    try:
+                        status = await client.request(method, target, body)
+                    except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                        await client.close()
+                        status = None
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    if status is None or status >= 500:
+                        errors += 1
+            finally:
+                await client.close()
+
+        # Préchauffage (connexions, caches) non mesuré
+        warmup = Client(host, port, options["headers"])
+        for _ in range(options["warmup"]):
+            await warmup.request(method, target, body)
+        await warmup.close()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(options["concurrency"])))
+        return latencies, errors, time.perf_counter() - start
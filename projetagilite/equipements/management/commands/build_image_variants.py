@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from equipements.images import Image, build_catalog_variants
+
+
+class Command(BaseCommand):
+    help = (
+        "Construit les variantes redimensionnées (IMAGE_VARIANTS) des images du catalogue dans IMAGE_CACHE_DIR. "
+        "Seules les images sans toutes leurs variantes sont traitées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Reconstruit aussi les variantes existantes")
+
+    def handle(self, *args, **options):
+        if Image is None:
+            raise CommandError("Pillow n'est pas installé (uv run --with pillow ...)")
+        start = time.monotonic()
+        built, errors = build_catalog_variants(options["force"])
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"{built} images traitées, {len(errors)} en erreur, en {time.monotonic() - start:.2f}s"
+        ))
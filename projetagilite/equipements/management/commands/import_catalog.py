@@ -0,0 +1,47 @@
+import sys
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from equipements.importer import READERS, CatalogImportError, CatalogImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe (upsert) le catalogue depuis un fichier JSON, NDJSON ou CSV, en flux et par lots. "
+        "Accepte des produits imbriqués (sports, levels, features, images, store_stock) "
+        "ou des lignes au format dumpdata (ex: dumpdjango.json)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Fichier à importer, '-' pour l'entrée standard")
+        parser.add_argument("--format", choices=sorted(READERS), help="Déduit de l'extension par défaut")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or Path(path).suffix.lstrip(".").lower()
+        if fmt not in READERS:
+            raise CommandError(f"Format inconnu '{fmt}', utiliser --format ({', '.join(sorted(READERS))})")
+
+        start = time.monotonic()
+
+        def progress(count):
+            elapsed = time.monotonic() - start
+            self.stdout.write(f"{count} enregistrements importés ({count / max(elapsed, 1e-6):.0f}/s)")
+
+        importer = CatalogImporter(batch_size=options["batch_size"], progress=progress)
+        stream = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+        try:
+            importer.run(READERS[fmt](stream))
+        except (CatalogImportError, KeyError, TypeError) as exc:
+            raise CommandError(f"Import interrompu après {importer.imported} enregistrements : {exc!r}") from exc
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{importer.imported} enregistrements importés en {time.monotonic() - start:.2f}s "
+            f"({importer.skipped} ignorés)"
+        ))
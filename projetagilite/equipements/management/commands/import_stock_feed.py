@@ -0,0 +1,53 @@
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from equipements.importer import READERS, CatalogImportError
+from equipements.stock import StockFeedError, apply_stock_updates, parse_update, recompute_stock_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Applique un flux de stock magasin (JSON, NDJSON ou CSV : product_id, store_name, "
+        "stock ou delta) par lots transactionnels, en maintenant Product.stock_count / in_stock."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="Flux à appliquer")
+        parser.add_argument("--format", choices=sorted(READERS), help="Déduit de l'extension par défaut")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--recompute", action="store_true",
+            help="Recalcule stock_count / in_stock depuis les stocks magasin (après le flux éventuel)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if path is None and not options["recompute"]:
+            raise CommandError("Indiquer un fichier et/ou --recompute")
+
+        if path is not None:
+            fmt = options["format"] or Path(path).suffix.lstrip(".").lower()
+            if fmt not in READERS:
+                raise CommandError(f"Format inconnu '{fmt}', utiliser --format ({', '.join(sorted(READERS))})")
+            start = time.monotonic()
+            applied, unknown = 0, set()
+            with open(path, encoding="utf-8", newline="") as stream:
+                records = READERS[fmt](stream)
+                try:
+                    while batch := [parse_update(record) for record in islice(records, options["batch_size"])]:
+                        result = apply_stock_updates(batch)
+                        applied += result["updated"]
+                        unknown.update(result["unknown_products"])
+                        self.stdout.write(f"{applied} lignes de stock mises à jour")
+                except (CatalogImportError, StockFeedError) as exc:
+                    raise CommandError(f"Flux interrompu après {applied} lignes : {exc}") from exc
+            if unknown:
+                self.stderr.write(f"Produits inconnus ignorés : {', '.join(sorted(unknown))}")
+            self.stdout.write(self.style.SUCCESS(f"{applied} lignes de stock en {time.monotonic() - start:.2f}s"))
+
+        if options["recompute"]:
+            recompute_stock_counts()
+            self.stdout.write(self.style.SUCCESS("stock_count / in_stock recalculés"))
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from equipements.importer import READERS, CatalogImportError
+from equipements.stores import import_stores
+
+
+class Command(BaseCommand):
+    help = (
+        "Crée ou met à jour les magasins et leurs coordonnées (JSON, NDJSON ou CSV : name, latitude, longitude), "
+        "utilisées par /products/:product_id/stores."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=sorted(READERS), help="Déduit de l'extension par défaut")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or Path(options["path"]).suffix.lstrip(".").lower()
+        if fmt not in READERS:
+            raise CommandError(f"Format inconnu '{fmt}', utiliser --format ({', '.join(sorted(READERS))})")
+        with open(options["path"], encoding="utf-8", newline="") as stream:
+            try:
+                imported = import_stores(READERS[fmt](stream))
+            except CatalogImportError as exc:
+                raise CommandError(str(exc)) from exc
+        self.stdout.write(self.style.SUCCESS(f"{imported} magasins importés"))
@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from equipements.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index plein texte des produits (/products/search), par exemple après un VACUUM."
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Index de recherche reconstruit en {time.monotonic() - start:.2f}s"))
@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from equipements.translation import TranslationBackendError, translate_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Traduit les noms, descriptions et caractéristiques des produits dans les langues du catalogue "
+        "(ProductTranslation). Seuls les produits nouveaux ou modifiés depuis le dernier passage sont traduits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lang", action="append",
+            help="Langue cible (répétable), par défaut toutes les langues de CATALOG_LANGUAGES hors langue source",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        languages = options["lang"] or [
+            lang for lang in settings.CATALOG_LANGUAGES if lang != settings.CATALOG_SOURCE_LANGUAGE
+        ]
+        for lang in languages:
+            if lang not in settings.CATALOG_LANGUAGES or lang == settings.CATALOG_SOURCE_LANGUAGE:
+                raise CommandError(f"Langue '{lang}' absente de CATALOG_LANGUAGES ou langue source")
+            start = time.monotonic()
+            try:
+                translated = translate_catalog(lang, options["batch_size"])
+            except TranslationBackendError as exc:
+                raise CommandError(f"Traduction '{lang}' interrompue : {exc}") from exc
+            self.stdout.write(self.style.SUCCESS(
+                f"{lang} : {translated} produits traduits en {time.monotonic() - start:.2f}s"
+            ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from equipements.cache import catalog_cache
+from equipements.detail import cached_product_details
+from equipements.models import CatalogVersion, Product
+from equipements.views import CACHE_LOAD_BATCH, cached_products_to_response
+
+
+def warm_catalog_cache():
+    catalog_cache.sync(CatalogVersion.current()[0])
+    count = len(cached_products_to_response(Product.objects.order_by("id")))
+    # Fiches produit, par lots (4 requêtes chacun)
+    product_ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+    for start in range(0, len(product_ids), CACHE_LOAD_BATCH):
+        cached_product_details(product_ids[start:start + CACHE_LOAD_BATCH])
+    return count
+
+
+class Command(BaseCommand):
+    help = "Pré-charge le cache catalogue (a lancer dans le processus serveur, cf. wsgi.py)."
+
+    def handle(self, *args, **options):
+        count = warm_catalog_cache()
+        self.stdout.write(self.style.SUCCESS(f"{count} produits en cache {catalog_cache.stats()}"))
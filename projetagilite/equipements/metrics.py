@@ -0,0 +1,230 @@
+import json
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+from threading import Lock, local
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+# Métriques exposées : nom -> (type, aide, bornes des histogrammes)
+METRICS = {
+    "http_requests_total": ("counter", "Requêtes HTTP traitées", None),
+    "http_request_duration_seconds": (
+        "histogram", "Durée de traitement des requêtes HTTP",
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ),
+    "http_response_size_bytes": (
+        "histogram", "Taille du corps des réponses HTTP",
+        (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000),
+    ),
+    "db_queries_total": ("counter", "Requêtes SQL exécutées pendant les requêtes HTTP", None),
+    "db_query_duration_seconds_total": ("counter", "Temps passé dans les requêtes SQL", None),
+}
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+class Metrics:
+    # Compteurs du processus, un jeu par thread : chaque thread n'écrit que dans
+    # le sien (pas de verrou sur le chemin des requêtes), la lecture les additionne.
+    # Clés : (nom, labels, indice de tranche pour un histogramme sinon None).
+
+    def __init__(self):
+        self._local = local()
+        self._shards = []
+        self._lock = Lock()
+
+    def shard(self):
+        shard = getattr(self._local, "values", None)
+        if shard is None:
+            shard = self._local.values = defaultdict(float)
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, labels, value=1):
+        self.shard()[name, labels, None] += value
+
+    def observe(self, name, labels, value):
+        shard = self.shard()
+        shard[name, labels, bisect_left(METRICS[name][2], value)] += 1
+        shard[name, labels, "sum"] += value
+
+    def snapshot(self):
+        with self._lock:
+            shards = list(self._shards)
+        totals = defaultdict(float)
+        for shard in shards:
+            # copy() est atomique : pas de parcours d'un dict modifié en même temps
+            for key, value in shard.copy().items():
+                totals[key] += value
+        return totals
+
+    def clear(self):
+        with self._lock:
+            for shard in self._shards:
+                shard.clear()
+
+metrics = Metrics()
+
+# --- Plusieurs processus (gunicorn -w N) -------------------------------------
+# Avec METRICS_DIR, chaque processus y écrit régulièrement ses compteurs (un
+# fichier par processus) et /metrics additionne tous les fichiers. Vider le
+# répertoire au démarrage du serveur.
+
+def process_file():
+    # Nom lu à chaque écriture, pas à l'import : avec gunicorn --preload, les
+    # workers sont forkés après l'import de ce module, chacun a son pid
+    return f"{os.getpid()}.json"
+
+last_flush = 0.0
+flush_lock = Lock()
+
+def flush(force=False):
+    global last_flush
+    directory = settings.METRICS_DIR
+    now = time.monotonic()
+    if not directory or (not force and now - last_flush < settings.METRICS_FLUSH_INTERVAL):
+        return
+    # Une seule écriture à la fois ; les autres threads n'attendent pas
+    if not flush_lock.acquire(blocking=False):
+        return
+    try:
+        last_flush = now
+        rows = [[name, labels, bucket, value] for (name, labels, bucket), value in metrics.snapshot().items()]
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(rows, file)
+        os.replace(tmp, Path(directory) / process_file())
+    finally:
+        flush_lock.release()
+
+def collect():
+    # Compteurs de tous les processus (METRICS_DIR), sinon de ce processus
+    if not settings.METRICS_DIR:
+        return metrics.snapshot()
+    flush(force=True)
+    totals = defaultdict(float)
+    for path in Path(settings.METRICS_DIR).glob("*.json"):
+        try:
+            rows = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue  # fichier supprimé entre-temps
+        for name, labels, bucket, value in rows:
+            totals[name, tuple(tuple(label) for label in labels), bucket] += value
+    return totals
+
+# --- Format texte Prometheus ---------------------------------------------------
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_labels(labels):
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}" if labels else ""
+
+def format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+def render(totals):
+    series = defaultdict(lambda: defaultdict(dict))
+    for (name, labels, bucket), value in totals.items():
+        series[name][labels][bucket] = value
+    lines = []
+    for name, (kind, help_text, edges) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for labels, values in sorted(series[name].items()):
+            if kind == "counter":
+                lines.append(f"{name}{format_labels(labels)} {format_value(values[None])}")
+                continue
+            # Tranches stockées séparément, cumulées ici
+            cumulative = 0
+            for i, edge in enumerate([*edges, "+Inf"]):
+                cumulative += values.get(i, 0)
+                lines.append(f"{name}_bucket{format_labels((*labels, ('le', edge)))} {format_value(cumulative)}")
+            lines.append(f"{name}_sum{format_labels(labels)} {format_value(values.get('sum', 0))}")
+            lines.append(f"{name}_count{format_labels(labels)} {format_value(cumulative)}")
+    return "\n".join(lines) + "\n"
+
+# --- Mesure des requêtes ----------------------------------------------------
+
+# [nombre de requêtes SQL, secondes] de la requête HTTP en cours ; le contexte
+# suit les appels sync_to_async, donc les threads où s'exécute l'ORM
+current_queries = ContextVar("current_queries", default=None)
+
+def time_query(execute, sql, params, many, context):
+    stats = current_queries.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - start
+
+def install(connection):
+    # Branché en permanence sur chaque connexion (pas d'aller-retour de
+    # thread par requête HTTP comme avec connection.execute_wrapper())
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, time_query)
+
+@receiver(connection_created)
+def install_on_new_connection(sender, connection, **kwargs):
+    install(connection)
+
+def route_of(request):
+    # Gabarit de la route ("/products/:product_id") : nombre de séries borné
+    match = request.resolver_match
+    return "unmatched" if match is None else f"/{match.route}"
+
+class MetricsMiddleware:
+    # Mesure chaque requête HTTP (durée, taille de la réponse, requêtes SQL et
+    # leur durée) par méthode et route, exposées par /metrics
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        return self.record(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        return self.record(request, response, stats, start)
+
+    def start(self):
+        stats = [0, 0.0]
+        return stats, current_queries.set(stats), time.perf_counter()
+
+    def record(self, request, response, stats, start):
+        labels = (("method", request.method), ("route", route_of(request)))
+        metrics.inc("http_requests_total", (*labels, ("status", str(response.status_code))))
+        metrics.observe("http_request_duration_seconds", labels, time.perf_counter() - start)
+        if not response.streaming:
+            metrics.observe("http_response_size_bytes", labels, len(response.content))
+        metrics.inc("db_queries_total", labels, stats[0])
+        metrics.inc("db_query_duration_seconds_total", labels, stats[1])
+        flush()
+        return response
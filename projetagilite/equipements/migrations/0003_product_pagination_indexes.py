@@ -0,0 +1,27 @@
+# Generated by Django 6.1.2 on 2026-10-18 11:10
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipements', '0002_alter_productsports_product'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='stock_count',
+            field=models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['rating', 'id'], name='product_rating_id_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.1.2 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+
+# Copie figée de SPORT_BITS / LEVEL_BITS (equipements/models.py) au moment de la migration
+SPORTS = ["BADMINTON", "BASKETBALL", "YOGA", "NATATION", "MUSCULATION",
+          "CYCLISME", "FOOTBALL", "RANDONNEE", "RUNNING", "TENNIS"]
+LEVELS = ["BEGINNER", "AVERAGE", "EXPERT"]
+
+
+def backfill_masks(apps, schema_editor):
+    Product = apps.get_model("equipements", "Product")
+    ProductSports = apps.get_model("equipements", "ProductSports")
+    ProductLevels = apps.get_model("equipements", "ProductLevels")
+
+    masks = {}
+    for model, values, field in (
+        (ProductSports, SPORTS, "sport"),
+        (ProductLevels, LEVELS, "level"),
+    ):
+        bits = {value: 1 << i for i, value in enumerate(values)}
+        for product_id, value in model.objects.values_list("product_id", field).iterator():
+            sports_mask, levels_mask = masks.get(product_id, (0, 0))
+            if field == "sport":
+                sports_mask |= bits.get(value, 0)
+            else:
+                levels_mask |= bits.get(value, 0)
+            masks[product_id] = (sports_mask, levels_mask)
+
+    products = [
+        Product(id=product_id, sports_mask=sports_mask, levels_mask=levels_mask)
+        for product_id, (sports_mask, levels_mask) in masks.items()
+    ]
+    Product.objects.bulk_update(products, ["sports_mask", "levels_mask"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipements', '0004_catalogversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='levels_mask',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='sports_mask',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['sports_mask', 'levels_mask', 'price'], name='product_filter_idx'),
+        ),
+        migrations.RunPython(backfill_masks, migrations.RunPython.noop),
+    ]
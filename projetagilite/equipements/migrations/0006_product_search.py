@@ -0,0 +1,85 @@
+from django.db import migrations
+
+
+# Index plein texte des produits (FTS5). rowid = rowid du produit, pour que
+# les triggers mettent l'index à jour sans le parcourir ; product_id sert à la
+# jointure. Tenu à jour par triggers, donc aussi pour les imports en SQL brut.
+INDEX_PRODUCT = """
+    INSERT INTO equipements_product_search (rowid, product_id, name, brand, category, description, features)
+    SELECT p.rowid, p.id, p.name, p.brand, p.category, p.description,
+           (SELECT group_concat(f.feature, ' ') FROM equipements_productfeatures f WHERE f.product_id = p.id)
+    FROM equipements_product p WHERE p.id = {product_id};
+"""
+UNINDEX_PRODUCT = """
+    DELETE FROM equipements_product_search
+    WHERE rowid = (SELECT rowid FROM equipements_product WHERE id = {product_id});
+"""
+
+FORWARD = [
+    """
+    CREATE VIRTUAL TABLE equipements_product_search USING fts5(
+        product_id UNINDEXED, name, brand, category, description, features,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER equipements_product_search_ai AFTER INSERT ON equipements_product BEGIN
+        {INDEX_PRODUCT.format(product_id="NEW.id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER equipements_product_search_au
+    AFTER UPDATE OF name, brand, category, description ON equipements_product BEGIN
+        DELETE FROM equipements_product_search WHERE rowid = OLD.rowid;
+        {INDEX_PRODUCT.format(product_id="NEW.id")}
+    END
+    """,
+    """
+    CREATE TRIGGER equipements_product_search_ad AFTER DELETE ON equipements_product BEGIN
+        DELETE FROM equipements_product_search WHERE rowid = OLD.rowid;
+    END
+    """,
+    f"""
+    CREATE TRIGGER equipements_productfeatures_search_ai AFTER INSERT ON equipements_productfeatures BEGIN
+        {UNINDEX_PRODUCT.format(product_id="NEW.product_id")}
+        {INDEX_PRODUCT.format(product_id="NEW.product_id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER equipements_productfeatures_search_au AFTER UPDATE ON equipements_productfeatures BEGIN
+        {UNINDEX_PRODUCT.format(product_id="OLD.product_id")}
+        {INDEX_PRODUCT.format(product_id="OLD.product_id")}
+        {UNINDEX_PRODUCT.format(product_id="NEW.product_id")}
+        {INDEX_PRODUCT.format(product_id="NEW.product_id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER equipements_productfeatures_search_ad AFTER DELETE ON equipements_productfeatures BEGIN
+        {UNINDEX_PRODUCT.format(product_id="OLD.product_id")}
+        {INDEX_PRODUCT.format(product_id="OLD.product_id")}
+    END
+    """,
+    # Indexation des produits existants
+    INDEX_PRODUCT.replace("WHERE p.id = {product_id}", ""),
+]
+
+BACKWARD = [
+    "DROP TRIGGER IF EXISTS equipements_productfeatures_search_ad",
+    "DROP TRIGGER IF EXISTS equipements_productfeatures_search_au",
+    "DROP TRIGGER IF EXISTS equipements_productfeatures_search_ai",
+    "DROP TRIGGER IF EXISTS equipements_product_search_ad",
+    "DROP TRIGGER IF EXISTS equipements_product_search_au",
+    "DROP TRIGGER IF EXISTS equipements_product_search_ai",
+    "DROP TABLE IF EXISTS equipements_product_search",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipements', '0005_product_sport_level_masks'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD, BACKWARD),
+    ]
@@ -0,0 +1,48 @@
+import unicodedata
+
+from django.db import migrations, models
+
+
+def backfill_username_normalized(apps, schema_editor):
+    User = apps.get_model("equipements", "User")
+    # Par lots d'ids croissants : SQLite n'isole pas une lecture en cours des
+    # écritures faites sur la même connexion.
+    last_id = 0
+    while batch := list(User.objects.filter(id__gt=last_id).order_by("id").only("id", "username")[:2000]):
+        for user in batch:
+            # Copie de equipements.models.normalize_username au moment de la migration
+            user.username_normalized = unicodedata.normalize("NFKC", user.username.strip()).casefold()
+        User.objects.bulk_update(batch, ["username_normalized"])
+        last_id = batch[-1].id
+
+    conflicts = list(
+        User.objects.values("username_normalized")
+        .annotate(count=models.Count("id"))
+        .filter(count__gt=1)
+        .values_list("username_normalized", flat=True)[:10]
+    )
+    if conflicts:
+        raise RuntimeError(
+            f"Noms d'utilisateur en double une fois normalisés, à renommer avant migration : {conflicts}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipements', '0006_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='username_normalized',
+            field=models.CharField(editable=False, max_length=150, null=True),
+        ),
+        migrations.RunPython(backfill_username_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='user',
+            name='username_normalized',
+            field=models.CharField(editable=False, max_length=150, unique=True),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Copie figée de SPORT_BITS / LEVEL_BITS (equipements/models.py) et de
+# RECOMMENDATIONS_TOP_K au moment de la migration
+SPORTS = ["BADMINTON", "BASKETBALL", "YOGA", "NATATION", "MUSCULATION",
+          "CYCLISME", "FOOTBALL", "RANDONNEE", "RUNNING", "TENNIS"]
+LEVELS = ["BEGINNER", "AVERAGE", "EXPERT"]
+TOP_K = 20
+
+
+def with_bit(values, i):
+    return [mask for mask in range(1, 1 << len(values)) if mask & (1 << i)]
+
+
+def backfill_recommendations(apps, schema_editor):
+    Product = apps.get_model("equipements", "Product")
+    Recommendation = apps.get_model("equipements", "Recommendation")
+    for sport in [None, *range(len(SPORTS))]:
+        for level in range(len(LEVELS)):
+            products = Product.objects.filter(levels_mask__in=with_bit(LEVELS, level))
+            if sport is not None:
+                products = products.filter(sports_mask__in=with_bit(SPORTS, sport))
+            rows = products.order_by("-rating", "-review_count", "id").values_list("id", "rating", "review_count")
+            Recommendation.objects.bulk_create(
+                Recommendation(sport="" if sport is None else SPORTS[sport], level=LEVELS[level],
+                               product_id=product_id, rating=rating, review_count=review_count)
+                for product_id, rating, review_count in rows[:TOP_K]
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipements', '0007_user_username_normalized'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('pk', models.CompositePrimaryKey('sport', 'level', 'product_id', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('sport', models.CharField(blank=True, max_length=50)),
+                ('level', models.CharField(max_length=10)),
+                ('rating', models.FloatField()),
+                ('review_count', models.IntegerField()),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='equipements.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['sport', 'level', '-rating', '-review_count', 'product'], name='recommendation_rank_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_recommendations, migrations.RunPython.noop),
+    ]
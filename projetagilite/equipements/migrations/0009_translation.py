@@ -0,0 +1,26 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipements', '0008_recommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Translation',
+            fields=[
+                ('pk', models.CompositePrimaryKey('source', 'target', 'digest', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('source', models.CharField(max_length=5)),
+                ('target', models.CharField(max_length=5)),
+                ('digest', models.CharField(max_length=64)),
+                ('text', models.TextField()),
+                ('translation', models.TextField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipements', '0009_translation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTranslation',
+            fields=[
+                ('pk', models.CompositePrimaryKey('product_id', 'lang', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('lang', models.CharField(max_length=5)),
+                ('name', models.TextField()),
+                ('description', models.TextField()),
+                ('features', models.JSONField(default=list)),
+                ('source_digest', models.CharField(max_length=64)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='translations', to='equipements.product')),
+            ],
+        ),
+    ]
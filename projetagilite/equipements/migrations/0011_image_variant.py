@@ -0,0 +1,30 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipements', '0010_product_translation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariant',
+            fields=[
+                ('pk', models.CompositePrimaryKey('source_url', 'variant', blank=True, editable=False, primary_key=True, serialize=False)),
+                ('source_url', models.TextField()),
+                ('variant', models.CharField(max_length=20)),
+                ('digest', models.CharField(max_length=64)),
+                ('width', models.IntegerField()),
+                ('height', models.IntegerField()),
+                ('size', models.IntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['digest'], name='image_variant_digest_idx')],
+            },
+        ),
+    ]
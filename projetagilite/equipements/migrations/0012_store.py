@@ -0,0 +1,61 @@
+# Generated by Django 6.1.2 on 2026-10-18 12:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_stores(apps, schema_editor):
+    # Un magasin (sans coordonnées) par nom déjà présent dans les stocks
+    ProductStoreStock = apps.get_model("equipements", "ProductStoreStock")
+    Store = apps.get_model("equipements", "Store")
+    names = ProductStoreStock.objects.values_list("store_name", flat=True).distinct()
+    Store.objects.bulk_create([Store(name=name) for name in names], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipements', '0011_image_variant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Store',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_stores, migrations.RunPython.noop),
+        # store_name devient une clé étrangère vers Store sur la même colonne :
+        # seul l'état des modèles change, pas la table
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='productstorestock',
+                    name='pk',
+                    field=models.CompositePrimaryKey('product_id', 'store_id', blank=True, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterUniqueTogether(
+                    name='productstorestock',
+                    unique_together=set(),
+                ),
+                migrations.RemoveField(
+                    model_name='productstorestock',
+                    name='store_name',
+                ),
+                migrations.AddField(
+                    model_name='productstorestock',
+                    name='store',
+                    field=models.ForeignKey(db_column='store_name', db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='stock', to='equipements.store'),
+                    preserve_default=False,
+                ),
+                migrations.AlterUniqueTogether(
+                    name='productstorestock',
+                    unique_together={('product', 'store')},
+                ),
+            ],
+        ),
+    ]
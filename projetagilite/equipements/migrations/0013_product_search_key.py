@@ -0,0 +1,55 @@
+from importlib import import_module
+
+from django.db import migrations
+
+
+# Index de recherche indexé par une clé entière fixe par produit
+# (equipements_product_search_key) au lieu du rowid de equipements_product,
+# renuméroté par VACUUM et par les reconstructions de la table. Les triggers
+# sont recréés par le signal post_migrate (cf. equipements/search.py).
+FORWARD = [
+    "DROP TRIGGER IF EXISTS equipements_productfeatures_search_ad",
+    "DROP TRIGGER IF EXISTS equipements_productfeatures_search_au",
+    "DROP TRIGGER IF EXISTS equipements_productfeatures_search_ai",
+    "DROP TRIGGER IF EXISTS equipements_product_search_ad",
+    "DROP TRIGGER IF EXISTS equipements_product_search_au",
+    "DROP TRIGGER IF EXISTS equipements_product_search_ai",
+    """
+    CREATE TABLE equipements_product_search_key (
+        id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+        product_id text NOT NULL UNIQUE
+    )
+    """,
+    "INSERT INTO equipements_product_search_key (product_id) SELECT id FROM equipements_product ORDER BY id",
+    "DELETE FROM equipements_product_search",
+    """
+    INSERT INTO equipements_product_search (rowid, product_id, name, brand, category, description, features)
+    SELECT k.id, p.id, p.name, p.brand, p.category, p.description,
+           (SELECT group_concat(f.feature, ' ') FROM equipements_productfeatures f WHERE f.product_id = p.id)
+    FROM equipements_product p JOIN equipements_product_search_key k ON k.product_id = p.id
+    """,
+]
+
+BACKWARD = [
+    "DROP TRIGGER IF EXISTS equipements_productfeatures_search_ad",
+    "DROP TRIGGER IF EXISTS equipements_productfeatures_search_au",
+    "DROP TRIGGER IF EXISTS equipements_productfeatures_search_ai",
+    "DROP TRIGGER IF EXISTS equipements_product_search_ad",
+    "DROP TRIGGER IF EXISTS equipements_product_search_au",
+    "DROP TRIGGER IF EXISTS equipements_product_search_ai",
+    "DROP TABLE IF EXISTS equipements_product_search_key",
+    "DELETE FROM equipements_product_search",
+    # Triggers et index par rowid de la migration 0006
+    *import_module("equipements.migrations.0006_product_search").FORWARD[1:],
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipements', '0012_store'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD, BACKWARD),
+    ]
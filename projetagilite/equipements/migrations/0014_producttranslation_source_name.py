@@ -0,0 +1,39 @@
+# Generated by Django 6.1.2 on 2026-10-18 13:17
+
+import hashlib
+import json
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def fill_source_name(apps, schema_editor):
+    # Nom source des traductions encore à jour (même empreinte que
+    # equipements.translation.source_digest) ; les autres restent périmées
+    ProductTranslation = apps.get_model('equipements', 'ProductTranslation')
+    ProductFeatures = apps.get_model('equipements', 'ProductFeatures')
+    features = defaultdict(list)
+    for product_id, feature in ProductFeatures.objects.order_by('product_id', 'position').values_list('product_id', 'feature'):
+        features[product_id].append(feature)
+    for translation in ProductTranslation.objects.select_related('product'):
+        product = translation.product
+        fields = [product.name, product.description, features[product.pk]]
+        if translation.source_digest == hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode()).hexdigest():
+            translation.source_name = product.name
+            translation.save(update_fields=['source_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipements', '0013_product_search_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producttranslation',
+            name='source_name',
+            field=models.TextField(default=''),
+        ),
+        migrations.RunPython(fill_source_name, migrations.RunPython.noop),
+    ]
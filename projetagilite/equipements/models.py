@@ -2,6 +2,9 @@ from django.db import models
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
+from django.db.models import F
+from django.utils import timezone
+import unicodedata
 import uuid
 
 class Sport(models.TextChoices):
@@ -21,6 +24,19 @@ class SportLevel(models.TextChoices):
     AVERAGE = "AVERAGE", "Intermédiaire"
     EXPERT = "EXPERT", "Expert"
 
+# Bit de chaque sport / niveau dans Product.sports_mask / levels_mask.
+# Ne jamais réordonner les choix : ajouter les nouvelles valeurs à la fin.
+SPORT_BITS = {sport: 1 << i for i, sport in enumerate(Sport.values)}
+LEVEL_BITS = {level: 1 << i for i, level in enumerate(SportLevel.values)}
+
+def masks_matching(bits, values):
+    # Toutes les valeurs de masque ayant au moins un bit demandé : le filtre
+    # devient un IN (...) servi par l'index, au lieu d'un calcul par ligne.
+    wanted = 0
+    for value in values:
+        wanted |= bits.get(value.upper(), 0)
+    return [mask for mask in range(1, 1 << len(bits)) if mask & wanted]
+
 class Product(models.Model):
     id = models.TextField(primary_key=True)  # Auto-incrementing ID as primary key
     sku = models.CharField(max_length=50)
@@ -41,6 +57,18 @@ class Product(models.Model):
     in_stock = models.BooleanField(default=False)  # Representing 0,1 as Boolean
     stock_count = models.IntegerField(default=0, validators=[MinValueValidator(0)])
     card_image = models.URLField(blank=True, null=True)
+    # Dénormalisation de ProductSports / ProductLevels (cf. equipements/signals.py)
+    sports_mask = models.IntegerField(default=0)
+    levels_mask = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Filtres sport / niveau / prix de /products
+            models.Index(fields=["sports_mask", "levels_mask", "price"], name="product_filter_idx"),
+            # Pagination par curseur sur /products (cf. equipements/pagination.py)
+            models.Index(fields=["price", "id"], name="product_price_id_idx"),
+            models.Index(fields=["rating", "id"], name="product_rating_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -48,6 +76,13 @@ class Product(models.Model):
     def save(self, *args, **kwargs):
         if not self.id:
             self.id = str(uuid.uuid4())  # Use UUID if no ID provided
+        # Les masques sont maintenus en base par les signaux : une instance
+        # chargée avant un ajout de sport ne doit pas les écraser.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ("sports_mask", "levels_mask")
+            ]
         super().save(*args, **kwargs)
 
 class ProductSports(models.Model):
@@ -85,14 +120,128 @@ class ProductImages(models.Model):
     class Meta:
         unique_together = (('product', 'position'),)
 
+class Store(models.Model):
+    # Magasin, identifié par le nom utilisé dans les flux de stock. Sans
+    # coordonnées, il n'apparait pas dans la recherche des magasins proches
+    # (cf. equipements/stores.py).
+    name = models.CharField(max_length=100, primary_key=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
 class ProductStoreStock(models.Model):
-    pk = models.CompositePrimaryKey("product_id", "store_name")            
+    pk = models.CompositePrimaryKey("product_id", "store_id")
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="store_stock")
-    store_name = models.CharField(max_length=100)
+    # Colonne store_name inchangée. Sans contrainte : l'import et le flux de
+    # stock écrivent des lignes pour des magasins pas encore déclarés.
+    store = models.ForeignKey(
+        Store, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False, db_column="store_name",
+        related_name="stock",
+    )
     stock = models.IntegerField()
 
     class Meta:
-        unique_together = (('product', 'store_name'),)
+        unique_together = (('product', 'store'),)
+
+class ProductTranslation(models.Model):
+    # Champs du produit traduits dans une langue du catalogue (hors langue
+    # source), remplis par la commande translate_catalog
+    pk = models.CompositePrimaryKey("product_id", "lang")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="translations")
+    lang = models.CharField(max_length=5)
+    name = models.TextField()
+    description = models.TextField()
+    # Traductions de ProductFeatures.feature, dans l'ordre des positions
+    features = models.JSONField(default=list)
+    # Empreinte des champs source traduits : la traduction est refaite s'ils
+    # changent, et la fiche produit n'est servie traduite que si elle correspond
+    source_digest = models.CharField(max_length=64)
+    # Nom source traduit : les listes (nom seul, lu en SQL) ne servent le nom
+    # traduit que s'il est toujours celui du produit
+    source_name = models.TextField(default="")
+
+class CatalogVersion(models.Model):
+    # Ligne unique : compteur incrémenté à chaque écriture sur le catalogue,
+    # sert à calculer ETag / Last-Modified des endpoints catalogue.
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def current(cls):
+        row = cls.objects.filter(pk=1).values_list("version", "updated_at").first()
+        return row or (0, None)
+
+    @classmethod
+    def bump(cls):
+        updated = cls.objects.filter(pk=1).update(version=F("version") + 1, updated_at=timezone.now())
+        if not updated:
+            cls.objects.get_or_create(pk=1, defaults={"version": 1})
+
+class Recommendation(models.Model):
+    # Top-K des produits par (sport pratiqué, niveau), servi par
+    # /user/:name/recommendations et maintenu par equipements/recommendations.py.
+    # sport = "" : tous sports (utilisateurs sans sport pratiqué).
+    pk = models.CompositePrimaryKey("sport", "level", "product_id")
+    sport = models.CharField(max_length=50, blank=True)
+    level = models.CharField(max_length=10)
+    # Sans contrainte : la ligne d'un produit supprimé est retirée par le signal
+    # post_delete, qui doit encore la trouver pour recalculer le classement.
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    # Copies de Product.rating / review_count, pour classer sans jointure
+    rating = models.FloatField()
+    review_count = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["sport", "level", "-rating", "-review_count", "product"], name="recommendation_rank_idx"),
+        ]
+
+class Translation(models.Model):
+    # Mémoire de traduction de /translate (cf. equipements/translation.py),
+    # indexée par l'empreinte SHA-256 du texte source
+    pk = models.CompositePrimaryKey("source", "target", "digest")
+    source = models.CharField(max_length=5)
+    target = models.CharField(max_length=5)
+    digest = models.CharField(max_length=64)
+    text = models.TextField()
+    translation = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+class RevokedToken(models.Model):
+    # Jetons révoqués par /logout (cf. equipements/tokens.py), vus de tous les
+    # processus ; gardés jusqu'à leur expiration, après quoi la signature
+    # seule suffit à les refuser
+    jti = models.CharField(max_length=32, primary_key=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["expires_at"], name="revoked_token_expires_idx"),
+        ]
+
+class ImageVariant(models.Model):
+    # Image du catalogue (Product.card_image, ProductImages.image_url)
+    # redimensionnée et réencodée (cf. equipements/images.py). Le fichier sur
+    # disque est nommé d'après l'empreinte SHA-256 de son contenu.
+    pk = models.CompositePrimaryKey("source_url", "variant")
+    source_url = models.TextField()
+    variant = models.CharField(max_length=20)
+    digest = models.CharField(max_length=64)
+    width = models.IntegerField()
+    height = models.IntegerField()
+    size = models.IntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Service des fichiers par empreinte (et régénération si absents du disque)
+            models.Index(fields=["digest"], name="image_variant_digest_idx"),
+        ]
+
+def normalize_username(name):
+    # Forme canonique d'un nom d'utilisateur, pour les recherches servies par
+    # l'index unique de User.username_normalized (au lieu d'un iexact qui parcourt la table)
+    return unicodedata.normalize("NFKC", name.strip()).casefold()
 
 class User(AbstractUser):
     sportsPratique = models.CharField(
@@ -108,5 +257,15 @@ class User(AbstractUser):
         default=SportLevel.BEGINNER
     )
 
+    # Toujours égal à normalize_username(username), maintenu par save()
+    username_normalized = models.CharField(max_length=150, unique=True, editable=False)
+
     def __str__(self):
         return self.username
+
+    def save(self, *args, **kwargs):
+        self.username_normalized = normalize_username(self.username)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "username" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "username_normalized"}
+        super().save(*args, **kwargs)
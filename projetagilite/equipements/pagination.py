@@ -0,0 +1,56 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+from equipements.models import Product
+
+MAX_PAGE_SIZE = 100
+
+# Ordres stables disponibles pour la pagination : champ -> ordre décroissant ?
+# L'id sert de départage, chaque ordre est servi par un index (champ, id).
+ORDERINGS = {
+    "price": ("price", False),
+    "rating": ("rating", True),
+}
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(order, value, product_id):
+    raw = json.dumps([order, str(value), product_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(token, order):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        cursor_order, value, product_id = json.loads(raw)
+        if cursor_order != order:
+            raise InvalidCursor(token)
+        field, _ = ORDERINGS[order]
+        return Product._meta.get_field(field).to_python(value), str(product_id)
+    except (ValueError, TypeError, ValidationError) as exc:
+        raise InvalidCursor(token) from exc
+
+def paginate(products, order, limit, cursor=None):
+    # Pagination par clé (keyset) : on repart de la dernière ligne vue au lieu
+    # d'un OFFSET, donc le coût d'une page ne dépend pas de sa profondeur.
+    # Une ligne de plus est lue pour savoir s'il existe une page suivante.
+    field, descending = ORDERINGS[order]
+    if cursor is not None:
+        value, product_id = decode_cursor(cursor, order)
+        # La borne large (gte/lte) permet à SQLite de démarrer la lecture de
+        # l'index au curseur ; le OR départage les égalités sur l'id.
+        if descending:
+            after = Q(**{f"{field}__lt": value}) | Q(id__lt=product_id)
+            products = products.filter(Q(**{f"{field}__lte": value}), after)
+        else:
+            after = Q(**{f"{field}__gt": value}) | Q(id__gt=product_id)
+            products = products.filter(Q(**{f"{field}__gte": value}), after)
+
+    if descending:
+        products = products.order_by(f"-{field}", "-id")
+    else:
+        products = products.order_by(field, "id")
+    return products[:limit + 1]
@@ -0,0 +1,181 @@
+import logging
+import re
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Gestion de transaction : ni comptée dans le budget, ni signalée comme doublon
+IGNORED = re.compile(r"^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT|BEGIN|COMMIT)\b", re.I)
+IN_LIST = re.compile(r"IN \((?:%s, )*%s\)")
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+def normalize(sql):
+    # Gabarit d'une requête : deux requêtes ne différant que par leurs
+    # paramètres (ou la taille d'un IN) ont le même gabarit.
+    return LITERAL.sub("?", IN_LIST.sub("IN (...)", sql))
+
+def call_site():
+    # Premières frames du projet (hors Django et hors ce module) à l'origine de la requête
+    base_dir = str(settings.BASE_DIR)
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < 3:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and filename != __file__ and "site-packages" not in filename:
+            frames.append(f"{filename[len(base_dir) + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return " <- ".join(frames) or "?"
+
+class QueryRecorder:
+    # Requêtes SQL exécutées pendant que l'enregistreur est current_recorder.
+    # La pile d'appels n'est relevée que pour les requêtes fautives : au-delà
+    # du budget, doublons et gabarits répétés.
+
+    def __init__(self, budget=None):
+        self.budget = budget
+        self.queries = []
+        self.counts = Counter()
+        self.templates = Counter()
+
+    def add(self, sql, params):
+        params = repr(params)
+        template = normalize(sql)
+        self.counts[sql, params] += 1
+        self.templates[template] += 1
+        suspect = (
+            len(self.queries) >= self.budget
+            or self.counts[sql, params] > 1
+            or self.templates[template] >= settings.QUERY_BUDGET_REPEAT_THRESHOLD
+        )
+        self.queries.append((sql, params, template, call_site() if suspect else None))
+
+    @contextmanager
+    def record(self):
+        install_all()
+        token = current_recorder.set(self)
+        try:
+            yield self
+        finally:
+            current_recorder.reset(token)
+
+    def problems(self):
+        problems = []
+        if len(self.queries) > self.budget:
+            sites = Counter(site for *_, site in self.queries[self.budget:])
+            detail = ", ".join(f"{site} ({count}x)" for site, count in sites.most_common())
+            problems.append(f"{len(self.queries)} requêtes pour un budget de {self.budget}, au-delà : {detail}")
+
+        for (sql, params), count in self.counts.items():
+            if count > 1:
+                problems.append(f"requête dupliquée {count}x : {sql} ({self.site_of(lambda query: query[:2] == (sql, params))})")
+
+        threshold = settings.QUERY_BUDGET_REPEAT_THRESHOLD
+        for template, count in self.templates.items():
+            if count >= threshold:
+                problems.append(f"N+1 probable, {count}x : {template} ({self.site_of(lambda query: query[2] == template)})")
+        return problems
+
+    def site_of(self, matches):
+        return next(query[3] for query in self.queries if query[3] is not None and matches(query))
+
+class EndpointRecorder(QueryRecorder):
+    # Enregistreur d'une requête HTTP : la route n'est connue qu'une fois l'URL
+    # résolue, donc à la première requête SQL de la vue. Rien n'est enregistré
+    # hors des endpoints de l'API ayant un budget (settings.QUERY_BUDGETS).
+
+    def __init__(self, request):
+        super().__init__()
+        self.request = request
+        self.endpoint = None
+
+    def add(self, sql, params):
+        if self.endpoint is None:
+            match = self.request.resolver_match
+            if match is None:
+                return
+            self.endpoint = f"{self.request.method} /{match.route}" if match.app_name == "ninja" else ""
+            self.budget = settings.QUERY_BUDGETS.get(self.endpoint)
+        if self.budget is not None:
+            super().add(sql, params)
+
+# Enregistreur de la requête HTTP (ou du bloc query_budget) en cours ; comme
+# metrics.current_queries, le contexte suit les appels sync_to_async
+current_recorder = ContextVar("current_recorder", default=None)
+
+def record_query(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is not None and not IGNORED.match(sql):
+        recorder.add(sql, params)
+    return execute(sql, params, many, context)
+
+def install(connection):
+    # Branché en permanence sur chaque connexion, comme metrics.time_query
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+def install_all():
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+
+@receiver(connection_created)
+def install_on_new_connection(sender, connection, **kwargs):
+    install(connection)
+
+@contextmanager
+def query_budget(budget):
+    # Pour les tests : échoue si le bloc dépasse le budget ou contient un N+1
+    recorder = QueryRecorder(budget)
+    with recorder.record():
+        yield recorder
+    problems = recorder.problems()
+    if problems:
+        raise QueryBudgetExceeded("\n".join(problems))
+
+class QueryBudgetMiddleware:
+    # Vérifie le budget de requêtes SQL de chaque appel à l'API ninja
+    # (settings.QUERY_BUDGETS, clé "METHODE /route") : exception si
+    # QUERY_BUDGET_STRICT (tests), sinon warning avec les lignes fautives.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = EndpointRecorder(request)
+        with recorder.record():
+            response = self.get_response(request)
+        return self.check(recorder, response)
+
+    async def __acall__(self, request):
+        recorder = EndpointRecorder(request)
+        with recorder.record():
+            response = await self.get_response(request)
+        return self.check(recorder, response)
+
+    def check(self, recorder, response):
+        if recorder.budget is None:
+            return response
+        problems = recorder.problems()
+        if problems:
+            message = f"{recorder.endpoint} : " + "\n".join(problems)
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,106 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from equipements.models import LEVEL_BITS, SPORT_BITS, Product, Recommendation, masks_matching
+
+# Segment des utilisateurs sans sport pratiqué : produits de tous sports
+ANY_SPORT = ""
+RANKING = ("-rating", "-review_count", "id")
+
+def rank_key(rating, review_count, product_id):
+    # Plus petit = mieux classé (même ordre que RANKING)
+    return (-rating, -review_count, product_id)
+
+def user_segment(sport, level):
+    # Un sport inconnu retombe sur le segment tous sports
+    sport = (sport or "").upper()
+    return (sport if sport in SPORT_BITS else ANY_SPORT, (level or "").upper())
+
+def product_segments(sports_mask, levels_mask):
+    sports = [ANY_SPORT] + [sport for sport, bit in SPORT_BITS.items() if sports_mask & bit]
+    levels = [level for level, bit in LEVEL_BITS.items() if levels_mask & bit]
+    return {(sport, level) for sport in sports for level in levels}
+
+def segment_products(sport, level):
+    products = Product.objects.filter(levels_mask__in=masks_matching(LEVEL_BITS, [level]))
+    if sport:
+        products = products.filter(sports_mask__in=masks_matching(SPORT_BITS, [sport]))
+    return products
+
+def refill_segment(sport, level):
+    # Recalcul complet d'un segment : un seul ORDER BY ... LIMIT K
+    Recommendation.objects.filter(sport=sport, level=level).delete()
+    rows = segment_products(sport, level).order_by(*RANKING).values_list("id", "rating", "review_count")
+    Recommendation.objects.bulk_create(
+        Recommendation(sport=sport, level=level, product_id=product_id, rating=rating, review_count=review_count)
+        for product_id, rating, review_count in rows[:settings.RECOMMENDATIONS_TOP_K]
+    )
+
+def rebuild_recommendations():
+    with transaction.atomic():
+        Recommendation.objects.all().delete()
+        for sport in [ANY_SPORT, *SPORT_BITS]:
+            for level in LEVEL_BITS:
+                refill_segment(sport, level)
+
+def refresh_product(product_id):
+    # Maintien incrémental après une écriture sur un produit (note, avis,
+    # sports, niveaux ou suppression) : seuls les segments du produit sont
+    # touchés, et un segment n'est recalculé que si le produit en sort ou y
+    # recule (un produit hors du top-K pourrait alors le dépasser).
+    top_k = settings.RECOMMENDATIONS_TOP_K
+    with transaction.atomic():
+        product = (
+            Product.objects.filter(pk=product_id)
+            .values_list("rating", "review_count", "sports_mask", "levels_mask")
+            .first()
+        )
+        wanted = set() if product is None else product_segments(product[2], product[3])
+        segments = Q(product_id=product_id)
+        if wanted:
+            segments |= Q(
+                sport__in={sport for sport, _ in wanted},
+                level__in={level for _, level in wanted},
+            )
+        ranked = defaultdict(dict)
+        for sport, level, other_id, rating, review_count in Recommendation.objects.filter(segments).values_list(
+            "sport", "level", "product_id", "rating", "review_count"
+        ):
+            ranked[sport, level][other_id] = rank_key(rating, review_count, other_id)
+
+        for segment in set(ranked) | wanted:
+            entries = ranked[segment]
+            previous = entries.pop(product_id, None)
+            if segment not in wanted:
+                refill_segment(*segment)
+                continue
+            key = rank_key(product[0], product[1], product_id)
+            if key == previous:
+                continue
+            full = len(entries) + (previous is not None) >= top_k
+            if previous is not None and key > previous and full:
+                refill_segment(*segment)
+                continue
+            if previous is None and full and entries and key > max(entries.values()):
+                continue
+            sport, level = segment
+            Recommendation.objects.bulk_create(
+                [Recommendation(sport=sport, level=level, product_id=product_id, rating=product[0], review_count=product[1])],
+                update_conflicts=True,
+                unique_fields=["sport", "level", "product"],
+                update_fields=["rating", "review_count"],
+            )
+            if previous is None and len(entries) >= top_k:
+                worst = max(entries, key=entries.get)
+                Recommendation.objects.filter(sport=sport, level=level, product_id=worst).delete()
+
+def recommended_product_ids(sport, level):
+    # Une lecture servie par recommendation_rank_idx
+    return (
+        Recommendation.objects.filter(sport=sport, level=level)
+        .order_by("-rating", "-review_count", "product_id")
+        .values_list("product_id", flat=True)
+    )
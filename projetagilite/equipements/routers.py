@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Modèles lus sur la connexion en lecture seule (settings.CATALOG_READ_DATABASE)
+CATALOG_MODELS = {
+    "equipements.product",
+    "equipements.productsports",
+    "equipements.productlevels",
+    "equipements.productfeatures",
+    "equipements.productimages",
+    "equipements.productstorestock",
+    "equipements.producttranslation",
+    "equipements.catalogversion",
+    "equipements.recommendation",
+}
+
+class CatalogReadRouter:
+    # Lectures du catalogue sur une connexion SQLite en lecture seule (WAL :
+    # elles ne bloquent pas les écritures, ni l'inverse), écritures et
+    # comptes utilisateurs sur default.
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in CATALOG_MODELS:
+            return None
+        # Dans une transaction d'écriture, on relit ses propres écritures
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return settings.CATALOG_READ_DATABASE
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Même fichier SQLite derrière les deux alias
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
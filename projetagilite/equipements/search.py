@@ -0,0 +1,151 @@
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+
+from equipements.models import Product
+
+SEARCH_TABLE = "equipements_product_search"
+# Clé de chaque produit dans l'index : entier fixe par product_id (INTEGER
+# PRIMARY KEY, gardé par VACUUM), indépendant du rowid de equipements_product
+# que VACUUM ou une reconstruction de la table (migration) renumérotent
+SEARCH_KEY_TABLE = "equipements_product_search_key"
+DEFAULT_SEARCH_LIMIT = 20
+
+# Poids bm25 par colonne de l'index (product_id, name, brand, category, description, features)
+SEARCH_WEIGHTS = (0.0, 10.0, 5.0, 3.0, 1.0, 2.0)
+
+TERM = re.compile(r"\w+")
+
+def match_expression(query):
+    # Requête utilisateur -> expression FTS5 : chaque mot est cité (pas de
+    # syntaxe FTS5 injectable), tous les mots sont requis et le dernier est
+    # cherché en préfixe (saisie en cours).
+    terms = [f'"{term}"' for term in TERM.findall(query)]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+def search_product_ids(query, products=None, limit=DEFAULT_SEARCH_LIMIT):
+    # Ids des produits correspondant à query, du plus pertinent au moins
+    # pertinent (bm25), restreints au queryset products s'il est filtré.
+    # Une seule requête : la recherche est servie par l'index FTS5.
+    match = match_expression(query)
+    if not match:
+        return []
+    weights = ", ".join(str(weight) for weight in SEARCH_WEIGHTS)
+    sql = f"SELECT product_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s"
+    params = [match]
+    if products is not None and products.query.where:
+        subquery, subparams = products.values("id").query.sql_with_params()
+        sql += f" AND product_id IN ({subquery})"
+        params.extend(subparams)
+    # Départage par rowid : trier sur product_id relirait chaque ligne trouvée
+    sql += f" ORDER BY bm25({SEARCH_TABLE}, {weights}), rowid LIMIT %s"
+    params.append(limit)
+    with connections[router.db_for_read(Product)].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+INDEX_PRODUCT = f"""
+    INSERT INTO {SEARCH_KEY_TABLE} (product_id) SELECT id FROM equipements_product WHERE id = {{product_id}}
+    AND NOT EXISTS (SELECT 1 FROM {SEARCH_KEY_TABLE} WHERE product_id = {{product_id}});
+    INSERT INTO {SEARCH_TABLE} (rowid, product_id, name, brand, category, description, features)
+    SELECT k.id, p.id, p.name, p.brand, p.category, p.description,
+           (SELECT group_concat(f.feature, ' ') FROM equipements_productfeatures f WHERE f.product_id = p.id)
+    FROM equipements_product p JOIN {SEARCH_KEY_TABLE} k ON k.product_id = p.id WHERE p.id = {{product_id}};
+"""
+UNINDEX_PRODUCT = f"""
+    DELETE FROM {SEARCH_TABLE} WHERE rowid = (SELECT id FROM {SEARCH_KEY_TABLE} WHERE product_id = {{product_id}});
+"""
+
+# Tenu à jour par triggers, donc aussi pour les imports en SQL brut. Pas de
+# INSERT OR IGNORE : dans un trigger, la politique de conflit de l'upsert de
+# l'import prévaudrait
+SEARCH_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS equipements_product_search_ai AFTER INSERT ON equipements_product BEGIN
+        {INDEX_PRODUCT.format(product_id="NEW.id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS equipements_product_search_au
+    AFTER UPDATE OF id, name, brand, category, description ON equipements_product BEGIN
+        {UNINDEX_PRODUCT.format(product_id="OLD.id")}
+        {INDEX_PRODUCT.format(product_id="NEW.id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS equipements_product_search_ad AFTER DELETE ON equipements_product BEGIN
+        {UNINDEX_PRODUCT.format(product_id="OLD.id")}
+        DELETE FROM {SEARCH_KEY_TABLE} WHERE product_id = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS equipements_productfeatures_search_ai
+    AFTER INSERT ON equipements_productfeatures BEGIN
+        {UNINDEX_PRODUCT.format(product_id="NEW.product_id")}
+        {INDEX_PRODUCT.format(product_id="NEW.product_id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS equipements_productfeatures_search_au
+    AFTER UPDATE ON equipements_productfeatures BEGIN
+        {UNINDEX_PRODUCT.format(product_id="OLD.product_id")}
+        {INDEX_PRODUCT.format(product_id="OLD.product_id")}
+        {UNINDEX_PRODUCT.format(product_id="NEW.product_id")}
+        {INDEX_PRODUCT.format(product_id="NEW.product_id")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS equipements_productfeatures_search_ad
+    AFTER DELETE ON equipements_productfeatures BEGIN
+        {UNINDEX_PRODUCT.format(product_id="OLD.product_id")}
+        {INDEX_PRODUCT.format(product_id="OLD.product_id")}
+    END
+    """,
+]
+
+SEARCH_TRIGGER_NAMES = [
+    "equipements_product_search_ai", "equipements_product_search_au", "equipements_product_search_ad",
+    "equipements_productfeatures_search_ai", "equipements_productfeatures_search_au",
+    "equipements_productfeatures_search_ad",
+]
+
+# Une migration qui reconstruit equipements_product (AlterField...) échoue tant
+# que des triggers y font référence, et les supprime : retirés avant chaque
+# migrate et reposés après (cf. signals.py)
+# Base pas encore migrée jusqu'à l'index par clé (0013) : triggers de la migration 0006 laissés en place
+def _has_search_keys(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SEARCH_KEY_TABLE])
+    return cursor.fetchone() is not None
+
+def drop_search_triggers(using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        if _has_search_keys(cursor):
+            for name in SEARCH_TRIGGER_NAMES:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+def install_search_triggers(using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        if not _has_search_keys(cursor):
+            return False
+        for sql in SEARCH_TRIGGERS:
+            cursor.execute(sql)
+    return True
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+    # Reconstruit l'index depuis les tables produit (ex: après des écritures
+    # faites sans les triggers)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(
+            f"DELETE FROM {SEARCH_KEY_TABLE} WHERE product_id NOT IN (SELECT id FROM {Product._meta.db_table})"
+        )
+        cursor.execute(f"INSERT OR IGNORE INTO {SEARCH_KEY_TABLE} (product_id) SELECT id FROM {Product._meta.db_table}")
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, product_id, name, brand, category, description, features) "
+            f"SELECT k.id, p.id, p.name, p.brand, p.category, p.description, "
+            f"(SELECT group_concat(f.feature, ' ') FROM equipements_productfeatures f WHERE f.product_id = p.id) "
+            f"FROM {Product._meta.db_table} p JOIN {SEARCH_KEY_TABLE} k ON k.product_id = p.id"
+        )
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
@@ -0,0 +1,93 @@
+from django.db.models import F
+from django.db.transaction import on_commit
+from django.db import router
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_migrate
+from django.dispatch import receiver
+
+from equipements.cache import catalog_cache
+from equipements.recommendations import refresh_product
+from equipements.search import drop_search_triggers, install_search_triggers, rebuild_search_index
+from equipements.models import (
+    LEVEL_BITS,
+    SPORT_BITS,
+    CatalogVersion,
+    Product,
+    ProductFeatures,
+    ProductImages,
+    ProductLevels,
+    ProductSports,
+    ProductStoreStock,
+    Store,
+)
+
+# Toute écriture sur un produit ou ses tables liées incrémente la version du
+# catalogue et invalide la ligne du produit en cache.
+# Attention : QuerySet.update() et bulk_create() n'envoient pas ces signaux.
+
+def publish_writes(product_ids=None):
+    # Après le commit : une requête lisant sur catalog_read entre l'invalidation
+    # et le commit rechargerait les anciennes lignes et les garderait en cache.
+    # product_ids None : tout le cache
+    def publish():
+        if product_ids is None:
+            catalog_cache.clear()
+        else:
+            catalog_cache.invalidate_many(product_ids)
+        CatalogVersion.bump()
+    on_commit(publish)
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    publish_writes([instance.pk])
+    refresh_product(instance.pk)
+
+@receiver([post_save, post_delete], sender=ProductFeatures)
+@receiver([post_save, post_delete], sender=ProductImages)
+@receiver([post_save, post_delete], sender=ProductStoreStock)
+def invalidate_product_child(sender, instance, **kwargs):
+    publish_writes([instance.product_id])
+
+# Index des magasins proches (equipements/stores.py) : reconstruit au
+# changement de version ; les lignes produit en cache ne dépendent pas des magasins
+@receiver([post_save, post_delete], sender=Store)
+def invalidate_stores(sender, instance, **kwargs):
+    # Au commit, comme publish_writes() : l'empreinte relue à la nouvelle
+    # version doit inclure l'écriture
+    def publish():
+        catalog_cache.record_write()
+        CatalogVersion.bump()
+    on_commit(publish)
+
+# Maintien incrémental de Product.sports_mask / levels_mask : la clé primaire
+# (product, sport) garantit qu'un bit n'est ajouté ou retiré qu'une fois.
+MASKS = {
+    ProductSports: ("sports_mask", "sport", SPORT_BITS),
+    ProductLevels: ("levels_mask", "level", LEVEL_BITS),
+}
+
+@receiver([post_save, post_delete], sender=ProductSports)
+@receiver([post_save, post_delete], sender=ProductLevels)
+def update_product_mask(sender, instance, signal, created=False, **kwargs):
+    mask_field, value_field, bits = MASKS[sender]
+    bit = bits.get(getattr(instance, value_field), 0)
+    products = Product.objects.filter(pk=instance.product_id)
+    if signal is post_delete:
+        products.update(**{mask_field: F(mask_field).bitand(~bit)})
+    elif created:
+        products.update(**{mask_field: F(mask_field).bitor(bit)})
+    invalidate_product_child(sender, instance)
+    refresh_product(instance.product_id)
+
+# Triggers de l'index de recherche retirés pendant les migrations (cf.
+# equipements/search.py) ; index reconstruit si des migrations ont pu modifier
+# les produits sans eux
+@receiver(pre_migrate)
+def remove_search_triggers(sender, using, **kwargs):
+    if sender.name == "equipements" and router.allow_migrate(using, "equipements"):
+        drop_search_triggers(using)
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, plan=None, **kwargs):
+    if sender.name == "equipements" and router.allow_migrate(using, "equipements"):
+        if install_search_triggers(using) and plan:
+            rebuild_search_index(using)
@@ -0,0 +1,100 @@
+import json
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, ExpressionWrapper, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from equipements.importer import upsert_sql
+from equipements.models import Product, ProductStoreStock
+from equipements.signals import publish_writes
+
+class StockFeedError(ValueError):
+    pass
+
+def parse_update(record):
+    # {"product_id", "store_name", "stock": valeur absolue} ou {..., "delta": variation}
+    try:
+        product_id = str(record["product_id"])
+        store_name = str(record["store_name"])
+        stock, delta = (
+            None if record.get(field) in (None, "") else int(record[field])
+            for field in ("stock", "delta")
+        )
+    except (KeyError, TypeError, ValueError) as exc:
+        raise StockFeedError(f"mise à jour de stock invalide : {record!r}") from exc
+    if (stock is None) == (delta is None):
+        raise StockFeedError(f"{product_id}/{store_name} : 'stock' ou 'delta' attendu (un seul)")
+    if stock is not None and stock < 0:
+        raise StockFeedError(f"{product_id}/{store_name} : stock négatif")
+    return product_id, store_name, stock, delta
+
+def apply_stock_updates(updates):
+    # Applique un lot de mises à jour (déjà passées par parse_update) en une
+    # transaction et un nombre fixe de requêtes : lecture des stocks actuels,
+    # upsert des lignes magasin, puis Product.stock_count / in_stock ajustés
+    # par la somme des variations de chaque produit.
+    quote = connection.ops.quote_name
+    product_table = quote(Product._meta.db_table)
+    stock_table = quote(ProductStoreStock._meta.db_table)
+    # Liste d'ids passée en un seul paramètre JSON (pas de limite de variables SQLite)
+    product_ids = json.dumps(sorted({product_id for product_id, _, _, _ in updates}))
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id FROM {product_table} WHERE id IN (SELECT value FROM json_each(%s))",
+            [product_ids],
+        )
+        known = {row[0] for row in cursor.fetchall()}
+        cursor.execute(
+            f"SELECT product_id, store_name, stock FROM {stock_table} "
+            f"WHERE product_id IN (SELECT value FROM json_each(%s))",
+            [product_ids],
+        )
+        current = {(product_id, store_name): stock for product_id, store_name, stock in cursor.fetchall()}
+
+        # Les mises à jour d'une même ligne s'appliquent dans l'ordre reçu
+        new = {}
+        unknown = set()
+        for product_id, store_name, stock, delta in updates:
+            if product_id not in known:
+                unknown.add(product_id)
+                continue
+            key = (product_id, store_name)
+            if stock is None:
+                stock = new.get(key, current.get(key, 0)) + delta
+            new[key] = max(stock, 0)
+
+        deltas = defaultdict(int)
+        for (product_id, store_name), stock in new.items():
+            deltas[product_id] += stock - current.get((product_id, store_name), 0)
+
+        if new:
+            cursor.executemany(
+                upsert_sql(ProductStoreStock),
+                [(product_id, store_name, stock) for (product_id, store_name), stock in new.items()],
+            )
+        changed = [(delta, delta, product_id) for product_id, delta in deltas.items() if delta]
+        if changed:
+            cursor.executemany(
+                f"UPDATE {product_table} SET stock_count = MAX(stock_count + %s, 0), "
+                f"in_stock = stock_count + %s > 0 WHERE id = %s",
+                changed,
+            )
+        if new:
+            publish_writes(list(deltas))
+
+    return {"updated": len(new), "unknown_products": sorted(unknown)}
+
+def recompute_stock_counts():
+    # Remet stock_count / in_stock en cohérence avec la somme des stocks magasin
+    store_total = (
+        ProductStoreStock.objects.filter(product=OuterRef("pk"))
+        .values("product")
+        .annotate(total=Sum("stock"))
+        .values("total")
+    )
+    with transaction.atomic():
+        Product.objects.update(stock_count=Coalesce(Subquery(store_total, output_field=IntegerField()), Value(0)))
+        Product.objects.update(in_stock=ExpressionWrapper(Q(stock_count__gt=0), output_field=BooleanField()))
+        publish_writes()
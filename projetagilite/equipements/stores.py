@@ -0,0 +1,166 @@
+import heapq
+from itertools import count
+from math import asin, cos, radians, sin, sqrt
+from threading import Lock
+
+from django.db.models import Count, Max
+
+from equipements.cache import catalog_cache
+from equipements.importer import CatalogImportError
+from equipements.models import CatalogVersion, Product, ProductStoreStock, Store
+
+EARTH_RADIUS_KM = 6371.0088
+# Magasins par feuille de l'arbre
+LEAF_SIZE = 8
+# En dessous, les magasins candidats sont comparés directement (sans parcours
+# de l'arbre, qui visiterait tous les magasins non candidats)
+SCAN_MAX_CANDIDATES = 64
+
+def to_xyz(latitude, longitude):
+    # Point de la sphère unité : la distance euclidienne (corde) croît avec la
+    # distance à vol d'oiseau, l'arbre peut donc travailler en 3D sans trigonométrie
+    latitude, longitude = radians(latitude), radians(longitude)
+    return (cos(latitude) * cos(longitude), cos(latitude) * sin(longitude), sin(latitude))
+
+def chord_to_km(squared_chord):
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(squared_chord) / 2))
+
+def squared_distance(a, b):
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+def box_distance(point, low, high):
+    # Distance (au carré) minimale entre point et une boîte englobante
+    return sum(max(low[axis] - point[axis], 0, point[axis] - high[axis]) ** 2 for axis in range(3))
+
+class StoreIndex:
+    # Arbre k-d des magasins ayant des coordonnées. Un noeud est
+    # (bas, haut, magasins de la feuille ou None, gauche, droite), bas / haut
+    # étant la boîte englobante de son sous-arbre.
+
+    def __init__(self, stores):
+        # stores : [(nom, latitude, longitude)]
+        self.names = [name for name, _, _ in stores]
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        self.coordinates = [(latitude, longitude) for _, latitude, longitude in stores]
+        self.points = [to_xyz(latitude, longitude) for _, latitude, longitude in stores]
+        self.root = self.build(list(range(len(stores)))) if stores else None
+
+    def build(self, indexes):
+        points = [self.points[i] for i in indexes]
+        low = tuple(min(point[axis] for point in points) for axis in range(3))
+        high = tuple(max(point[axis] for point in points) for axis in range(3))
+        if len(indexes) <= LEAF_SIZE:
+            return (low, high, indexes, None, None)
+        # Coupe à la médiane de l'axe le plus étendu
+        axis = max(range(3), key=lambda axis: high[axis] - low[axis])
+        indexes.sort(key=lambda i: self.points[i][axis])
+        middle = len(indexes) // 2
+        return (low, high, None, self.build(indexes[:middle]), self.build(indexes[middle:]))
+
+    def result(self, i, squared_chord):
+        return (self.names[i], *self.coordinates[i], chord_to_km(squared_chord))
+
+    def nearest(self, latitude, longitude, k, candidates=None):
+        # k magasins les plus proches, parmi candidates (noms) si donné
+        # -> [(nom, latitude, longitude, distance en km)]
+        if self.root is None or k < 1:
+            return []
+        point = to_xyz(latitude, longitude)
+        if candidates is not None and len(candidates) <= SCAN_MAX_CANDIDATES:
+            positions = [self.positions[name] for name in candidates if name in self.positions]
+            closest = heapq.nsmallest(k, ((squared_distance(point, self.points[i]), i) for i in positions))
+            return [self.result(i, distance) for distance, i in closest]
+
+        # Parcours best-first : noeuds et magasins dans un même tas, par distance
+        # minimale. Un magasin sorti du tas est plus proche que tout ce qui y reste.
+        tiebreak = count()
+        heap = [(box_distance(point, self.root[0], self.root[1]), next(tiebreak), self.root, None)]
+        found = []
+        while heap and len(found) < k:
+            distance, _, node, store = heapq.heappop(heap)
+            if node is None:
+                found.append(self.result(store, distance))
+                continue
+            low, high, leaf, left, right = node
+            if leaf is not None:
+                for i in leaf:
+                    if candidates is None or self.names[i] in candidates:
+                        heapq.heappush(heap, (squared_distance(point, self.points[i]), next(tiebreak), None, i))
+            else:
+                for child in (left, right):
+                    heapq.heappush(heap, (box_distance(point, child[0], child[1]), next(tiebreak), child, None))
+        return found
+
+class StoreIndexCache:
+    # Index par processus, reconstruit quand les magasins changent. Comme pour
+    # le cache catalogue, la version du catalogue (incrémentée par les
+    # écritures sur Store, cf. signals.py) dit quand revérifier : l'empreinte
+    # des magasins (nombre, dernière modification) n'est relue qu'alors.
+
+    def __init__(self):
+        self._index = None
+        self._version = None
+        self._fingerprint = None
+        self._lock = Lock()
+
+    def get(self, version):
+        with self._lock:
+            if self._index is not None and version == self._version:
+                return self._index
+        fingerprint = Store.objects.aggregate(count=Count("pk"), updated_at=Max("updated_at"))
+        with self._lock:
+            if self._index is None or fingerprint != self._fingerprint:
+                stores = Store.objects.exclude(latitude=None).exclude(longitude=None).values_list(
+                    "name", "latitude", "longitude")
+                self._index = StoreIndex(list(stores))
+                self._fingerprint = fingerprint
+            self._version = version
+            return self._index
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+            self._version = None
+            self._fingerprint = None
+
+store_index = StoreIndexCache()
+
+def parse_store(record):
+    # {"name", "latitude", "longitude"} (JSON, NDJSON ou CSV)
+    try:
+        name = str(record["name"]).strip()
+        latitude, longitude = float(record["latitude"]), float(record["longitude"])
+    except (KeyError, TypeError, ValueError) as exc:
+        raise CatalogImportError(f"magasin invalide : {record!r}") from exc
+    if not name or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise CatalogImportError(f"magasin invalide : {record!r}")
+    return Store(name=name, latitude=latitude, longitude=longitude)
+
+def import_stores(records):
+    # Crée ou met à jour les magasins ; bulk_create n'envoie pas les signaux,
+    # la version du catalogue est donc incrémentée ici (reconstruction de l'index)
+    stores = [parse_store(record) for record in records]
+    Store.objects.bulk_create(
+        stores,
+        update_conflicts=True,
+        unique_fields=["name"],
+        update_fields=["latitude", "longitude", "updated_at"],
+    )
+    if stores:
+        catalog_cache.record_write()
+        CatalogVersion.bump()
+    return len(stores)
+
+def nearest_stores(product_id, latitude, longitude, k, version):
+    # Magasins les plus proches ayant le produit en stock -> None si le produit n'existe pas
+    stock = dict(
+        ProductStoreStock.objects.filter(product_id=product_id, stock__gt=0).values_list("store_id", "stock")
+    )
+    if not stock and not Product.objects.filter(pk=product_id).exists():
+        return None
+    return [
+        {"store_name": name, "latitude": store_latitude, "longitude": store_longitude,
+         "distance_km": round(distance, 2), "stock": stock[name]}
+        for name, store_latitude, store_longitude, distance
+        in store_index.get(version).nearest(latitude, longitude, k, stock)
+    ]
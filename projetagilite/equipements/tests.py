@@ -1,14 +1,59 @@
-from django.test import TestCase, Client
+from django.conf import settings
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, Client, override_settings
 from django.urls import reverse
-from equipements.models import Product, ProductLevels, ProductSports, SportLevel, Sport
-from equipements.views import get_product
+from equipements.models import LEVEL_BITS, SPORT_BITS, Product, ProductLevels, ProductSports, SportLevel, Sport
+from equipements.views import PRODUCT_FIELDS, get_product
 import json
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from equipements.models import Product,User
 from django.contrib.auth.hashers import make_password
+from django.core.management import CommandError, call_command
+from django.core.management.sql import emit_pre_migrate_signal
+from equipements.cache import CatalogCache, catalog_cache
+from equipements.compression import accepted_encodings, compressed_responses
+from equipements.importer import iter_json_array
+from equipements.metrics import flush, metrics
+from equipements.models import CatalogVersion, ImageVariant, Store, ProductFeatures, ProductImages, ProductStoreStock, ProductTranslation, Recommendation, RevokedToken, Translation
+from equipements.recommendations import rebuild_recommendations
+from equipements.routers import CatalogReadRouter
+from equipements.stores import StoreIndex, store_index
+from equipements.querybudget import QueryBudgetExceeded, query_budget
+from equipements.tokens import issue_token, verify_token
+from equipements.translation import StubBackend, TranslationBackendError, translate_texts, upstream_quota
+from io import BytesIO, StringIO
+import unittest
+from unittest import mock
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from datetime import timedelta
+from django.test.utils import CaptureQueriesContext
+import tempfile
+import gzip
+from unittest import skipUnless
+try:
+    import brotli
+except ImportError:
+    brotli = None
+import asyncio
+from asgiref.sync import sync_to_async
+import random
+import threading
+from pathlib import Path
+from equipements.images import Image, read_source
 # Create your tests here.
 
+# Les écritures du catalogue sont publiées au commit (equipements/signals.py),
+# jamais atteint dans un TestCase : publiées dès l'écriture, comme en autocommit
+def setUpModule():
+    patcher = mock.patch("equipements.signals.on_commit", lambda callback: callback())
+    patcher.start()
+    unittest.addModuleCleanup(patcher.stop)
+
+# Budgets de requêtes SQL de settings.QUERY_BUDGETS, vérifiés à chaque appel
+# de l'API dans les classes décorées par api_query_budgets (doublons et N+1 compris).
+api_query_budgets = override_settings(QUERY_BUDGET_STRICT=True)
+
 class ProductModelTest(TestCase):
 
     def test_create_product_with_all_fields(self):
@@ -70,6 +115,7 @@ class ProductModelTest(TestCase):
             )
             product.full_clean()  # Trigger validation
 
+@api_query_budgets
 class TestGetProduct(TestCase):
     
     @classmethod
@@ -98,7 +144,8 @@ class TestGetProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "chaussure",
                 "price": "0.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             },
             {
                 "id": "2",
@@ -106,7 +153,8 @@ class TestGetProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "raquette",
                 "price": "0.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             }
         ], json_response)
 
@@ -123,7 +171,8 @@ class TestGetProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "chaussure",
                 "price": "0.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             },
             {
                 "id": "2",
@@ -131,7 +180,8 @@ class TestGetProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "raquette",
                 "price": "0.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             },
             {
                 "id": "3",
@@ -139,10 +189,184 @@ class TestGetProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "volant",
                 "price": "0.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             }
         ], json_response)
 
+    def test_get_all_products_constant_queries(self):
+        for i in range(3, 13):
+            produit = Product.objects.create(id=str(i), name=f"produit {i}")
+            ProductSports.objects.create(product=produit, sport="TENNIS")
+            ProductLevels.objects.create(product=produit, level="EXPERT")
+        with self.assertNumQueries(5):
+            response = self.client.get("/products")
+        self.assertEqual(len(response.json()), 12)
+        # Corps déjà sérialisé (cf. equipements/compression.py) : seule la version est lue
+        with self.assertNumQueries(1):
+            self.assertEqual(response.json(), self.client.get("/products").json())
+
+@api_query_budgets
+class TestGetProductById(TestCase):
+    def setUp(self):
+        chaussure = Product.objects.create(id="1", name="chaussure", stock_count=4)
+        ProductSports.objects.create(product=chaussure, sport="RUNNING")
+        ProductSports.objects.create(product=chaussure, sport="BADMINTON")
+        ProductLevels.objects.create(product=chaussure, level="EXPERT")
+
+    def test_get_product_by_id(self):
+        with self.assertNumQueries(5):
+            response = self.client.get("/products/:product_id?product_id=1")
+        with self.assertNumQueries(1):
+            self.client.get("/products/:product_id?product_id=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({
+            "id": "1",
+            "sku": "",
+            "levels": ["EXPERT"],
+            "sports": ["BADMINTON", "RUNNING"],
+            "name": "chaussure",
+            "description": "",
+            "category": "",
+            "brand": "",
+            "price": "0.00",
+            "rating": 0.0,
+            "review_count": 0,
+            "warranty_months": 0,
+            "delivery_days": 0,
+            "in_stock": False,
+            "card_image": None,
+            "stock_count": 4,
+            "features": [],
+            "images": [],
+            "store_stock": [],
+        }, response.json())
+
+    def test_get_product_details(self):
+        chaussure = Product.objects.get(id="1")
+        ProductFeatures.objects.create(product=chaussure, position=2, feature="Légère")
+        ProductFeatures.objects.create(product=chaussure, position=1, feature="Semelle")
+        ProductImages.objects.create(product=chaussure, position=2, image_url="https://img/2.jpg", is_card=False)
+        ProductImages.objects.create(product=chaussure, position=1, image_url="https://img/1.jpg", is_card=True)
+        ProductStoreStock.objects.create(product=chaussure, store_id="Lyon", stock=3)
+        ProductStoreStock.objects.create(product=chaussure, store_id="Lille", stock=1)
+        # Requêtes en nombre fixe, quel que soit le nombre de lignes liées
+        with self.assertNumQueries(5):
+            response = self.client.get("/products/:product_id?product_id=1").json()
+        self.assertEqual(["Semelle", "Légère"], response["features"])
+        self.assertEqual([
+            {"url": "https://img/1.jpg", "is_card": True, "variants": {}},
+            {"url": "https://img/2.jpg", "is_card": False, "variants": {}},
+        ], response["images"])
+        self.assertEqual([
+            {"store_name": "Lille", "stock": 1},
+            {"store_name": "Lyon", "stock": 3},
+        ], response["store_stock"])
+
+    def test_child_write_invalidates_details(self):
+        chaussure = Product.objects.get(id="1")
+        self.client.get("/products/:product_id?product_id=1")
+        ProductStoreStock.objects.create(product=chaussure, store_id="Lille", stock=2)
+        response = self.client.get("/products/:product_id?product_id=1").json()
+        self.assertEqual([{"store_name": "Lille", "stock": 2}], response["store_stock"])
+        ProductFeatures.objects.create(product=chaussure, position=1, feature="Semelle")
+        response = self.client.get("/products/:product_id?product_id=1").json()
+        self.assertEqual(["Semelle"], response["features"])
+
+    def test_get_unknown_product_by_id(self):
+        response = self.client.get("/products/:product_id?product_id=404")
+        self.assertEqual(response.status_code, 404)
+
+@api_query_budgets
+class TestCatalogCache(TestCase):
+    def setUp(self):
+        catalog_cache.clear()
+        self.chaussure = Product.objects.create(id="1", name="chaussure", price=10)
+        ProductSports.objects.create(product=self.chaussure, sport="RUNNING")
+
+    def get_chaussure(self):
+        return self.client.get("/products/:product_id?product_id=1").json()
+
+    def test_hits_and_misses(self):
+        self.get_chaussure()
+        # Sans le corps déjà sérialisé, la ligne est relue dans le cache catalogue
+        compressed_responses.clear()
+        self.get_chaussure()
+        stats = self.client.get("/catalog/cache").json()
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(1, stats["misses"])
+        self.assertEqual(1, stats["size"])
+
+    def test_product_save_invalidates(self):
+        self.get_chaussure()
+        self.chaussure.price = 20
+        self.chaussure.save()
+        self.assertEqual("20.00", self.get_chaussure()["price"])
+
+    def test_sport_and_level_writes_invalidate(self):
+        self.get_chaussure()
+        ProductLevels.objects.create(product=self.chaussure, level="EXPERT")
+        self.assertEqual(["EXPERT"], self.get_chaussure()["levels"])
+        ProductSports.objects.filter(product=self.chaussure).delete()
+        self.assertEqual([], self.get_chaussure()["sports"])
+
+    def test_product_delete_invalidates(self):
+        self.get_chaussure()
+        self.chaussure.delete()
+        response = self.client.get("/products/:product_id?product_id=1")
+        self.assertEqual(response.status_code, 404)
+
+    def test_lru_eviction(self):
+        cache = CatalogCache(maxsize=2)
+        cache.set_many({"a": {"id": "a"}, "b": {"id": "b"}})
+        cache.get_many(["a"], dict)
+        cache.set_many({"c": {"id": "c"}})
+        self.assertEqual([{"id": "a"}, {"id": "c"}], cache.get_many(["a", "b", "c"], lambda missing: {}))
+
+    def test_foreign_write_clears_cache(self):
+        self.get_chaussure()
+        # Écriture sans signal, comme depuis un autre processus
+        Product.objects.filter(pk="1").update(name="basket")
+        CatalogVersion.bump()
+        self.assertEqual("basket", self.get_chaussure()["name"])
+
+    def test_local_write_keeps_other_rows(self):
+        Product.objects.create(id="2", name="raquette")
+        self.get_chaussure()
+        self.client.get("/products/:product_id?product_id=2")
+        Product.objects.filter(pk="2").get().save()
+        with self.assertNumQueries(1):
+            self.get_chaussure()
+
+    def test_warm_command(self):
+        call_command("warm_catalog_cache", stdout=StringIO())
+        with self.assertNumQueries(1):
+            self.get_chaussure()
+
+class TestPublishOnCommit(TestCase):
+    def setUp(self):
+        catalog_cache.clear()
+        self.chaussure = Product.objects.create(id="1", name="chaussure", price=10)
+        self.client.get("/products/:product_id?product_id=1")
+
+    def test_nothing_published_before_commit(self):
+        version = CatalogVersion.current()
+        with mock.patch("equipements.signals.on_commit", transaction.on_commit):
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.chaussure.price = 20
+                self.chaussure.save()
+                ProductFeatures.objects.create(product=self.chaussure, position=1, feature="Semelle")
+                # Pas encore validé : ligne en cache et version inchangées
+                self.assertEqual(1, catalog_cache.stats()["size"])
+                self.assertEqual(version, CatalogVersion.current())
+        self.assertEqual(2, len(callbacks))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(0, catalog_cache.stats()["size"])
+        self.assertEqual(version[0] + 2, CatalogVersion.current()[0])
+        self.assertEqual("20.00", self.client.get("/products/:product_id?product_id=1").json()["price"])
+
+@api_query_budgets
 class TestGetFilteredProduct(TestCase):
     @classmethod
     def setUp(cls):
@@ -173,7 +397,8 @@ class TestGetFilteredProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "chaussure",
                 "price": "1000.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             },
             {
                 "id": "2",
@@ -181,7 +406,8 @@ class TestGetFilteredProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "raquette",
                 "price": "50.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             },
             {
                 "id": "3",
@@ -189,7 +415,8 @@ class TestGetFilteredProduct(TestCase):
                 "sports": ["BASKETBALL"],
                 "name": "balle",
                 "price": "30.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             }
         ], json_response)
 
@@ -203,7 +430,8 @@ class TestGetFilteredProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "chaussure",
                 "price": "1000.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             },
             {
                 "id": "3",
@@ -211,7 +439,8 @@ class TestGetFilteredProduct(TestCase):
                 "sports": ["BASKETBALL"],
                 "name": "balle",
                 "price": "30.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             },
         ], json_response)
 
@@ -225,7 +454,8 @@ class TestGetFilteredProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "chaussure",
                 "price": "1000.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             },
             {
                 "id": "2",
@@ -233,7 +463,8 @@ class TestGetFilteredProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "raquette",
                 "price": "50.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             },
         ], json_response)
 
@@ -247,7 +478,8 @@ class TestGetFilteredProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "chaussure",
                 "price": "1000.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             }
         ], json_response)
 
@@ -261,7 +493,8 @@ class TestGetFilteredProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "raquette",
                 "price": "50.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             },
             {
                 "id": "3",
@@ -269,7 +502,8 @@ class TestGetFilteredProduct(TestCase):
                 "sports": ["BASKETBALL"],
                 "name": "balle",
                 "price": "30.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             }
         ], json_response)
 
@@ -283,10 +517,155 @@ class TestGetFilteredProduct(TestCase):
                 "sports": ["BADMINTON"],
                 "name": "raquette",
                 "price": "50.00",
-                "card_image": None
+                "card_image": None,
+                "stock_count": 0
             },
         ], json_response)
 
+    def test_get_products_filtered_by_several_levels(self):
+        response = self.client.get("/products?level=BEGINNER&level=EXPERT")
+        json_response = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(["1", "3"], [product["id"] for product in json_response])
+
+    def test_get_products_filtered_by_several_sports_and_levels(self):
+        response = self.client.get("/products?sport=BADMINTON&sport=BASKETBALL&level=AVERAGE&level=EXPERT")
+        json_response = json.loads(response.content.decode("utf-8"))
+        self.assertEqual(["1", "2", "3"], [product["id"] for product in json_response])
+
+@api_query_budgets
+class TestGetPaginatedProduct(TestCase):
+    def setUp(self):
+        prix = [30, 10, 20, 10, 50]
+        notes = [4.5, 3.0, 4.5, 5.0, 1.0]
+        for i, (price, rating) in enumerate(zip(prix, notes), start=1):
+            produit = Product.objects.create(id=str(i), name=f"produit {i}", price=price, rating=rating)
+            ProductSports.objects.create(product=produit, sport="TENNIS")
+
+    def walk(self, url):
+        ids = []
+        response = self.client.get(url).json()
+        ids.append([product["id"] for product in response["results"]])
+        while response["next_cursor"]:
+            response = self.client.get(f"{url}&cursor={response['next_cursor']}").json()
+            ids.append([product["id"] for product in response["results"]])
+        return ids
+
+    def test_pages_ordered_by_price(self):
+        self.assertEqual([["2", "4"], ["3", "1"], ["5"]], self.walk("/products?limit=2"))
+
+    def test_pages_ordered_by_rating(self):
+        self.assertEqual([["4", "3"], ["1", "2"], ["5"]], self.walk("/products?limit=2&order=rating"))
+
+    def test_pages_keep_filters(self):
+        self.assertEqual([["2", "4"], ["3"]], self.walk("/products?limit=2&maxPrice=20"))
+
+    def test_page_constant_queries(self):
+        with self.assertNumQueries(5):
+            response = self.client.get("/products?limit=2")
+        with self.assertNumQueries(1):
+            self.client.get("/products?limit=2")
+        self.assertEqual(2, len(response.json()["results"]))
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/products?limit=2&cursor=nimportequoi")
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_limit(self):
+        response = self.client.get("/products?limit=0")
+        self.assertEqual(response.status_code, 400)
+
+@api_query_budgets
+class TestCompressedResponses(TestCase):
+    def setUp(self):
+        compressed_responses.clear()
+        for i in range(20):
+            Product.objects.create(id=str(i), name=f"chaussure de running {i}", price=i)
+
+    def test_gzip_negotiation(self):
+        plain = self.client.get("/products")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", plain["Vary"])
+        with self.assertNumQueries(1):
+            response = self.client.get("/products", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual("gzip", response["Content-Encoding"])
+        self.assertEqual(plain.content, gzip.decompress(response.content))
+        self.assertEqual(f"W/{plain['ETag']}", response["ETag"])
+        response = self.client.get("/products", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(304, response.status_code)
+
+    @skipUnless(brotli, "paquet brotli non installé")
+    def test_brotli_preferred(self):
+        response = self.client.get("/products?fields=price", HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual("br", response["Content-Encoding"])
+        self.assertEqual(self.client.get("/products?fields=price").content, brotli.decompress(response.content))
+
+    def test_small_and_error_responses_uncompressed(self):
+        response = self.client.get("/products/:product_id?product_id=1", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        response = self.client.get("/products?format=csv", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(400, response.status_code)
+
+    def test_catalog_write_refreshes_body(self):
+        self.client.get("/products", HTTP_ACCEPT_ENCODING="gzip")
+        Product.objects.filter(pk="1").update(name="raquette")
+        CatalogVersion.bump()
+        response = self.client.get("/products", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertIn(b"raquette", gzip.decompress(response.content))
+
+    def test_accepted_encodings(self):
+        self.assertEqual({"gzip", "br"}, accepted_encodings("gzip;q=0.5, br, identity;q=0"))
+        self.assertEqual(set(), accepted_encodings(""))
+
+@api_query_budgets
+class TestConditionalGet(TestCase):
+    def setUp(self):
+        self.chaussure = Product.objects.create(id="1", name="chaussure")
+
+    def test_not_modified_when_etag_matches(self):
+        for url in ["/products", "/products/:product_id?product_id=1", "/sports"]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.has_header("Last-Modified"))
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+            self.assertEqual(response.status_code, 304)
+
+    def test_catalog_write_changes_etag(self):
+        etag = self.client.get("/products")["ETag"]
+        ProductSports.objects.create(product=self.chaussure, sport="TENNIS")
+        response = self.client.get("/products", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(etag, response["ETag"])
+        self.assertEqual(["TENNIS"], response.json()[0]["sports"])
+
+@api_query_budgets
+class TestProductMasks(TestCase):
+    def setUp(self):
+        self.chaussure = Product.objects.create(id="1", name="chaussure")
+
+    def masks(self):
+        return Product.objects.values_list("sports_mask", "levels_mask").get(pk="1")
+
+    def test_masks_follow_sports_and_levels(self):
+        ProductSports.objects.create(product=self.chaussure, sport="BADMINTON")
+        ProductSports.objects.create(product=self.chaussure, sport="TENNIS")
+        ProductLevels.objects.create(product=self.chaussure, level="EXPERT")
+        self.assertEqual((SPORT_BITS["BADMINTON"] | SPORT_BITS["TENNIS"], LEVEL_BITS["EXPERT"]), self.masks())
+
+        ProductSports.objects.filter(product=self.chaussure, sport="BADMINTON").delete()
+        self.assertEqual((SPORT_BITS["TENNIS"], LEVEL_BITS["EXPERT"]), self.masks())
+
+    def test_saving_stale_instance_keeps_masks(self):
+        ProductSports.objects.create(product=self.chaussure, sport="YOGA")
+        self.chaussure.name = "chaussure de yoga"
+        self.chaussure.save()
+        self.assertEqual((SPORT_BITS["YOGA"], 0), self.masks())
+
+    def test_unknown_sport_matches_nothing(self):
+        ProductSports.objects.create(product=self.chaussure, sport="YOGA")
+        response = self.client.get("/products?sport=YOG")
+        self.assertEqual([], response.json())
+
 class UserModelTest(TestCase):
     def test_create_user_with_niveau_sportif(self):
         userModel = get_user_model()
@@ -329,6 +708,7 @@ class StockModelTest(TestCase):
             product = Product.objects.get(name=self.product.name)
             product.full_clean()  # Trigger validation
 
+@api_query_budgets
 class TestGetSports(TestCase):
     def test_get_all_sports(self):
         response = self.client.get("/sports")
@@ -376,6 +756,7 @@ class TestGetSports(TestCase):
             }
         ], json_response)
 
+@api_query_budgets
 class TestPostRegister(TestCase):
 
     def test_register_new_user(self):
@@ -403,6 +784,7 @@ class TestPostRegister(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(response.json(), {'error': 'Utilisateur existant'})
 
+@api_query_budgets
 class TestLogin(TestCase):
     def test_login_successful(self):
         user = User.objects.create_user(username="eve")
@@ -433,3 +815,1044 @@ class TestLogin(TestCase):
             "password":"apagnan"
         }),content_type="applications/json")
         self.assertEqual(response.status_code,400)
+
+@api_query_budgets
+class TestUserProfile(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="frank", password="test1234")
+        self.auth = {"authorization": f"Bearer {issue_token(self.user)}"}
+
+    def test_get_user(self):
+        response = self.client.get("/user/:name?name=frank", headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual("frank", response.json()["name"])
+
+    def test_put_user(self):
+        response = self.client.put("/user/:name?name=frank", json.dumps({
+            "sport": "TENNIS",
+            "level": "EXPERT"
+        }), content_type="application/json", headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(username="frank")
+        self.assertEqual("TENNIS", user.sportsPratique)
+        self.assertEqual("EXPERT", user.niveauSportif)
+
+    def test_token_required(self):
+        self.assertEqual(401, self.client.get("/user/:name?name=frank").status_code)
+        response = self.client.get("/user/:name?name=frank", headers={"authorization": "Bearer faux"})
+        self.assertEqual(401, response.status_code)
+        with override_settings(AUTH_TOKEN_MAX_AGE=-1):
+            self.assertEqual(401, self.client.get("/user/:name?name=frank", headers=self.auth).status_code)
+
+    def test_other_user_forbidden(self):
+        User.objects.create_user(username="gina", password="test1234")
+        self.assertEqual(403, self.client.get("/user/:name?name=gina", headers=self.auth).status_code)
+        response = self.client.put("/user/:name?name=gina", json.dumps({"sport": "TENNIS"}),
+                                   content_type="application/json", headers=self.auth)
+        self.assertEqual(403, response.status_code)
+        self.assertIsNone(User.objects.get(username="gina").sportsPratique)
+
+    def test_login_token_and_logout(self):
+        response = self.client.post("/login", {"name": "frank", "password": "test1234"}, content_type="application/json")
+        auth = {"authorization": f"Bearer {response.json()['token']}"}
+        self.assertEqual(200, self.client.get("/user/:name?name=frank", headers=auth).status_code)
+        self.assertEqual(200, self.client.post("/logout", headers=auth).status_code)
+        self.assertEqual(401, self.client.get("/user/:name?name=frank", headers=auth).status_code)
+        # Les autres sessions restent valides
+        self.assertEqual(200, self.client.get("/user/:name?name=frank", headers=self.auth).status_code)
+
+    def test_revocations_shared_between_processes(self):
+        # Révocation en base, vue des autres processus ; les révocations de
+        # jetons expirés sont purgées
+        token = issue_token(self.user)
+        RevokedToken.objects.create(jti="expire", expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(200, self.client.post("/logout", headers={"authorization": f"Bearer {token}"}).status_code)
+        self.assertEqual(1, RevokedToken.objects.count())
+        self.assertIsNone(verify_token(token))
+
+@api_query_budgets
+@override_settings(RECOMMENDATIONS_TOP_K=2)
+class TestRecommendations(TestCase):
+    def setUp(self):
+        for product_id, rating, review_count, sport in [
+            ("1", 4.5, 10, "TENNIS"), ("2", 4.5, 30, "TENNIS"), ("3", 3.0, 5, "TENNIS"), ("4", 5.0, 1, "YOGA"),
+        ]:
+            product = Product.objects.create(id=product_id, name=f"produit {product_id}", rating=rating, review_count=review_count)
+            ProductSports.objects.create(product=product, sport=sport)
+            ProductLevels.objects.create(product=product, level="EXPERT")
+        self.user = User.objects.create_user(username="hugo", password="apagnan", sportsPratique="TENNIS",
+                                             niveauSportif="EXPERT")
+        self.auth = {"authorization": f"Bearer {issue_token(self.user)}"}
+
+    def recommendations(self):
+        response = self.client.get("/user/:name/recommendations?name=hugo", headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        return [product["id"] for product in response.json()]
+
+    def test_top_k_for_sport_and_level(self):
+        self.assertEqual(["2", "1"], self.recommendations())
+        User.objects.filter(pk=self.user.pk).update(sportsPratique=None)
+        self.assertEqual(["4", "2"], self.recommendations())
+        User.objects.filter(pk=self.user.pk).update(niveauSportif="BEGINNER")
+        self.assertEqual([], self.recommendations())
+
+    def test_follows_product_writes(self):
+        troisieme = Product.objects.get(pk="3")
+        troisieme.rating = 4.8
+        troisieme.save()
+        self.assertEqual(["3", "2"], self.recommendations())
+        # Le produit qui recule est remplacé par le meilleur hors du top-K
+        troisieme.rating = 1.0
+        troisieme.save()
+        self.assertEqual(["2", "1"], self.recommendations())
+        ProductSports.objects.filter(product_id="2").delete()
+        self.assertEqual(["1", "3"], self.recommendations())
+        ProductSports.objects.create(product_id="4", sport="TENNIS")
+        self.assertEqual(["4", "1"], self.recommendations())
+        Product.objects.filter(pk="4").delete()
+        self.assertEqual(["1", "3"], self.recommendations())
+
+    def test_incremental_matches_rebuild(self):
+        ProductLevels.objects.create(product_id="3", level="BEGINNER")
+        Product.objects.filter(pk="1").delete()
+        incremental = set(Recommendation.objects.values_list("sport", "level", "product_id", "rating", "review_count"))
+        rebuild_recommendations()
+        self.assertEqual(incremental, set(Recommendation.objects.values_list(
+            "sport", "level", "product_id", "rating", "review_count")))
+
+    def test_foreign_write_refreshes_rows(self):
+        self.recommendations()
+        # Écriture sans signal, comme depuis un autre processus
+        Product.objects.filter(pk="2").update(name="raquette")
+        CatalogVersion.bump()
+        response = self.client.get("/user/:name/recommendations?name=hugo", headers=self.auth)
+        self.assertEqual("raquette", response.json()[0]["name"])
+
+    def test_other_user_forbidden(self):
+        User.objects.create_user(username="iris", password="apagnan")
+        response = self.client.get("/user/:name/recommendations?name=iris", headers=self.auth)
+        self.assertEqual(403, response.status_code)
+
+@api_query_budgets
+class TestUsernameLookup(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="élodie", password="test1234")
+        self.auth = {"authorization": f"Bearer {issue_token(self.user)}"}
+
+    def test_normalized_on_save(self):
+        self.assertEqual("élodie", self.user.username_normalized)
+        self.user.username = "Straße"
+        self.user.save(update_fields=["username"])
+        self.assertEqual("strasse", User.objects.get(pk=self.user.pk).username_normalized)
+
+    def test_lookups_ignore_case(self):
+        response = self.client.post("/login", {"name": " ÉLODIE ", "password": "test1234"}, content_type="application/json")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(200, self.client.get("/user/:name?name=Élodie", headers=self.auth).status_code)
+        response = self.client.post("/register", {
+            "name": "ÉLODIE", "password": "test1234", "sport": "TENNIS", "niveauSportif": "EXPERT",
+        }, content_type="application/json")
+        self.assertEqual(400, response.status_code)
+
+    def test_rename(self):
+        User.objects.create_user(username="gina", password="test1234")
+        response = self.client.put("/user/:name?name=élodie", json.dumps({"name": "GINA"}),
+                                   content_type="application/json", headers=self.auth)
+        self.assertEqual(400, response.status_code)
+        response = self.client.put("/user/:name?name=élodie", json.dumps({"name": "Lola"}),
+                                   content_type="application/json", headers=self.auth)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("lola", User.objects.get(pk=self.user.pk).username_normalized)
+
+    def test_lookup_uses_index(self):
+        plan = User.objects.filter(username_normalized="élodie").explain()
+        self.assertIn("USING INDEX", plan)
+
+class TestQueryBudget(TestCase):
+    def setUp(self):
+        for i in range(3):
+            Product.objects.create(id=str(i), name=f"produit {i}")
+
+    def test_n_plus_one_detected(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "N+1"):
+            with query_budget(10):
+                for product in Product.objects.all():
+                    list(product.sports.all())
+
+    def test_duplicate_detected(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "dupliquée"):
+            with query_budget(10):
+                Product.objects.filter(pk="1").exists()
+                Product.objects.filter(pk="1").exists()
+
+    def test_budget_exceeded(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, "budget de 1"):
+            with query_budget(1):
+                Product.objects.filter(pk="1").exists()
+                Product.objects.filter(pk="2").count()
+
+    @override_settings(QUERY_BUDGETS={**settings.QUERY_BUDGETS, "GET /sports": 0}, QUERY_BUDGET_STRICT=True)
+    def test_middleware_strict(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/sports")
+
+    @override_settings(QUERY_BUDGETS={**settings.QUERY_BUDGETS, "GET /sports": 0}, QUERY_BUDGET_STRICT=False)
+    def test_middleware_warns(self):
+        with self.assertLogs("equipements.querybudget", "WARNING") as logs:
+            response = self.client.get("/sports")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("GET /sports", logs.output[0])
+        self.assertIn("views.py", logs.output[0])
+
+    def test_call_site_only_for_faulty_queries(self):
+        with mock.patch("equipements.querybudget.call_site", return_value="?") as call_site:
+            with query_budget(2):
+                Product.objects.filter(pk="1").exists()
+                Product.objects.filter(pk="2").count()
+            call_site.assert_not_called()
+            with self.assertRaises(QueryBudgetExceeded):
+                with query_budget(1):
+                    Product.objects.filter(pk="1").exists()
+                    Product.objects.filter(pk="2").count()
+            call_site.assert_called_once()
+
+    @override_settings(QUERY_BUDGETS={"GET /products": 5}, QUERY_BUDGET_STRICT=True)
+    def test_middleware_skips_routes_without_budget(self):
+        with mock.patch("equipements.querybudget.QueryRecorder.add") as add:
+            self.assertEqual(200, self.client.get("/sports").status_code)
+            add.assert_not_called()
+            self.client.get("/products")
+            add.assert_called()
+
+class TestImportCatalog(TestCase):
+    RAQUETTE = {
+        "id": "p-ten-001", "sku": "REF-1", "name": "Raquette", "description": "Raquette de tennis",
+        "category": "MATERIEL", "brand": "Artengo", "price": "49.90", "rating": 4.2, "in_stock": True,
+        "stock_count": 5, "card_image": "/img/raquette-1.png",
+        "sports": ["TENNIS"], "levels": ["beginner", "AVERAGE"], "features": ["Legere", "Solide"],
+        "images": ["/img/raquette-1.png", "/img/raquette-2.png"],
+        "store_stock": {"Decathlon Lille": 2, "Decathlon Paris": 3},
+    }
+
+    def import_file(self, name, content, *args):
+        path = f"{self.tmpdir}/{name}"
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        out = StringIO()
+        call_command("import_catalog", path, *args, stdout=out)
+        return out.getvalue()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def assert_raquette(self):
+        product = Product.objects.get(pk="p-ten-001")
+        self.assertEqual("Raquette", product.name)
+        self.assertEqual(SPORT_BITS["TENNIS"], product.sports_mask)
+        self.assertEqual(LEVEL_BITS["BEGINNER"] | LEVEL_BITS["AVERAGE"], product.levels_mask)
+        self.assertEqual(["Legere", "Solide"], list(ProductFeatures.objects.filter(product=product).order_by("position").values_list("feature", flat=True)))
+        self.assertEqual([True, False], list(ProductImages.objects.filter(product=product).order_by("position").values_list("is_card", flat=True)))
+        self.assertEqual(5, sum(ProductStoreStock.objects.filter(product=product).values_list("stock", flat=True)))
+
+    def test_import_ndjson(self):
+        output = self.import_file("catalogue.ndjson", json.dumps(self.RAQUETTE) + "\n")
+        self.assertIn("1 enregistrements importés", output)
+        self.assert_raquette()
+
+    def test_import_json_streamed_in_small_chunks(self):
+        records = list(iter_json_array(StringIO(json.dumps([self.RAQUETTE, {"id": "2", "name": "Balle"}])), chunk_size=7))
+        self.assertEqual(["p-ten-001", "2"], [record["id"] for record in records])
+
+    def test_import_csv(self):
+        self.import_file("catalogue.csv", (
+            "id,sku,name,price,in_stock,stock_count,card_image,sports,levels,features,images,store_stock\n"
+            "p-ten-001,REF-1,Raquette,49.90,1,5,/img/raquette-1.png,TENNIS,BEGINNER|AVERAGE,Legere|Solide,"
+            "/img/raquette-1.png|/img/raquette-2.png,Decathlon Lille:2|Decathlon Paris:3\n"
+        ))
+        self.assert_raquette()
+
+    def test_import_django_fixture(self):
+        with open("dumpdjango.json", encoding="utf-8") as file:
+            fixture = [row for row in json.load(file) if row["fields"].get("product", row["pk"]) == "p-bad-001"]
+        self.import_file("dump.json", json.dumps(fixture))
+        product = Product.objects.get(pk="p-bad-001")
+        self.assertEqual(SPORT_BITS["BADMINTON"], product.sports_mask)
+        self.assertEqual(3, ProductFeatures.objects.filter(product=product).count())
+
+    def test_reimport_replaces_children_and_bumps_version(self):
+        self.import_file("catalogue.ndjson", json.dumps(self.RAQUETTE))
+        version = CatalogVersion.current()[0]
+        self.import_file("catalogue.ndjson", json.dumps(dict(self.RAQUETTE, sports=["BADMINTON"], features=["Legere"])))
+        self.assertEqual(["BADMINTON"], list(ProductSports.objects.filter(product_id="p-ten-001").values_list("sport", flat=True)))
+        self.assertEqual(1, ProductFeatures.objects.filter(product_id="p-ten-001").count())
+        self.assertEqual(SPORT_BITS["BADMINTON"], Product.objects.get(pk="p-ten-001").sports_mask)
+        self.assertGreater(CatalogVersion.current()[0], version)
+
+    def test_invalid_record(self):
+        with self.assertRaises(CommandError):
+            self.import_file("catalogue.ndjson", json.dumps(dict(self.RAQUETTE, price="-3")))
+        with self.assertRaises(CommandError):
+            self.import_file("catalogue.ndjson", json.dumps(dict(self.RAQUETTE, sports=["PETANQUE"])))
+        self.assertFalse(Product.objects.exists())
+
+    def test_partial_import_is_published(self):
+        version = CatalogVersion.current()[0]
+        content = json.dumps(self.RAQUETTE) + "\n" + json.dumps(dict(self.RAQUETTE, id="p-ten-002", price="-3"))
+        with self.assertRaises(CommandError):
+            self.import_file("catalogue.ndjson", content, "--batch-size", "1")
+        # Premier lot déjà validé : publié malgré l'erreur
+        self.assert_raquette()
+        self.assertGreater(CatalogVersion.current()[0], version)
+        self.assertTrue(Recommendation.objects.filter(product_id="p-ten-001").exists())
+
+@api_query_budgets
+@override_settings(STOCK_FEED_TOKEN="secret-magasins")
+class TestStockFeed(TestCase):
+    def setUp(self):
+        self.velo = Product.objects.create(id="velo", name="Velo", stock_count=5, in_stock=True)
+        ProductStoreStock.objects.create(product=self.velo, store_id="Lille", stock=5)
+
+    def post_stock(self, updates, token="secret-magasins"):
+        return self.client.post("/stock", json.dumps(updates), content_type="application/json",
+                                headers={"X-Stock-Feed-Token": token} if token else {})
+
+    def stock(self):
+        product = Product.objects.get(pk="velo")
+        stores = dict(ProductStoreStock.objects.filter(product=product).values_list("store_id", "stock"))
+        return product.stock_count, product.in_stock, stores
+
+    def test_absolute_and_delta_updates(self):
+        response = self.post_stock([
+            {"product_id": "velo", "store_name": "Lille", "delta": -2},
+            {"product_id": "velo", "store_name": "Paris", "stock": 4},
+            {"product_id": "velo", "store_name": "Paris", "delta": 1},
+            {"product_id": "inconnu", "store_name": "Paris", "stock": 1},
+        ])
+        self.assertEqual({"updated": 2, "unknown_products": ["inconnu"]}, response.json())
+        self.assertEqual((8, True, {"Lille": 3, "Paris": 5}), self.stock())
+
+    def test_stock_never_negative(self):
+        self.post_stock([{"product_id": "velo", "store_name": "Lille", "delta": -9}])
+        self.assertEqual((0, False, {"Lille": 0}), self.stock())
+
+    def test_invalid_update(self):
+        response = self.post_stock([{"product_id": "velo", "store_name": "Lille", "stock": 1, "delta": 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((5, True, {"Lille": 5}), self.stock())
+
+    def test_feed_token_required(self):
+        update = [{"product_id": "velo", "store_name": "Lille", "stock": 999}]
+        self.assertEqual(401, self.post_stock(update, token=None).status_code)
+        self.assertEqual(401, self.post_stock(update, token="autre").status_code)
+        with override_settings(STOCK_FEED_TOKEN=""):
+            self.assertEqual(401, self.post_stock(update, token="").status_code)
+        self.assertEqual((5, True, {"Lille": 5}), self.stock())
+
+    @override_settings(STOCK_FEED_MAX_UPDATES=2)
+    def test_batch_size_limited(self):
+        response = self.post_stock([{"product_id": "velo", "store_name": "Lille", "delta": 1}] * 3)
+        self.assertEqual(422, response.status_code)
+        self.assertEqual((5, True, {"Lille": 5}), self.stock())
+
+    def test_published_after_commit(self):
+        version = CatalogVersion.current()
+        with mock.patch("equipements.signals.on_commit", transaction.on_commit):
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.post_stock([{"product_id": "velo", "store_name": "Lille", "stock": 1}])
+                self.assertEqual(version, CatalogVersion.current())
+        self.assertEqual(1, len(callbacks))
+        callbacks[0]()
+        self.assertEqual(version[0] + 1, CatalogVersion.current()[0])
+
+    def test_listing_reflects_stock(self):
+        self.client.get("/products")
+        self.post_stock([{"product_id": "velo", "store_name": "Lille", "stock": 1}])
+        self.assertEqual(1, self.client.get("/products").json()[0]["stock_count"])
+
+    def test_feed_command_and_recompute(self):
+        path = f"{tempfile.mkdtemp()}/stock.csv"
+        with open(path, "w", encoding="utf-8") as file:
+            file.write("product_id,store_name,stock,delta\nvelo,Lille,,3\nvelo,Paris,2,\n")
+        call_command("import_stock_feed", path, stdout=StringIO())
+        self.assertEqual((10, True, {"Lille": 8, "Paris": 2}), self.stock())
+
+        Product.objects.filter(pk="velo").update(stock_count=0, in_stock=False)
+        call_command("import_stock_feed", "--recompute", stdout=StringIO())
+        self.assertEqual((10, True, {"Lille": 8, "Paris": 2}), self.stock())
+
+@api_query_budgets
+class TestSearchProducts(TestCase):
+    def setUp(self):
+        chaussure = Product.objects.create(id="1", name="Chaussure de running", brand="Kalenji", price=50,
+                                           description="Légère et amortie")
+        raquette = Product.objects.create(id="2", name="Raquette", brand="Perfly", price=30,
+                                          description="Pour débuter, aussi bien qu'une chaussure")
+        Product.objects.create(id="3", name="Ballon", brand="Kipsta", price=10)
+        ProductSports.objects.create(product=chaussure, sport="RUNNING")
+        ProductSports.objects.create(product=raquette, sport="BADMINTON")
+        ProductFeatures.objects.create(product=raquette, position=1, feature="Cordage synthétique")
+
+    def search(self, **params):
+        response = self.client.get("/products/search", params)
+        return response.status_code, [product["id"] for product in response.json()] if response.status_code == 200 else response.json()
+
+    def test_ranked_by_relevance(self):
+        # Le nom pèse plus que la description
+        self.assertEqual((200, ["1", "2"]), self.search(q="chaussure"))
+
+    def test_accents_prefix_and_all_terms(self):
+        self.assertEqual((200, ["1"]), self.search(q="legere amort"))
+        self.assertEqual((200, []), self.search(q="leg amortie"))
+        self.assertEqual((200, ["2"]), self.search(q="CORDAGE"))
+        self.assertEqual((200, []), self.search(q="chaussure ballon"))
+
+    def test_combined_with_filters(self):
+        self.assertEqual((200, ["2"]), self.search(q="chaussure", sport="BADMINTON"))
+        self.assertEqual((200, ["1"]), self.search(q="chaussure", minPrice=40))
+
+    def test_index_follows_writes(self):
+        ballon = Product.objects.get(pk="3")
+        ballon.name = "Ballon de football"
+        ballon.save()
+        self.assertEqual((200, ["3"]), self.search(q="football"))
+        ProductFeatures.objects.filter(product_id="2").update(feature="Manche en graphite")
+        self.assertEqual((200, ["2"]), self.search(q="graphite"))
+        self.assertEqual((200, []), self.search(q="cordage"))
+        Product.objects.filter(pk="1").delete()
+        self.assertEqual((200, ["2"]), self.search(q="chaussure"))
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual((200, ["1"]), self.search(q='"running*" ('))
+        self.assertEqual((200, []), self.search(q="running OR raquette"))
+        self.assertEqual(400, self.search(q="  ' ")[0])
+        self.assertEqual(400, self.search(q="ballon", limit=0)[0])
+
+    def test_rebuild_index(self):
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual((200, ["1", "2"]), self.search(q="chaussure"))
+
+class TestSearchIndexRowids(TransactionTestCase):
+    # Reconstruction de equipements_product (migration) et VACUUM renumérotent
+    # les rowid des produits : hors transaction, ni l'un ni l'autre ne le permettant
+    databases = {"default", "catalog_read"}
+
+    def setUp(self):
+        for pk, name in [("0", "Gourde"), ("1", "Chaussure"), ("2", "Raquette"), ("3", "Ballon")]:
+            Product.objects.create(id=pk, name=name)
+        # Trou dans les rowid, refermé par la reconstruction
+        Product.objects.filter(pk="0").delete()
+
+    def search(self, q):
+        return [product["id"] for product in self.client.get("/products/search", {"q": q}).json()]
+
+    def assert_index_follows_writes(self):
+        Product.objects.filter(pk="3").update(name="Maillot de football")
+        self.assertEqual(["3"], self.search("football"))
+        self.assertEqual([], self.search("ballon"))
+        Product.objects.filter(pk="1").delete()
+        self.assertEqual([], self.search("chaussure"))
+        self.assertEqual(["2"], self.search("raquette"))
+
+    def test_table_remake(self):
+        # Comme une migration AlterField : triggers retirés avant, reposés après
+        emit_pre_migrate_signal(verbosity=0, interactive=False, db="default")
+        with connection.schema_editor() as editor:
+            editor._remake_table(Product)
+        call_command("migrate", verbosity=0)
+        self.assert_index_follows_writes()
+
+    def test_vacuum(self):
+        with connection.cursor() as cursor:
+            cursor.execute("VACUUM")
+        self.assert_index_follows_writes()
+
+@api_query_budgets
+class TestProductBatch(TestCase):
+    def setUp(self):
+        catalog_cache.clear()
+        compressed_responses.clear()
+        chaussure = Product.objects.create(id="1", name="chaussure", price=10)
+        Product.objects.create(id="2", name="raquette", price=30)
+        Product.objects.create(id="3", name="ballon", price=15)
+        ProductSports.objects.create(product=chaussure, sport="RUNNING")
+
+    def test_results_in_request_order(self):
+        with self.assertNumQueries(4):
+            response = self.client.get("/products/batch?ids=3&ids=404&ids=1,3")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(["3", "1"], [product["id"] for product in data["results"]])
+        self.assertEqual(["RUNNING"], data["results"][1]["sports"])
+        self.assertEqual(["404"], data["missing"])
+
+    def test_rows_served_from_catalog_cache(self):
+        self.client.get("/products?limit=3")
+        # Lignes déjà en cache : seule la version du catalogue est lue
+        with self.assertNumQueries(1):
+            response = self.client.post("/products/batch", {"ids": ["2", "1"]}, content_type="application/json")
+        self.assertEqual(["raquette", "chaussure"], [product["name"] for product in response.json()["results"]])
+        self.assertEqual([], response.json()["missing"])
+
+    def test_post_sees_writes(self):
+        self.client.post("/products/batch", {"ids": ["1"]}, content_type="application/json")
+        Product.objects.filter(pk="1").update(name="chaussure de trail")
+        CatalogVersion.bump()
+        response = self.client.post("/products/batch", {"ids": ["1"]}, content_type="application/json")
+        self.assertEqual("chaussure de trail", response.json()["results"][0]["name"])
+
+    @override_settings(PRODUCT_BATCH_MAX_IDS=2)
+    def test_invalid_ids(self):
+        self.assertEqual(400, self.client.get("/products/batch").status_code)
+        self.assertEqual(400, self.client.get("/products/batch?ids=1,2,3").status_code)
+        response = self.client.post("/products/batch", {"ids": []}, content_type="application/json")
+        self.assertEqual(400, response.status_code)
+
+@skipUnless(Image, "paquet pillow non installé")
+@api_query_budgets
+class TestImageVariants(TestCase):
+    def setUp(self):
+        catalog_cache.clear()
+        compressed_responses.clear()
+        sources = tempfile.TemporaryDirectory()
+        cache = tempfile.TemporaryDirectory()
+        self.addCleanup(sources.cleanup)
+        self.addCleanup(cache.cleanup)
+        self.cache_dir = Path(cache.name)
+        overrides = override_settings(IMAGE_SOURCE_ROOT=sources.name, IMAGE_CACHE_DIR=cache.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        Image.new("RGB", (2000, 1000), "red").save(Path(sources.name) / "chaussure.png")
+        chaussure = Product.objects.create(id="1", name="chaussure", card_image="chaussure.png")
+        ProductImages.objects.create(product=chaussure, position=1, image_url="chaussure.png", is_card=True)
+        Product.objects.create(id="2", name="raquette", card_image="../raquette.png")
+
+    def card_image(self, product_id="1"):
+        return self.client.get(f"/products/:product_id?product_id={product_id}").json()["card_image"]
+
+    def test_build_command(self):
+        self.assertEqual("chaussure.png", self.card_image())
+        stderr = StringIO()
+        call_command("build_image_variants", stdout=StringIO(), stderr=stderr)
+        # Chemin hors de IMAGE_SOURCE_ROOT : signalé, ignoré
+        self.assertIn("../raquette.png", stderr.getvalue())
+        self.assertEqual(3, ImageVariant.objects.filter(source_url="chaussure.png").count())
+
+        # Listes et fiche référencent les variantes, sans requête de plus
+        card = self.client.get("/products").json()[0]["card_image"]
+        self.assertEqual(card, self.card_image())
+        self.assertEqual("../raquette.png", self.card_image("2"))
+        variants = self.client.get("/products/:product_id?product_id=1").json()["images"][0]["variants"]
+        self.assertEqual(["card", "detail", "thumbnail"], sorted(variants))
+        self.assertEqual(card, variants["card"])
+
+        response = self.client.get(card)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual("image/webp", response["Content-Type"])
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual((480, 240), Image.open(BytesIO(response.content)).size)
+
+    def test_get_never_builds(self):
+        version = CatalogVersion.current()
+        # Variante pas encore construite : image d'origine, sans écriture
+        response = self.client.get("/images?src=chaussure.png&variant=thumbnail")
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual("chaussure.png", response["Location"])
+        self.assertFalse(ImageVariant.objects.exists())
+        self.assertEqual(version, CatalogVersion.current())
+
+        call_command("build_image_variants", stdout=StringIO(), stderr=StringIO())
+        response = self.client.get("/images?src=chaussure.png&variant=thumbnail")
+        thumbnail = ImageVariant.objects.get(source_url="chaussure.png", variant="thumbnail")
+        self.assertEqual((160, 80), (thumbnail.width, thumbnail.height))
+        self.assertTrue(response["Location"].endswith(thumbnail.digest))
+        with self.assertNumQueries(1):
+            self.client.get("/images?src=chaussure.png&variant=thumbnail")
+
+    def test_unknown_or_invalid_images(self):
+        self.assertEqual(404, self.client.get("/images?src=https://example.com/autre.png").status_code)
+        self.assertEqual(400, self.client.get("/images?src=chaussure.png&variant=poster").status_code)
+        self.assertEqual(400, self.client.get("/images/:digest?digest=../../settings.py").status_code)
+        self.assertEqual(404, self.client.get(f"/images/:digest?digest={'0' * 64}").status_code)
+
+    def test_missing_file_is_rebuilt_by_command(self):
+        call_command("build_image_variants", stdout=StringIO(), stderr=StringIO())
+        card = self.card_image()
+        for path in self.cache_dir.rglob("*.webp"):
+            path.unlink()
+        # Fichier absent (cache vidé) : 404, reconstruit par la commande
+        self.assertEqual(404, self.client.get(card).status_code)
+        call_command("build_image_variants", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(200, self.client.get(card).status_code)
+
+class TestImageSources(SimpleTestCase):
+    def test_catalog_paths_resolve_under_front(self):
+        # Chemins des images du catalogue (dumpdjango.json), réglages par défaut
+        expected = Path(__file__).resolve().parents[2] / "front/src/assets/products/p-bad-001-1.png"
+        self.assertEqual(expected.read_bytes(), read_source("/src/assets/products/p-bad-001-1.png"))
+
+@api_query_budgets
+class TestNearestStores(TestCase):
+    def setUp(self):
+        store_index.clear()
+        velo = Product.objects.create(id="velo", name="velo")
+        Product.objects.create(id="raquette", name="raquette")
+        for name, latitude, longitude, stock in [
+            ("Lille", 50.63, 3.06, 0),
+            ("Paris", 48.86, 2.35, 2),
+            ("Lyon", 45.76, 4.84, 1),
+            ("Marseille", 43.30, 5.37, 4),
+            ("Entrepot", None, None, 3),
+        ]:
+            Store.objects.create(name=name, latitude=latitude, longitude=longitude)
+            ProductStoreStock.objects.create(product=velo, store_id=name, stock=stock)
+
+    def nearest(self, product_id="velo", lat=50.63, lon=3.06, k=2):
+        return self.client.get(f"/products/:product_id/stores?product_id={product_id}&lat={lat}&lon={lon}&k={k}")
+
+    def test_nearest_stores_in_stock(self):
+        response = self.nearest()
+        self.assertEqual(response.status_code, 200)
+        stores = response.json()
+        # Lille sans stock, Entrepot sans coordonnées : ignorés
+        self.assertEqual(["Paris", "Lyon"], [store["store_name"] for store in stores])
+        self.assertAlmostEqual(204, stores[0]["distance_km"], delta=3)
+        self.assertEqual(2, stores[0]["stock"])
+        self.assertEqual(["Paris", "Lyon", "Marseille"], [store["store_name"] for store in self.nearest(k=10).json()])
+        self.assertEqual([], self.nearest("raquette").json())
+        # Index déjà construit : version du catalogue et stocks du produit
+        with self.assertNumQueries(2):
+            self.nearest(lat=43.3, lon=5.4)
+
+    def test_store_changes_rebuild_index(self):
+        self.nearest()
+        Store.objects.create(name="Roubaix", latitude=50.69, longitude=3.18)
+        ProductStoreStock.objects.create(product_id="velo", store_id="Roubaix", stock=1)
+        self.assertEqual("Roubaix", self.nearest().json()[0]["store_name"])
+        Store.objects.filter(name="Roubaix").delete()
+        self.assertEqual("Paris", self.nearest().json()[0]["store_name"])
+
+    def test_store_changes_keep_row_cache(self):
+        catalog_cache.clear()
+        self.client.get("/products")
+        misses = catalog_cache.stats()["misses"]
+        Store.objects.create(name="Roubaix", latitude=50.69, longitude=3.18)
+        # Écriture locale : la nouvelle version ne vide pas le cache des lignes
+        self.client.get("/products")
+        self.assertEqual(misses, catalog_cache.stats()["misses"])
+
+    def test_invalid_queries(self):
+        self.assertEqual(404, self.nearest("inconnu").status_code)
+        self.assertEqual(400, self.nearest(lat=91).status_code)
+        self.assertEqual(400, self.nearest(k=0).status_code)
+
+    def test_index_matches_full_scan(self):
+        generator = random.Random(0)
+        stores = [(str(i), generator.uniform(-80, 80), generator.uniform(-180, 180)) for i in range(1000)]
+        index = StoreIndex(stores)
+        distance = lambda store, lat, lon: index.nearest(lat, lon, 1, {store[0]})[0][3]
+        for candidates in (None, {name for name, _, _ in stores[::3]}):
+            lat, lon = generator.uniform(-80, 80), generator.uniform(-180, 180)
+            expected = sorted(
+                (distance(store, lat, lon), store[0]) for store in stores
+                if candidates is None or store[0] in candidates
+            )[:10]
+            self.assertEqual([name for _, name in expected], [row[0] for row in index.nearest(lat, lon, 10, candidates)])
+
+    def test_import_stores_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete_on_close=False) as file:
+            file.write("name,latitude,longitude\nEntrepot,50.69,3.18\n")
+            file.close()
+            call_command("import_stores", file.name, stdout=StringIO())
+        self.assertEqual("Entrepot", self.nearest().json()[0]["store_name"])
+
+@api_query_budgets
+class TestMetrics(TestCase):
+    def setUp(self):
+        metrics.clear()
+        catalog_cache.clear()
+        compressed_responses.clear()
+        Product.objects.create(id="1", name="chaussure")
+
+    def series(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return dict(line.rsplit(" ", 1) for line in response.content.decode().splitlines() if not line.startswith("#"))
+
+    def test_requests_per_route(self):
+        self.client.get("/products")
+        self.client.get("/products/:product_id?product_id=1")
+        self.client.get("/products/:product_id?product_id=2")
+        self.client.get("/inconnu")
+        series = self.series()
+        route = 'method="GET",route="/products/:product_id"'
+        self.assertEqual("1", series[f'http_requests_total{{{route},status="200"}}'])
+        self.assertEqual("1", series[f'http_requests_total{{{route},status="404"}}'])
+        self.assertEqual("1", series['http_requests_total{method="GET",route="unmatched",status="404"}'])
+        self.assertEqual("2", series[f'http_request_duration_seconds_bucket{{{route},le="+Inf"}}'])
+        self.assertEqual("2", series[f'http_response_size_bytes_count{{{route}}}'])
+        # Lignes de stock, fiche puis produit inexistant : 5 + 2 requêtes
+        self.assertEqual("7", series[f'db_queries_total{{{route}}}'])
+        self.assertGreater(float(series[f'db_query_duration_seconds_total{{{route}}}']), 0)
+
+    async def test_async_requests(self):
+        await AsyncClient().get("/products")
+        series = await sync_to_async(self.series)()
+        self.assertEqual("1", series['http_requests_total{method="GET",route="/products",status="200"}'])
+        self.assertEqual("5", series['db_queries_total{method="GET",route="/products"}'])
+
+    def test_processes_are_summed(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other = [["http_requests_total", [["method", "GET"], ["route", "/sports"], ["status", "200"]], None, 3]]
+            (Path(directory) / "1-0.json").write_text(json.dumps(other))
+            self.client.get("/sports")
+            series = self.series()
+        self.assertEqual("4", series['http_requests_total{method="GET",route="/sports",status="200"}'])
+
+    def test_forked_workers_write_their_own_file(self):
+        # Workers forkés après l'import (gunicorn --preload) : un fichier par pid
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            for pid in (101, 102):
+                metrics.clear()
+                with mock.patch("equipements.metrics.os.getpid", return_value=pid):
+                    self.client.get("/sports")
+                    flush(force=True)
+            metrics.clear()
+            self.assertEqual(["101.json", "102.json"], sorted(path.name for path in Path(directory).iterdir()))
+            series = self.series()
+        self.assertEqual("2", series['http_requests_total{method="GET",route="/sports",status="200"}'])
+
+@api_query_budgets
+class TestSparseFieldsets(TestCase):
+    def setUp(self):
+        chaussure = Product.objects.create(id="1", name="chaussure", price="12.5", stock_count=3)
+        Product.objects.create(id="2", name="raquette", price=30)
+        ProductSports.objects.create(product=chaussure, sport="RUNNING")
+
+    def test_fields_limit_output(self):
+        response = self.client.get("/products?fields=price,name")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([
+            {"id": "1", "name": "chaussure", "price": "12.50"},
+            {"id": "2", "name": "raquette", "price": "30.00"},
+        ], response.json())
+        # Sports et niveaux non demandés : une seule requête produits (+ version du catalogue)
+        with self.assertNumQueries(2):
+            self.client.get("/products?fields=price&fields=stock_count")
+
+    def test_same_values_as_full_representation(self):
+        full = self.client.get("/products").json()
+        self.assertEqual(full, self.client.get(f"/products?fields={','.join(PRODUCT_FIELDS)}").json())
+
+    def test_columns_format(self):
+        response = self.client.get("/products?format=columns&fields=sports,price")
+        self.assertEqual({"id": ["1", "2"], "sports": [["RUNNING"], []], "price": ["12.50", "30.00"]}, response.json())
+        response = self.client.get("/products?format=columns&fields=price&limit=1&order=price")
+        self.assertEqual({"id": ["1"], "price": ["12.50"]}, response.json()["results"])
+        response = self.client.get(f"/products?format=columns&fields=price&limit=1&cursor={response.json()['next_cursor']}")
+        self.assertEqual({"results": {"id": ["2"], "price": ["30.00"]}, "next_cursor": None}, response.json())
+
+    def test_invalid_fields_or_format(self):
+        self.assertEqual(400, self.client.get("/products?fields=price,password").status_code)
+        self.assertEqual(400, self.client.get("/products?format=csv").status_code)
+
+@api_query_budgets
+class TestProductFacets(TestCase):
+    def setUp(self):
+        chaussure = Product.objects.create(id="1", name="chaussure", price=15)
+        raquette = Product.objects.create(id="2", name="raquette", price="35.50")
+        ballon = Product.objects.create(id="3", name="ballon", price=120)
+        ProductSports.objects.create(product=chaussure, sport="RUNNING")
+        ProductSports.objects.create(product=raquette, sport="BADMINTON")
+        ProductSports.objects.create(product=ballon, sport="RUNNING")
+        ProductLevels.objects.create(product=chaussure, level="BEGINNER")
+        ProductLevels.objects.create(product=raquette, level="EXPERT")
+
+    def facets(self, **params):
+        response = self.client.get("/products/facets", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counts_without_filters(self):
+        facets = self.facets()
+        self.assertEqual(3, facets["total"])
+        self.assertEqual(2, facets["sports"]["RUNNING"])
+        self.assertEqual(1, facets["sports"]["BADMINTON"])
+        self.assertEqual(0, facets["sports"]["YOGA"])
+        self.assertEqual({"min": "15.00", "max": "120.00"}, {k: facets["price"][k] for k in ("min", "max")})
+        self.assertEqual([1, 1, 0, 1, 0, 0], [bucket["count"] for bucket in facets["price"]["buckets"]])
+        self.assertEqual({"min": 500, "max": None, "count": 0}, facets["price"]["buckets"][-1])
+
+    def test_dimension_ignores_its_own_filter(self):
+        facets = self.facets(sport="RUNNING", maxPrice=100)
+        self.assertEqual(1, facets["total"])
+        self.assertEqual({"RUNNING": 1, "BADMINTON": 1}, {k: v for k, v in facets["sports"].items() if v})
+        self.assertEqual({"BEGINNER": 1}, {k: v for k, v in facets["levels"].items() if v})
+        # Le prix ignore son propre filtre, pas celui du sport
+        self.assertEqual("120.00", facets["price"]["max"])
+        self.assertEqual([1, 0, 0, 1, 0, 0], [bucket["count"] for bucket in facets["price"]["buckets"]])
+
+    def test_unknown_sport_matches_nothing(self):
+        facets = self.facets(sport="YOG")
+        self.assertEqual(0, facets["total"])
+        self.assertIsNone(facets["price"]["min"])
+        self.assertEqual(2, facets["sports"]["RUNNING"])
+
+    def test_write_refreshes_facets(self):
+        etag = self.client.get("/products/facets")["ETag"]
+        with self.assertNumQueries(1):
+            self.assertEqual(304, self.client.get("/products/facets", HTTP_IF_NONE_MATCH=etag).status_code)
+        with self.assertNumQueries(1):
+            self.assertEqual(3, self.facets()["total"])
+        ProductSports.objects.create(product_id="2", sport="RUNNING")
+        self.assertEqual(3, self.facets()["sports"]["RUNNING"])
+
+@api_query_budgets
+class TestAsyncServing(TestCase):
+    # Même API servie par le gestionnaire ASGI (middlewares en mode async)
+    def setUp(self):
+        User.objects.create_user(username="grace", password="apagnan")
+        Product.objects.create(id="1", name="chaussure")
+
+    async def test_login(self):
+        client = AsyncClient()
+        response = await client.post("/login", {"name": "grace", "password": "apagnan"}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        response = await client.post("/login", {"name": "grace", "password": "2pagnan"}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    async def test_register(self):
+        response = await AsyncClient().post("/register", {
+            "name": "Heidi", "password": "apagnan", "sport": "TENNIS", "niveauSportif": "EXPERT",
+        }, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        user = await User.objects.aget(username="heidi")
+        self.assertTrue(await user.acheck_password("apagnan"))
+
+    async def test_catalog_and_query_budget(self):
+        client = AsyncClient()
+        response = await client.get("/products")
+        self.assertEqual(["1"], [product["id"] for product in response.json()])
+        response = await client.get("/products", headers={"if-none-match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+        with override_settings(QUERY_BUDGETS={**settings.QUERY_BUDGETS, "GET /sports": 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                await client.get("/sports")
+
+class CountingBackend(StubBackend):
+    # Service de traduction de test : appels enregistrés, bloquant tant que
+    # release n'est pas levé
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def translate(self, texts, source, target):
+        self.calls.append(list(texts))
+        self.started.set()
+        self.release.wait(5)
+        return super().translate(texts, source, target)
+
+class FailingBackend:
+    def translate(self, texts, source, target):
+        raise TranslationBackendError("service indisponible")
+
+@api_query_budgets
+@override_settings(TRANSLATION_BACKEND="equipements.tests.CountingBackend")
+class TestTranslate(TestCase):
+    def setUp(self):
+        CountingBackend.calls.clear()
+        CountingBackend.started.clear()
+        CountingBackend.release.set()
+        upstream_quota.clear()
+
+    def translate(self, texts, source="fr", target="en", client=None):
+        return (client or self.client).post("/translate", {"texts": texts, "source": source, "target": target},
+                                            content_type="application/json")
+
+    def test_misses_only_go_upstream(self):
+        response = self.translate(["Chaussure", "Raquette", "Chaussure", " "])
+        self.assertEqual(["[en] Chaussure", "[en] Raquette", "[en] Chaussure", " "], response.json()["translations"])
+        response = self.translate(["Raquette", "Ballon"])
+        self.assertEqual(["[en] Raquette", "[en] Ballon"], response.json()["translations"])
+        self.assertEqual([["Chaussure", "Raquette"], ["Ballon"]], CountingBackend.calls)
+        self.assertEqual(3, Translation.objects.filter(source="fr", target="en").count())
+        # Mémoire par couple de langues
+        self.assertEqual(["[fr] Ballon"], self.translate(["Ballon"], "en", "fr").json()["translations"])
+
+    def test_same_language_and_validation(self):
+        self.assertEqual(["Ballon"], self.translate(["Ballon"], "fr", "fr").json()["translations"])
+        self.assertEqual([], CountingBackend.calls)
+        self.assertEqual(400, self.translate(["Ballon"], "fr", "de").status_code)
+        with override_settings(TRANSLATION_MAX_TEXTS=1):
+            self.assertEqual(400, self.translate(["Ballon", "Raquette"]).status_code)
+
+    @override_settings(TRANSLATION_MAX_TEXT_CHARS=10, TRANSLATION_MAX_TOTAL_CHARS=15)
+    def test_text_length_limited(self):
+        self.assertEqual(422, self.translate(["Chaussure de running"]).status_code)
+        self.assertEqual(422, self.translate(["Chaussure", "Raquette"]).status_code)
+        self.assertEqual(200, self.translate(["Chaussure"]).status_code)
+        self.assertEqual([["Chaussure"]], CountingBackend.calls)
+
+    @override_settings(TRANSLATION_CLIENT_CHARS=16)
+    def test_upstream_quota_per_client(self):
+        self.assertEqual(200, self.translate(["Chaussure", "Gourde"]).status_code)
+        response = self.translate(["Raquette"])
+        self.assertEqual(429, response.status_code)
+        self.assertGreater(int(response["Retry-After"]), 0)
+        # Textes déjà traduits : servis par la mémoire, hors quota
+        self.assertEqual(200, self.translate(["Gourde"]).status_code)
+        self.assertEqual(200, self.translate(["Raquette"], client=Client(REMOTE_ADDR="10.0.0.2")).status_code)
+        self.assertEqual([["Chaussure", "Gourde"], ["Raquette"]], CountingBackend.calls)
+
+    @override_settings(TRANSLATION_CLIENT_CHARS=16, TRUSTED_PROXIES=1)
+    def test_upstream_quota_behind_proxy(self):
+        # Même adresse de proxy : clients distingués par X-Forwarded-For
+        proxy = lambda forwarded: Client(REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR=forwarded)
+        self.assertEqual(200, self.translate(["Chaussure", "Gourde"], client=proxy("203.0.113.5")).status_code)
+        self.assertEqual(429, self.translate(["Raquette"], client=proxy("203.0.113.5")).status_code)
+        # Entrées ajoutées par le client lui-même ignorées
+        self.assertEqual(429, self.translate(["Raquette"], client=proxy("198.51.100.9, 203.0.113.5")).status_code)
+        self.assertEqual(200, self.translate(["Raquette"], client=proxy("203.0.113.6")).status_code)
+
+    @override_settings(TRANSLATION_BACKEND="equipements.tests.FailingBackend")
+    def test_backend_error(self):
+        response = self.translate(["Ballon"])
+        self.assertEqual(502, response.status_code)
+        self.assertFalse(Translation.objects.exists())
+
+    # Les deux requêtes partagent la connexion du test, et donc son compteur de requêtes
+    @override_settings(QUERY_BUDGETS={**settings.QUERY_BUDGETS, "POST /translate": 4})
+    async def test_concurrent_requests_coalesce(self):
+        CountingBackend.release.clear()
+        client = AsyncClient()
+        first = asyncio.ensure_future(self.translate(["Gourde", "Casquette"], client=client))
+        await asyncio.to_thread(CountingBackend.started.wait, 5)
+        second = asyncio.ensure_future(self.translate(["Casquette", "Gourde"], client=client))
+        await asyncio.sleep(0.2)
+        self.assertFalse(second.done())
+        CountingBackend.release.set()
+        first, second = await asyncio.gather(first, second)
+        self.assertEqual(["[en] Casquette", "[en] Gourde"], second.json()["translations"])
+        self.assertEqual([["Gourde", "Casquette"]], CountingBackend.calls)
+
+    async def test_cancelled_request_does_not_fail_waiters(self):
+        CountingBackend.release.clear()
+        first = asyncio.ensure_future(translate_texts(["Gourde"], "fr", "en"))
+        await asyncio.to_thread(CountingBackend.started.wait, 5)
+        second = asyncio.ensure_future(translate_texts(["Gourde"], "fr", "en"))
+        await asyncio.sleep(0.1)
+        # Client du premier appel parti : l'appel en amont continue pour le second
+        first.cancel()
+        CountingBackend.release.set()
+        self.assertEqual({"Gourde": "[en] Gourde"}, await second)
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+        self.assertEqual([["Gourde"]], CountingBackend.calls)
+        self.assertTrue(await Translation.objects.filter(text="Gourde").aexists())
+
+@api_query_budgets
+@override_settings(TRANSLATION_BACKEND="equipements.translation.StubBackend")
+class TestCatalogLanguages(TestCase):
+    def setUp(self):
+        self.chaussure = Product.objects.create(id="1", name="Chaussure", description="Légère")
+        Product.objects.create(id="2", name="Raquette", description="Solide")
+        ProductFeatures.objects.create(product=self.chaussure, position=1, feature="Semelle")
+        call_command("translate_catalog", stdout=StringIO())
+
+    def names(self, url="/products", **headers):
+        response = self.client.get(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Accept-Language", response["Vary"])
+        data = response.json()
+        return [product["name"] for product in data] if isinstance(data, list) else data["name"]
+
+    def test_language_negotiation(self):
+        self.assertEqual(["Chaussure", "Raquette"], self.names())
+        self.assertEqual(["[en] Chaussure", "[en] Raquette"], self.names("/products?lang=en"))
+        self.assertEqual(["[en] Chaussure", "[en] Raquette"], self.names(accept_language="de;q=1, en-US;q=0.8"))
+        self.assertEqual(["Chaussure", "Raquette"], self.names("/products?lang=fr", accept_language="en"))
+        self.assertEqual("[en] Raquette", self.names("/products/:product_id?product_id=2&lang=en"))
+        # Liste paginée servie depuis le cache, dans chaque langue
+        response = self.client.get("/products?limit=1&lang=en")
+        self.assertEqual(["[en] Chaussure"], [product["name"] for product in response.json()["results"]])
+
+    def test_translated_details(self):
+        response = self.client.get("/products/:product_id?product_id=1&lang=en").json()
+        self.assertEqual(("[en] Chaussure", "[en] Légère", ["[en] Semelle"]),
+                         (response["name"], response["description"], response["features"]))
+        # Caractéristique ajoutée depuis la traduction : langue source
+        ProductFeatures.objects.create(product=self.chaussure, position=2, feature="Laçage")
+        response = self.client.get("/products/:product_id?product_id=1&lang=en").json()
+        self.assertEqual(["Semelle", "Laçage"], response["features"])
+
+    def test_stale_translation_not_served(self):
+        # Écriture en masse (sans signaux ni nouveau passage de translate_catalog),
+        # publiée comme par l'import
+        Product.objects.filter(pk="1").update(description="Légère et solide")
+        CatalogVersion.bump()
+        catalog_cache.clear()
+        response = self.client.get("/products/:product_id?product_id=1&lang=en").json()
+        self.assertEqual(("Chaussure", "Légère et solide", ["Semelle"]),
+                         (response["name"], response["description"], response["features"]))
+        # Nom inchangé : toujours traduit dans les listes
+        self.assertEqual(["[en] Chaussure", "[en] Raquette"], self.names("/products?lang=en"))
+        Product.objects.filter(pk="2").update(name="Raquette de badminton")
+        CatalogVersion.bump()
+        catalog_cache.clear()
+        self.assertEqual(["[en] Chaussure", "Raquette de badminton"], self.names("/products?lang=en"))
+        response = self.client.get("/products?lang=en&fields=name&format=columns").json()
+        self.assertEqual(["[en] Chaussure", "Raquette de badminton"], response["name"])
+
+    def test_etag_depends_on_language(self):
+        etag = self.client.get("/products")["ETag"]
+        response = self.client.get("/products?lang=en", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_only_changed_products_are_translated_again(self):
+        translation = ProductTranslation.objects.get(product_id="1", lang="en")
+        self.assertEqual(("[en] Légère", ["[en] Semelle"]), (translation.description, translation.features))
+        self.chaussure.name = "Chaussure de trail"
+        self.chaussure.save()
+        # Traduction périmée jusqu'au prochain passage : langue source
+        self.assertEqual(["Chaussure de trail", "[en] Raquette"], self.names("/products?lang=en"))
+        with mock.patch.object(StubBackend, "translate", autospec=True, side_effect=StubBackend.translate) as translate:
+            call_command("translate_catalog", "--lang", "en", stdout=StringIO())
+        self.assertEqual(["Chaussure de trail"], translate.call_args.args[1])
+        self.assertEqual(["[en] Chaussure de trail", "[en] Raquette"], self.names("/products?lang=en"))
+
+class TestCatalogReadRouter(SimpleTestCase):
+    router = CatalogReadRouter()
+
+    def test_catalog_reads_on_read_only_alias(self):
+        self.assertEqual("catalog_read", self.router.db_for_read(Product))
+        self.assertEqual("catalog_read", self.router.db_for_read(CatalogVersion))
+        self.assertIsNone(self.router.db_for_read(User))
+        self.assertEqual("default", self.router.db_for_write(Product))
+
+    def test_reads_follow_write_transaction(self):
+        with mock.patch.object(connections["default"], "in_atomic_block", True):
+            self.assertEqual("default", self.router.db_for_read(Product))
+
+    def test_migrations_only_on_default(self):
+        self.assertTrue(self.router.allow_migrate("default", "equipements"))
+        self.assertFalse(self.router.allow_migrate("catalog_read", "equipements"))
+
+class TestCatalogReadConnection(TransactionTestCase):
+    # Hors de la transaction de TestCase (qui ramène les lectures sur default) :
+    # lectures réellement servies par l'alias catalog_read
+    databases = {"default", "catalog_read"}
+
+    def setUp(self):
+        catalog_cache.clear()
+        compressed_responses.clear()
+        Product.objects.create(id="1", name="chaussure")
+        self.client.get("/products")
+
+    def test_catalog_reads_served_by_read_alias(self):
+        catalog_cache.clear()
+        with CaptureQueriesContext(connections["catalog_read"]) as reads, \
+                CaptureQueriesContext(connections["default"]) as default:
+            response = self.client.get("/products")
+        self.assertEqual(["chaussure"], [product["name"] for product in response.json()])
+        self.assertTrue(reads.captured_queries)
+        self.assertEqual([], default.captured_queries)
@@ -0,0 +1,48 @@
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from ninja.security import APIKeyHeader, HttpBearer
+
+from equipements.models import RevokedToken
+
+TOKEN_SALT = "equipements.tokens"
+
+def issue_token(user):
+    # Jeton signé (HMAC, SECRET_KEY) et horodaté : id utilisateur + identifiant de jeton
+    return signing.dumps({"uid": user.id, "jti": secrets.token_urlsafe(12)}, salt=TOKEN_SALT)
+
+def verify_token(token):
+    # Signature et âge sans base ni hachage, puis révocation : une lecture
+    # par clé primaire, seulement pour un jeton valide
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=settings.AUTH_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    if RevokedToken.objects.filter(jti=payload["jti"]).exists():
+        return None
+    return payload
+
+def revoke_token(payload):
+    # Borne haute de l'expiration : l'horodatage exact n'est pas dans le contenu
+    now = timezone.now()
+    RevokedToken.objects.filter(expires_at__lte=now).delete()
+    RevokedToken.objects.create(jti=payload["jti"], expires_at=now + timedelta(seconds=settings.AUTH_TOKEN_MAX_AGE))
+
+class TokenAuth(HttpBearer):
+    # En-tête "Authorization: Bearer <jeton>" ; request.auth = {"uid", "jti"}
+    def authenticate(self, request, token):
+        return verify_token(token)
+
+class StockFeedAuth(APIKeyHeader):
+    # Flux de stock des magasins (POST /stock) : en-tête "X-Stock-Feed-Token"
+    # égal à settings.STOCK_FEED_TOKEN ; sans jeton configuré, tout est refusé
+    param_name = "X-Stock-Feed-Token"
+
+    def authenticate(self, request, key):
+        expected = settings.STOCK_FEED_TOKEN
+        if expected and key and secrets.compare_digest(key.encode(), expected.encode()):
+            return "stock-feed"
+        return None
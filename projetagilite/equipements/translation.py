@@ -0,0 +1,248 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from equipements.cache import catalog_cache
+from equipements.models import CatalogVersion, Product, ProductFeatures, ProductTranslation, Translation
+
+class TranslationBackendError(Exception):
+    pass
+
+class TranslationQuotaError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"quota de traduction atteint, réessayer dans {retry_after} s")
+        self.retry_after = retry_after
+
+class StubBackend:
+    # Traduction locale factice (tests, développement sans clé DeepL)
+    def translate(self, texts, source, target):
+        return [f"[{target}] {text}" for text in texts]
+
+class DeepLBackend:
+    # API v2 de DeepL, clé settings.DEEPL_API_KEY, 50 textes max par appel
+    batch_size = 50
+
+    def translate(self, texts, source, target):
+        translated = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            body = urlencode(
+                [("text", text) for text in batch]
+                + [("source_lang", source.upper()), ("target_lang", target.upper())]
+            ).encode()
+            request = Request(settings.DEEPL_API_URL, data=body, headers={
+                "Authorization": f"DeepL-Auth-Key {settings.DEEPL_API_KEY}",
+                "Content-Type": "application/x-www-form-urlencoded",
+            })
+            try:
+                with urlopen(request, timeout=settings.TRANSLATION_TIMEOUT) as response:
+                    payload = json.load(response)
+                translated += [item["text"] for item in payload["translations"]][:len(batch)]
+            except (URLError, OSError, ValueError, KeyError, TypeError) as exc:
+                raise TranslationBackendError(f"DeepL : {exc}") from exc
+        if len(translated) != len(texts):
+            raise TranslationBackendError("DeepL : nombre de traductions inattendu")
+        return translated
+
+# Appels au service de traduction (E/S réseau) hors de la boucle d'événements,
+# au plus TRANSLATION_WORKERS en parallèle
+executor = ThreadPoolExecutor(
+    max_workers=settings.TRANSLATION_WORKERS,
+    thread_name_prefix="translation",
+)
+
+class InFlight:
+    # Traductions en cours, par processus : une requête qui demande un texte
+    # déjà demandé en amont attend ce résultat au lieu d'un second appel.
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = Lock()
+
+    def claim(self, keys):
+        # -> (clés à traduire par l'appelant, {clé: Future} de toutes les clés)
+        claimed, futures = [], {}
+        with self._lock:
+            for key in keys:
+                if key not in self._calls:
+                    self._calls[key] = Future()
+                    claimed.append(key)
+                futures[key] = self._calls[key]
+        return claimed, futures
+
+    def resolve(self, keys, values):
+        with self._lock:
+            futures = [self._calls.pop(key) for key in keys]
+        for future, value in zip(futures, values):
+            future.set_result(value)
+
+    def fail(self, keys, exc):
+        with self._lock:
+            futures = [self._calls.pop(key) for key in keys]
+        for future in futures:
+            future.set_exception(exc)
+
+in_flight = InFlight()
+
+class UpstreamQuota:
+    # Caractères envoyés au service de traduction par client (adresse IP), par
+    # fenêtre fixe de TRANSLATION_CLIENT_WINDOW secondes, en mémoire et par
+    # processus. Les textes déjà dans la mémoire de traduction ne comptent pas.
+
+    def __init__(self):
+        self._usage = {}
+        self._lock = Lock()
+
+    def consume(self, client, amount):
+        # Lève TranslationQuotaError si le quota de la fenêtre courante est dépassé
+        window = settings.TRANSLATION_CLIENT_WINDOW
+        now = time.monotonic()
+        with self._lock:
+            start, used = self._usage.get(client, (now, 0))
+            if now - start >= window:
+                start, used = now, 0
+            if used + amount > settings.TRANSLATION_CLIENT_CHARS:
+                raise TranslationQuotaError(int(start + window - now) + 1)
+            if client not in self._usage:
+                # Fenêtres terminées retirées à l'arrivée d'un nouveau client
+                self._usage = {key: value for key, value in self._usage.items() if now - value[0] < window}
+            self._usage[client] = (start, used + amount)
+
+    def clear(self):
+        with self._lock:
+            self._usage.clear()
+
+upstream_quota = UpstreamQuota()
+
+def digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def recall(texts, source, target):
+    # Une requête sur la clé primaire (source, target, digest)
+    by_digest = {digest(text): text for text in texts}
+    rows = Translation.objects.filter(source=source, target=target, digest__in=list(by_digest)).values_list(
+        "digest", "translation")
+    return {by_digest[text_digest]: translation for text_digest, translation in rows}
+
+def remember(translations, source, target):
+    Translation.objects.bulk_create(
+        [
+            Translation(source=source, target=target, digest=digest(text), text=text, translation=translation)
+            for text, translation in translations.items()
+        ],
+        ignore_conflicts=True,
+    )
+
+# Appels en cours (référence forte : une tâche sans référence peut être collectée)
+fetches = set()
+
+async def fetch(keys, source, target):
+    # Appel au service puis mémorisation, dans une tâche à part : menée à terme
+    # même si la requête qui l'a lancée est annulée (client parti), les autres
+    # requêtes attendant les mêmes textes en dépendent
+    texts = [text for _, _, text in keys]
+    try:
+        backend = import_string(settings.TRANSLATION_BACKEND)()
+        translated = await asyncio.get_running_loop().run_in_executor(
+            executor, backend.translate, texts, source, target)
+        await sync_to_async(remember)(dict(zip(texts, translated)), source, target)
+    except asyncio.CancelledError:
+        # Boucle d'événements arrêtée : les requêtes en attente ne restent pas bloquées
+        in_flight.fail(keys, TranslationBackendError("traduction interrompue"))
+        raise
+    except Exception as exc:
+        in_flight.fail(keys, exc)
+    else:
+        in_flight.resolve(keys, translated)
+
+async def translate_texts(texts, source, target, client=None):
+    # -> {texte: traduction} pour les textes non vides, dédoublonnés. client :
+    # quota de caractères envoyés au service (upstream_quota), aucun si None
+    texts = list(dict.fromkeys(text for text in texts if text.strip()))
+    if not texts or source == target:
+        return {text: text for text in texts}
+
+    translations = await sync_to_async(recall)(texts, source, target)
+    misses = [text for text in texts if text not in translations]
+    if client is not None and misses:
+        upstream_quota.consume(client, sum(len(text) for text in misses))
+    claimed, futures = in_flight.claim([(source, target, text) for text in misses])
+    if claimed:
+        task = asyncio.ensure_future(fetch(claimed, source, target))
+        fetches.add(task)
+        task.add_done_callback(fetches.discard)
+    for (_, _, text), future in futures.items():
+        # shield : une requête annulée n'annule pas le résultat partagé
+        translations[text] = await asyncio.shield(asyncio.wrap_future(future))
+    return translations
+
+def source_digest(name, description, features):
+    return digest(json.dumps([name, description, features], ensure_ascii=False))
+
+def translate_catalog(lang, batch_size=500):
+    # Traduit les produits sans traduction à jour dans lang, par lots d'ids
+    # croissants ; les textes répétés (caractéristiques, marques...) ne sont
+    # envoyés qu'une fois au service grâce à la mémoire de traduction.
+    source = settings.CATALOG_SOURCE_LANGUAGE
+    translated = 0
+    last_id = ""
+    while products := list(
+        Product.objects.filter(pk__gt=last_id).order_by("pk").values_list("id", "name", "description")[:batch_size]
+    ):
+        last_id = products[-1][0]
+        product_ids = [product_id for product_id, _, _ in products]
+        features = defaultdict(list)
+        for product_id, feature in (
+            ProductFeatures.objects.filter(product_id__in=product_ids)
+            .order_by("product_id", "position")
+            .values_list("product_id", "feature")
+        ):
+            features[product_id].append(feature)
+        current = dict(
+            ProductTranslation.objects.filter(product_id__in=product_ids, lang=lang)
+            .values_list("product_id", "source_digest")
+        )
+
+        stale = []
+        for product_id, name, description in products:
+            fields = (name, description, features[product_id])
+            if current.get(product_id) != source_digest(*fields):
+                stale.append((product_id, fields))
+        if stale:
+            texts = [text for _, (name, description, product_features) in stale
+                     for text in (name, description, *product_features)]
+            translations = async_to_sync(translate_texts)(texts, source, lang)
+            ProductTranslation.objects.bulk_create(
+                [
+                    ProductTranslation(
+                        product_id=product_id,
+                        lang=lang,
+                        name=translations.get(name, name),
+                        description=translations.get(description, description),
+                        features=[translations.get(feature, feature) for feature in product_features],
+                        source_digest=source_digest(name, description, product_features),
+                        source_name=name,
+                    )
+                    for product_id, (name, description, product_features) in stale
+                ],
+                update_conflicts=True,
+                unique_fields=["product", "lang"],
+                update_fields=["name", "description", "features", "source_digest", "source_name"],
+            )
+            catalog_cache.invalidate_many([product_id for product_id, _ in stale])
+            translated += len(stale)
+
+    if translated:
+        CatalogVersion.bump()
+    return translated
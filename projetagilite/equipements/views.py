@@ -1,11 +1,34 @@
 from django.shortcuts import render
-from django.http import JsonResponse
-from django.views.decorators.http import require_GET
-from equipements.models import Product, Sport,User
-from ninja import NinjaAPI,Schema
-from django.contrib.auth.hashers import check_password
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import CharField, F, Func, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.translation.trans_real import parse_accept_lang_header
+from django.views.decorators.http import condition, require_GET
+from equipements.models import LEVEL_BITS, SPORT_BITS, CatalogVersion, Product, ProductLevels, ProductSports, ProductTranslation, Sport,User, masks_matching, normalize_username
+from equipements.cache import cache_key, catalog_cache
+from equipements.compression import precompressed
+from equipements.images import VARIANT_CONTENT_TYPE, card_image_url, find_variant_url, read_variant
+from equipements.detail import cached_product_details
+from equipements import hashing
+from equipements.tokens import StockFeedAuth, TokenAuth, issue_token, revoke_token
+from equipements.facets import cached_facets
+from equipements.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, collect, render as render_metrics
+from equipements.recommendations import recommended_product_ids, user_segment
+from equipements.search import DEFAULT_SEARCH_LIMIT, match_expression, search_product_ids
+from equipements.translation import TranslationBackendError, TranslationQuotaError, translate_texts
+from equipements.stores import nearest_stores
+from equipements.stock import StockFeedError, apply_stock_updates, parse_update
+from equipements.pagination import MAX_PAGE_SIZE, ORDERINGS, InvalidCursor, encode_cursor, paginate
+from ninja import NinjaAPI,Query,Schema
+from asgiref.sync import sync_to_async
 import json
-from typing import Optional
+import re
+from collections import defaultdict
+from functools import wraps
+from typing import List, Optional
 
 api = NinjaAPI()
 
@@ -24,48 +47,427 @@ class UserEdit(Schema):
     sport: Optional[str] = None
     level: Optional[str] = None
 
-def product_to_response(product):
+class StockUpdate(Schema):
+    product_id: str
+    store_name: str
+    stock: Optional[int] = None
+    delta: Optional[int] = None
+
+class BatchInput(Schema):
+    ids: List[str]
+
+class TranslateInput(Schema):
+    texts: List[str]
+    source: str
+    target: str
+
+def product_to_response(product, sports, levels):
     return {
         "id": product.id,
-        "sports": list(product.sports.values_list("sport", flat=True)),
-        "levels": list(product.levels.values_list("level", flat=True)),
-        "name": product.name,
-        "price": product.price,
-        "card_image": product.card_image,
+        "sports": sports,
+        "levels": levels,
+        "name": getattr(product, "translated_name", None) or product.name,
+        # Chaîne comme l'encodage JSON de Django ("12.50") : les lignes en cache
+        # s'encodent ensuite sans appel à l'encodeur par Decimal
+        "price": str(product.price),
+        # Variante "card" redimensionnée si elle existe (cf. equipements/images.py)
+        "card_image": getattr(product, "card_image_url", product.card_image),
         "stock_count": product.stock_count,
     }
 
-# Create your views here.
-@api.get("/products")
-def get_product(request, sport:str = None, level:str = None, minPrice:int = None, maxPrice:int = None):
+def group_by_product(rows):
+    grouped = defaultdict(list)
+    for product_id, value in rows:
+        grouped[product_id].append(value)
+    return grouped
+
+def is_translated(lang):
+    return lang is not None and lang != settings.CATALOG_SOURCE_LANGUAGE
+
+def translated_name(lang):
+    # Traduction périmée (nom modifié depuis translate_catalog) : langue source
+    translations = ProductTranslation.objects.filter(product=OuterRef("pk"), lang=lang, source_name=OuterRef("name"))
+    return Subquery(translations.values("name"))
+
+def translated(products, lang):
+    # Nom traduit lu dans la même requête que le produit (langue source à défaut)
+    if not is_translated(lang):
+        return products
+    return products.annotate(translated_name=translated_name(lang))
+
+def products_to_response(products, lang=None):
+    # Sports et niveaux chargés pour tout le queryset en une requête chacun
+    # (sous-requête sur les ids), au lieu de 2 requêtes par produit.
+    product_ids = products.values("pk")
+    sports = group_by_product(
+        ProductSports.objects.filter(product__in=product_ids)
+        .order_by("product", "sport")
+        .values_list("product_id", "sport")
+    )
+    levels = group_by_product(
+        ProductLevels.objects.filter(product__in=product_ids)
+        .order_by("product", "level")
+        .values_list("product_id", "level")
+    )
+    return [
+        product_to_response(product, sports[product.id], levels[product.id])
+        for product in translated(products, lang).annotate(card_image_url=card_image_url())
+    ]
+
+# Champs de la représentation produit (product_to_response), pour ?fields=
+PRODUCT_FIELDS = ("id", "sports", "levels", "name", "price", "card_image", "stock_count")
+LISTING_FORMATS = ("objects", "columns")
+
+# Prix formaté par SQLite, identique à str(Decimal) : pas de conversion en
+# Decimal à la lecture ni à l'encodage JSON
+PRICE_TEXT = Func(Value("%.2f"), F("price"), function="printf", output_field=CharField())
+
+def parse_fields(values):
+    # fields=id,price ou fields=id&fields=price ; id toujours renvoyé.
+    # -> champs dans l'ordre de PRODUCT_FIELDS, None si un champ est inconnu
+    requested = {name.strip() for value in values for name in value.split(",")} - {""}
+    if requested - set(PRODUCT_FIELDS):
+        return None
+    return [name for name in PRODUCT_FIELDS if name == "id" or name in requested]
+
+def product_column(name, lang):
+    if name == "price":
+        return PRICE_TEXT
+    if name == "name" and is_translated(lang):
+        return Coalesce(translated_name(lang), F("name"))
+    if name == "card_image":
+        return card_image_url()
+    return F(name)
+
+def product_columns(products, fields, lang=None, product_ids=None):
+    # Représentation en colonnes {champ: [valeurs]} : seules les colonnes
+    # demandées sont lues, sports et niveaux (une requête chacun) si demandés.
+    # product_ids : ordre des lignes, sinon celui du queryset.
+    selected = [name for name in fields if name not in ("sports", "levels")]
+    rows = list(products.values_list(*[product_column(name, lang) for name in selected]))
+    if product_ids is not None:
+        position = {product_id: i for i, product_id in enumerate(product_ids)}
+        rows.sort(key=lambda row: position[row[0]])
+    values = dict(zip(selected, (list(column) for column in zip(*rows))))
+    for name, model in (("sports", ProductSports), ("levels", ProductLevels)):
+        if name in fields:
+            grouped = group_by_product(
+                model.objects.filter(product__in=products.values("pk"))
+                .order_by("product", name[:-1])
+                .values_list("product_id", name[:-1])
+            )
+            values[name] = [grouped[product_id] for product_id in values.get("id", [])]
+    return {name: values.get(name, []) for name in fields}
+
+def listing_response(columns, format, **extra):
+    # format=columns : tableaux parallèles (noms de champs une seule fois)
+    if format == "objects":
+        columns = [dict(zip(columns, row)) for row in zip(*columns.values())]
+    payload = {"results": columns, **extra} if extra else columns
+    return JsonResponse(payload, safe=False, json_dumps_params={"separators": (",", ":")})
+
+# Au-delà, on re-sérialise tout le queryset filtré plutôt qu'un IN (...) géant.
+CACHE_LOAD_BATCH = 500
+
+def row_loader(products, lang=None):
+    def load(missing):
+        missing = [key[0] if isinstance(key, tuple) else key for key in missing]
+        source = products if len(missing) > CACHE_LOAD_BATCH else Product.objects.filter(pk__in=missing)
+        return {cache_key(row["id"], lang): row for row in products_to_response(source, lang)}
+    return load
+
+def cached_products_to_response(products, product_ids=None, lang=None):
+    # Lecture via le cache catalogue : une requête pour les ids, puis seules
+    # les lignes absentes du cache sont sérialisées (3 requêtes max).
+    if product_ids is None:
+        product_ids = list(products.values_list("id", flat=True))
+    keys = [cache_key(product_id, lang) for product_id in product_ids]
+    return catalog_cache.get_many(keys, row_loader(products, lang))
+
+def request_language(request):
+    # ?lang= prioritaire, puis Accept-Language ; langue source par défaut
+    candidates = [request.GET.get("lang", "")]
+    candidates += [lang for lang, _ in parse_accept_lang_header(request.headers.get("Accept-Language", ""))]
+    for candidate in candidates:
+        lang = candidate.split("-")[0].lower()
+        if lang in settings.CATALOG_LANGUAGES:
+            return lang
+    return settings.CATALOG_SOURCE_LANGUAGE
+
+def client_address(request):
+    # Derrière settings.TRUSTED_PROXIES proxys, adresse vue par le plus éloigné
+    # d'entre eux ; les entrées précédentes viennent du client lui-même
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if settings.TRUSTED_PROXIES and forwarded:
+        addresses = [address.strip() for address in forwarded.split(",")]
+        return addresses[-min(settings.TRUSTED_PROXIES, len(addresses))]
+    return request.META.get("REMOTE_ADDR")
+
+def read_catalog_version(request):
+    request.catalog_version = CatalogVersion.current()
+    catalog_cache.sync(request.catalog_version[0])
+
+async def catalog_version(request):
+    # Lue une seule fois par requête, pour l'ETag comme pour Last-Modified
+    if not hasattr(request, "catalog_version"):
+        await sync_to_async(read_catalog_version)(request)
+    return request.catalog_version
+
+def catalog_etag(request, *args, **kwargs):
+    return f"catalog-{request.catalog_version[0]}-{request.catalog_lang}"
+
+def catalog_last_modified(request, *args, **kwargs):
+    return request.catalog_version[1]
+
+def catalog_condition(view):
+    # GET conditionnel : 304 sans requête catalogue ni sérialisation si le client est à jour.
+    # Les fonctions etag / last_modified de condition() sont synchrones : la
+    # version est donc lue (en async) avant.
+    conditional = condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)(view)
+
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        await catalog_version(request)
+        request.catalog_lang = request_language(request)
+        response = await conditional(request, *args, **kwargs)
+        patch_vary_headers(response, ["Accept-Language"])
+        if response.has_header("Content-Encoding") and not response["ETag"].startswith("W/"):
+            # Même ETag pour toutes les variantes compressées : faible, comme GZipMiddleware
+            response["ETag"] = f"W/{response['ETag']}"
+        return response
+    return inner
+
+# Les endpoints sont async (servis sans bloquer de worker en ASGI, cf. README).
+# Les lectures du catalogue en plusieurs requêtes (cache + sérialisation)
+# passent par un seul sync_to_async plutôt qu'un aller-retour de thread par requête.
+
+def filter_products(sport, level, minPrice, maxPrice):
     products = Product.objects.all()
 
-    # Filtrage
-    if sport != None:
-        products = products.filter(sports__sport__icontains=sport)
-    if level != None:
-        products = products.filter(levels__level__icontains=level)
+    # Filtrage : plusieurs valeurs possibles par critère (ex: level=BEGINNER&level=EXPERT).
+    # Les masques dénormalisés sur Product évitent toute jointure : un produit
+    # n'apparait qu'une fois et le filtre est servi par product_filter_idx.
+    if sport:
+        products = products.filter(sports_mask__in=masks_matching(SPORT_BITS, sport))
+    if level:
+        products = products.filter(levels_mask__in=masks_matching(LEVEL_BITS, level))
     if minPrice != None:
         products = products.filter(price__gte = minPrice)
     if maxPrice != None:
         products = products.filter(price__lte = maxPrice)
+    return products
 
-    result = [
-        product_to_response(product)
-        for product in products
-    ]
+# Create your views here.
+@api.get("/products")
+@catalog_condition
+@precompressed
+async def get_product(request, sport:List[str] = Query(None), level:List[str] = Query(None), minPrice:int = None, maxPrice:int = None,
+                limit:int = None, cursor:str = None, order:str = "price", lang:str = None,
+                fields:List[str] = Query(None), format:str = "objects"):
+    products = filter_products(sport, level, minPrice, maxPrice)
+
+    # ?fields= et/ou format=columns : lecture directe des seules colonnes utiles
+    # (hors cache, qui garde des lignes complètes)
+    projected = bool(fields) or format != "objects"
+    if format not in LISTING_FORMATS:
+        return JsonResponse({"error": "format invalide"}, status=400)
+    fields = parse_fields(fields or PRODUCT_FIELDS)
+    if fields is None:
+        return JsonResponse({"error": f"fields parmi {', '.join(PRODUCT_FIELDS)}"}, status=400)
+
+    if limit is None:
+        if projected:
+            columns = await sync_to_async(product_columns)(products.order_by("id"), fields, request.catalog_lang)
+            return listing_response(columns, format)
+        result = await sync_to_async(cached_products_to_response)(products.order_by("id"), lang=request.catalog_lang)
+        return JsonResponse(result, safe=False)
+
+    # Pagination par curseur (optionnelle) : ?limit=20&order=price puis ?cursor=<next_cursor>
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return JsonResponse({"error": f"limit doit etre entre 1 et {MAX_PAGE_SIZE}"}, status=400)
+    if order not in ORDERINGS:
+        return JsonResponse({"error": "order invalide"}, status=400)
+    try:
+        page = paginate(products, order, limit, cursor)
+        keys = [key async for key in page.values_list("id", ORDERINGS[order][0])]
+    except InvalidCursor:
+        return JsonResponse({"error": "cursor invalide"}, status=400)
+
+    next_cursor = None
+    if len(keys) > limit:
+        keys.pop()
+        last_id, last_value = keys[-1]
+        next_cursor = encode_cursor(order, last_value, last_id)
+    if projected:
+        product_ids = [product_id for product_id, _ in keys]
+        columns = await sync_to_async(product_columns)(
+            Product.objects.filter(pk__in=product_ids), fields, request.catalog_lang, product_ids)
+        return listing_response(columns, format, next_cursor=next_cursor)
+    result = await sync_to_async(cached_products_to_response)(
+        page, [product_id for product_id, _ in keys], request.catalog_lang)
+    return JsonResponse({"results": result, "next_cursor": next_cursor})
+
+# Compteurs des filtres de la page produits (sports, niveaux, prix) pour les
+# filtres courants, sans télécharger le catalogue
+@api.get("/products/facets")
+@catalog_condition
+async def get_product_facets(request, sport:List[str] = Query(None), level:List[str] = Query(None), minPrice:int = None,
+                             maxPrice:int = None):
+    facets = await sync_to_async(cached_facets)(request.catalog_version, sport, level, minPrice, maxPrice)
+    return JsonResponse(facets)
+
+# Recherche plein texte (name, brand, category, description, features), classée
+# par pertinence et combinable avec les filtres de /products
+@api.get("/products/search")
+@catalog_condition
+async def search_products(request, q:str, sport:List[str] = Query(None), level:List[str] = Query(None), minPrice:int = None,
+                    maxPrice:int = None, limit:int = DEFAULT_SEARCH_LIMIT, lang:str = None):
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return JsonResponse({"error": f"limit doit etre entre 1 et {MAX_PAGE_SIZE}"}, status=400)
+    if not match_expression(q):
+        return JsonResponse({"error": "q doit contenir au moins un mot"}, status=400)
+    products = filter_products(sport, level, minPrice, maxPrice)
+    product_ids = await sync_to_async(search_product_ids)(q, products, limit)
+    result = await sync_to_async(cached_products_to_response)(
+        Product.objects.filter(pk__in=product_ids), product_ids, request.catalog_lang)
     return JsonResponse(result, safe=False)
 
+def parse_ids(values):
+    # ids=1&ids=2 ou ids=1,2 ; doublons retirés, ordre de la demande gardé
+    return list(dict.fromkeys(product_id.strip() for value in values for product_id in value.split(",") if product_id.strip()))
+
+def batch_response(product_ids, lang):
+    # Lignes de liste servies par le cache catalogue, les absentes chargées
+    # ensemble (3 requêtes), quel que soit le nombre d'ids
+    if not product_ids:
+        return JsonResponse({"error": "ids requis"}, status=400)
+    if len(product_ids) > settings.PRODUCT_BATCH_MAX_IDS:
+        return JsonResponse({"error": f"{settings.PRODUCT_BATCH_MAX_IDS} ids maximum"}, status=400)
+    results = cached_products_to_response(Product.objects.filter(pk__in=product_ids), product_ids, lang)
+    found = {row["id"] for row in results}
+    return JsonResponse({
+        "results": results,
+        "missing": [product_id for product_id in product_ids if product_id not in found],
+    })
+
+# Plusieurs produits connus (liste d'envies, panier, vus récemment) en un appel :
+# ?ids=1&ids=2 ou ids=1,2, ou en POST {"ids": [...]} pour les longues listes
+@api.get("/products/batch")
+@catalog_condition
+@precompressed
+async def get_products_batch(request, ids:List[str] = Query(None), lang:str = None):
+    return await sync_to_async(batch_response)(parse_ids(ids or []), request.catalog_lang)
+
+@api.post("/products/batch")
+async def post_products_batch(request, payload: BatchInput, lang:str = None):
+    await catalog_version(request)
+    return await sync_to_async(batch_response)(parse_ids(payload.ids), request_language(request))
+
+# Fiche produit : champs de la liste, plus caractéristiques, images et stock
+# par magasin (cf. equipements/detail.py), traduits selon ?lang= ou Accept-Language
 @api.get("/products/:product_id")
-def get_product_by_id(request, product_id):
-    product = Product.objects.filter(id=product_id).first()
-    if product is None:
+@catalog_condition
+@precompressed
+async def get_product_by_id(request, product_id, lang:str = None):
+    result = await sync_to_async(cached_product_details)([product_id], request.catalog_lang)
+    if not result:
+        return JsonResponse({"error": "Could not find product"}, status=404)
+    return JsonResponse(result[0])
+
+# Magasins les plus proches de (lat, lon) ayant le produit en stock, par un
+# index spatial en mémoire (cf. equipements/stores.py)
+@api.get("/products/:product_id/stores")
+@catalog_condition
+async def get_product_stores(request, product_id, lat:float, lon:float, k:int = 5):
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return JsonResponse({"error": "lat / lon invalides"}, status=400)
+    if not 1 <= k <= settings.NEAREST_STORES_MAX_K:
+        return JsonResponse({"error": f"k doit etre entre 1 et {settings.NEAREST_STORES_MAX_K}"}, status=400)
+    stores = await sync_to_async(nearest_stores)(product_id, lat, lon, k, request.catalog_version)
+    if stores is None:
         return JsonResponse({"error": "Could not find product"}, status=404)
-    return JsonResponse(product_to_response(product))
+    return JsonResponse(stores, safe=False)
+
+# Images du catalogue redimensionnées (vignette, carte, fiche), construites par
+# la commande build_image_variants (cf. equipements/images.py)
+@api.get("/images")
+async def get_image_variant(request, src:str, variant:str = "card"):
+    if variant not in settings.IMAGE_VARIANTS:
+        return JsonResponse({"error": f"variant parmi {', '.join(settings.IMAGE_VARIANTS)}"}, status=400)
+    url = await sync_to_async(find_variant_url)(src, variant)
+    if url is None:
+        return JsonResponse({"error": "Could not find image"}, status=404)
+    response = HttpResponseRedirect(url)
+    # L'empreinte change si l'image source est reconstruite : redirection
+    # courte, et pas gardée vers l'image d'origine (variante pas encore construite)
+    response["Cache-Control"] = "public, max-age=3600" if url != src else "no-cache"
+    return response
+
+@api.get("/images/:digest")
+async def get_image_file(request, digest:str):
+    if not re.fullmatch("[0-9a-f]{64}", digest):
+        return JsonResponse({"error": "digest invalide"}, status=400)
+    content = await sync_to_async(read_variant)(digest)
+    if content is None:
+        return JsonResponse({"error": "Could not find image"}, status=404)
+    response = HttpResponse(content, content_type=VARIANT_CONTENT_TYPE)
+    # Contenu fixé par l'empreinte : jamais revalidé par le navigateur
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    response["ETag"] = f'"{digest}"'
+    return response
+
+@api.get("/catalog/cache")
+async def get_catalog_cache_stats(request):
+    return JsonResponse(catalog_cache.stats())
+
+# Métriques au format texte Prometheus (durées, tailles, requêtes SQL par route),
+# de tous les processus si METRICS_DIR est défini
+@api.get("/metrics")
+async def get_metrics(request):
+    totals = await sync_to_async(collect)()
+    return HttpResponse(render_metrics(totals), content_type=METRICS_CONTENT_TYPE)
+
+# Flux de stock des magasins : valeurs absolues (stock) ou variations (delta), par lots.
+# Réservé aux flux authentifiés par le jeton partagé (cf. equipements/tokens.py)
+@api.post("/stock", auth=StockFeedAuth())
+async def post_stock(request, payload: List[StockUpdate]):
+    if len(payload) > settings.STOCK_FEED_MAX_UPDATES:
+        return JsonResponse({"error": f"{settings.STOCK_FEED_MAX_UPDATES} mises à jour maximum"}, status=422)
+    try:
+        updates = [parse_update(update.dict()) for update in payload]
+    except StockFeedError as exc:
+        return JsonResponse({"error": str(exc)}, status=400)
+    return JsonResponse(await sync_to_async(apply_stock_updates)(updates))
+
+# Traduction de textes (interface, fiches produits) avec mémoire de traduction :
+# seuls les textes jamais traduits partent vers le service (DeepL par défaut),
+# dans la limite d'un quota de caractères par client
+@api.post("/translate")
+async def post_translate(request, payload: TranslateInput):
+    source, target = payload.source.lower(), payload.target.lower()
+    if {source, target} - set(settings.TRANSLATION_LANGUAGES):
+        return JsonResponse({"error": "langue non supportee"}, status=400)
+    if len(payload.texts) > settings.TRANSLATION_MAX_TEXTS:
+        return JsonResponse({"error": f"{settings.TRANSLATION_MAX_TEXTS} textes maximum"}, status=400)
+    if any(len(text) > settings.TRANSLATION_MAX_TEXT_CHARS for text in payload.texts):
+        return JsonResponse({"error": f"{settings.TRANSLATION_MAX_TEXT_CHARS} caracteres maximum par texte"}, status=422)
+    if sum(len(text) for text in payload.texts) > settings.TRANSLATION_MAX_TOTAL_CHARS:
+        return JsonResponse({"error": f"{settings.TRANSLATION_MAX_TOTAL_CHARS} caracteres maximum"}, status=422)
+    try:
+        translations = await translate_texts(payload.texts, source, target, client=client_address(request))
+    except TranslationQuotaError as exc:
+        response = JsonResponse({"error": str(exc)}, status=429)
+        response["Retry-After"] = str(exc.retry_after)
+        return response
+    except TranslationBackendError as exc:
+        return JsonResponse({"error": str(exc)}, status=502)
+    return JsonResponse({"translations": [translations.get(text, text) for text in payload.texts]})
 
 #Récupère tous les sports
 @api.get("/sports")
-def get_sport(request):
+@catalog_condition
+@precompressed
+async def get_sport(request):
     result = [
         {
             "key": sport[0],
@@ -76,43 +478,63 @@ def get_sport(request):
     return JsonResponse(result, safe=False)
 
 @api.post("/register")
-def post_register(request,payload:UserInput):
+async def post_register(request,payload:UserInput):
     username = payload.name.strip().lower()
-    if User.objects.filter(username__iexact=username).exists():
+    if await User.objects.filter(username_normalized=normalize_username(username)).aexists():
         return JsonResponse({'error': 'Utilisateur existant'}, status=400)
 
-    nouvel_user = User.objects.create(
+    nouvel_user = User(
         username=username,
         sportsPratique=payload.sport,
         niveauSportif=payload.niveauSportif,
+        password=await hashing.make_password(payload.password),
     )
-    nouvel_user.set_password(payload.password)
-    nouvel_user.save()
+    try:
+        await nouvel_user.asave()
+    except IntegrityError:
+        # Inscription concurrente du même nom (index unique sur username_normalized)
+        return JsonResponse({'error': 'Utilisateur existant'}, status=400)
     return 'success'
 
+def login_response(user):
+    # Le mot de passe n'est vérifié qu'ici : les endpoints protégés ne
+    # vérifient ensuite que la signature du jeton (cf. equipements/tokens.py).
+    return JsonResponse({
+        'bravo : ' : user.id,
+        'token': issue_token(user),
+        'expires_in': settings.AUTH_TOKEN_MAX_AGE,
+    }, status=200)
+
 @api.post("/login")
-def login(request,payload:LoginInput):
-    username = payload.name.strip().lower()
-    user = User.objects.filter(username__iexact=username).first()
+async def login(request,payload:LoginInput):
+    user = await User.objects.filter(username_normalized=normalize_username(payload.name)).afirst()
     if user is None:
         return JsonResponse({'error : ' : 'utilisateurs ou mot de passe non valide'},status=400)
 
-    if check_password(payload.password, user.password):
-        return JsonResponse({'bravo : ' : user.id},status=200)
+    if await hashing.check_password(payload.password, user.password):
+        return login_response(user)
 
     # Compatibilite comptes legacy en mot de passe non hashe.
     if user.password == payload.password:
-        user.set_password(payload.password)
-        user.save(update_fields=["password"])
-        return JsonResponse({'bravo : ' : user.id},status=200)
+        user.password = await hashing.make_password(payload.password)
+        await user.asave(update_fields=["password"])
+        return login_response(user)
 
     return JsonResponse({'error : ' : 'utilisateurs ou mot de passe non valide'},status=400)
 
-@api.get("/user/:name")
-def get_user(request, name: str):
-    u = User.objects.filter(username=name).first()
+@api.post("/logout", auth=TokenAuth())
+async def logout(request):
+    await sync_to_async(revoke_token)(request.auth)
+    return "Success"
+
+# Profil accessible uniquement avec le jeton de son propriétaire
+@api.get("/user/:name", auth=TokenAuth())
+async def get_user(request, name: str):
+    u = await User.objects.filter(username_normalized=normalize_username(name)).afirst()
     if u is None:
         return JsonResponse({"error": "Utilisateur non existant"}, status=404)
+    if u.id != request.auth["uid"]:
+        return JsonResponse({"error": "Acces refuse"}, status=403)
     return JsonResponse({
         "id": u.id,
         "name": u.username,
@@ -120,19 +542,41 @@ def get_user(request, name: str):
         "level": u.niveauSportif
     }, status=200)
 
-@api.put("/user/:name")
-def put_user(request, name: str, payload: UserEdit):
-    u = User.objects.filter(username=name)
-    if not u:
+# Produits conseillés pour le sport et le niveau du profil, lus dans le
+# top-K précalculé (cf. equipements/recommendations.py)
+@api.get("/user/:name/recommendations", auth=TokenAuth())
+async def get_user_recommendations(request, name: str):
+    u = await User.objects.filter(username_normalized=normalize_username(name)).values_list(
+        "id", "sportsPratique", "niveauSportif").afirst()
+    if u is None:
+        return JsonResponse({"error": "Utilisateur non existant"}, status=404)
+    if u[0] != request.auth["uid"]:
+        return JsonResponse({"error": "Acces refuse"}, status=403)
+    product_ids = [product_id async for product_id in recommended_product_ids(*user_segment(u[1], u[2]))]
+    # Cache catalogue synchronisé avec la version (écritures d'autres processus)
+    await catalog_version(request)
+    result = await sync_to_async(cached_products_to_response)(Product.objects.filter(pk__in=product_ids), product_ids)
+    return JsonResponse(result, safe=False)
+
+@api.put("/user/:name", auth=TokenAuth())
+async def put_user(request, name: str, payload: UserEdit):
+    user_id = await User.objects.filter(username_normalized=normalize_username(name)).values_list("id", flat=True).afirst()
+    if user_id is None:
         return JsonResponse({"error": "Utilisateur non existant"}, status=404)
+    if user_id != request.auth["uid"]:
+        return JsonResponse({"error": "Acces refuse"}, status=403)
     
     modifications = dict()
     if payload.name:
-        modifications |= {"username": payload.name}
+        # update() ne passe pas par User.save() : forme normalisée mise à jour ici
+        username_normalized = normalize_username(payload.name)
+        if await User.objects.filter(username_normalized=username_normalized).exclude(pk=user_id).aexists():
+            return JsonResponse({"error": "Utilisateur existant"}, status=400)
+        modifications |= {"username": payload.name, "username_normalized": username_normalized}
     if payload.sport:
         modifications |= {"sportsPratique": payload.sport}
     if payload.level:
         modifications |= {"niveauSportif": payload.level}
         
-    u.update(**modifications)
+    await User.objects.filter(pk=user_id).aupdate(**modifications)
     return "Success"
@@ -9,8 +9,14 @@ https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.core.management import call_command
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'projetagilite.settings')
 
 application = get_asgi_application()
+
+# Pré-chargement du cache catalogue dans ce processus (avant fork si --preload).
+if settings.CATALOG_CACHE_WARM_ON_STARTUP:
+    call_command("warm_catalog_cache")
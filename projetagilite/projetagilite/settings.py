@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'equipements.metrics.MetricsMiddleware',
+    'equipements.querybudget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,15 +76,163 @@ WSGI_APPLICATION = 'projetagilite.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Connexions fermées en fin de requête par défaut : en ASGI, chaque requête a
+# son propre thread et des connexions persistantes s'y accumuleraient. En WSGI
+# (threads réutilisés), DJANGO_CONN_MAX_AGE=600 les conserve entre requêtes
+# (vérifiées avant réutilisation), cf. README.
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DJANGO_CONN_MAX_AGE', 0))
+
+# Réglages SQLite appliqués à chaque connexion : WAL (lecteurs et écrivain ne
+# se bloquent pas), fsync seulement aux checkpoints, 64 Mo de cache de pages,
+# 256 Mo de fichier mappé en mémoire.
+SQLITE_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL;'
+    'PRAGMA cache_size=-65536;'
+    'PRAGMA mmap_size=268435456;'
+    'PRAGMA temp_store=MEMORY;'
+)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL;' + SQLITE_PRAGMAS,
+            # Verrou d'écriture pris dès BEGIN : pas d'échec immédiat
+            # "database is locked" quand une lecture veut devenir écriture
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    },
+    # Même fichier, ouvert en lecture seule : lectures du catalogue
+    # (equipements/routers.py). Pas de base séparée en test.
+    'catalog_read': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        # URI SQLite : chemin encodé par as_uri() (caractères ?, #, %, Windows)
+        'NAME': (BASE_DIR / 'db.sqlite3').as_uri() + '?mode=ro',
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': SQLITE_PRAGMAS + 'PRAGMA query_only=ON;',
+            'timeout': 20,
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+DATABASE_ROUTERS = ['equipements.routers.CatalogReadRouter']
+CATALOG_READ_DATABASE = 'catalog_read'
 
 AUTH_USER_MODEL = 'equipements.User'
 
+# Cache catalogue en mémoire, par processus (equipements/cache.py)
+CATALOG_CACHE_SIZE = 10000
+CATALOG_CACHE_WARM_ON_STARTUP = False
+
+# Réponses catalogue gardées compressées (gzip, et brotli si le paquet est
+# installé) par version du catalogue, cf. equipements/compression.py
+COMPRESSED_RESPONSES_MAX_BYTES = 64 * 1024 * 1024
+COMPRESSION_MIN_SIZE = 512
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 6
+
+# Variantes des images du catalogue (equipements/images.py) : côté maximal en
+# pixels par variante, encodage WebP. Fichiers gardés dans IMAGE_CACHE_DIR ;
+# les chemins relatifs des images sources sont lus sous IMAGE_SOURCE_ROOT (le
+# front, où se trouvent les /src/assets/... du catalogue).
+IMAGE_VARIANTS = {'thumbnail': 160, 'card': 480, 'detail': 1200}
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_CACHE_DIR = Path(os.environ.get('DJANGO_IMAGE_CACHE_DIR', BASE_DIR / 'image_cache'))
+IMAGE_SOURCE_ROOT = Path(os.environ.get('DJANGO_IMAGE_SOURCE_ROOT', BASE_DIR.parent / 'front'))
+IMAGE_FETCH_TIMEOUT = 10
+IMAGE_MAX_SOURCE_BYTES = 20 * 1024 * 1024
+
+# /products/batch : nombre maximal d'ids par appel
+PRODUCT_BATCH_MAX_IDS = 500
+
+# POST /stock : jeton partagé des flux de stock (en-tête X-Stock-Feed-Token,
+# refusé s'il est vide) et nombre maximal de mises à jour par appel
+STOCK_FEED_TOKEN = os.environ.get('DJANGO_STOCK_FEED_TOKEN', '')
+STOCK_FEED_MAX_UPDATES = 5000
+
+# /products/:product_id/stores : nombre maximal de magasins demandés (k)
+NEAREST_STORES_MAX_K = 20
+
+# /products/facets : bornes des tranches de prix, résultats gardés en cache
+FACET_PRICE_BUCKETS = [0, 20, 50, 100, 200, 500]
+FACET_CACHE_SIZE = 256
+
+# /user/:name/recommendations : produits gardés par (sport, niveau)
+RECOMMENDATIONS_TOP_K = 20
+
+# Langues du catalogue : la langue source est stockée dans Product, les autres
+# dans ProductTranslation (commande translate_catalog), choisies par ?lang= ou Accept-Language
+CATALOG_SOURCE_LANGUAGE = 'fr'
+CATALOG_LANGUAGES = ['fr', 'en']
+
+# /translate : service de traduction appelé pour les textes absents de la
+# mémoire de traduction (equipements/translation.py)
+TRANSLATION_BACKEND = os.environ.get('DJANGO_TRANSLATION_BACKEND', 'equipements.translation.DeepLBackend')
+TRANSLATION_LANGUAGES = ['fr', 'en']
+TRANSLATION_MAX_TEXTS = 500
+# Caractères maximum par texte et par appel ; caractères envoyés au service par
+# client (adresse IP, cf. TRUSTED_PROXIES) et par fenêtre de TRANSLATION_CLIENT_WINDOW secondes
+TRANSLATION_MAX_TEXT_CHARS = 5000
+TRANSLATION_MAX_TOTAL_CHARS = 50_000
+TRANSLATION_CLIENT_CHARS = 50_000
+TRANSLATION_CLIENT_WINDOW = 3600
+# Proxys de confiance devant le serveur (ex: 1 derrière nginx), qui ajoutent
+# chacun l'adresse vue à X-Forwarded-For : adresse du client pour le quota de
+# /translate. 0 : REMOTE_ADDR, X-Forwarded-For (falsifiable) ignoré.
+TRUSTED_PROXIES = int(os.environ.get('DJANGO_TRUSTED_PROXIES', '0'))
+TRANSLATION_TIMEOUT = 10
+TRANSLATION_WORKERS = 4
+DEEPL_API_URL = os.environ.get('DEEPL_API_URL', 'https://api-free.deepl.com/v2/translate')
+DEEPL_API_KEY = os.environ.get('DEEPL_API_KEY', '')
+
+# /metrics (equipements/metrics.py) : avec plusieurs processus (gunicorn -w N),
+# répertoire partagé où chacun écrit ses compteurs, au plus toutes les
+# METRICS_FLUSH_INTERVAL secondes. À vider au démarrage du serveur.
+METRICS_DIR = os.environ.get('DJANGO_METRICS_DIR')
+METRICS_FLUSH_INTERVAL = 1.0
+
+# Budget de requêtes SQL par endpoint de l'API (equipements/querybudget.py) ;
+# les requêtes des endpoints absents de la table ne sont pas enregistrées. Les
+# endpoints authentifiés comptent la vérification de révocation du jeton.
+QUERY_BUDGETS = {
+    'GET /products': 5,
+    'GET /products/:product_id': 5,
+    'GET /products/:product_id/stores': 5,
+    'GET /products/search': 5,
+    'GET /products/facets': 2,
+    'GET /products/batch': 4,
+    'POST /products/batch': 4,
+    'GET /sports': 1,
+    'GET /catalog/cache': 0,
+    'GET /metrics': 0,
+    'GET /images': 3,
+    'GET /images/:digest': 0,
+    'POST /register': 2,
+    'POST /login': 2,
+    'GET /user/:name': 2,
+    'PUT /user/:name': 4,
+    'GET /user/:name/recommendations': 7,
+    'POST /logout': 3,
+    'POST /stock': 5,
+    'POST /translate': 2,
+}
+# Nombre de requêtes de même gabarit à partir duquel on signale un N+1
+QUERY_BUDGET_REPEAT_THRESHOLD = 3
+# True : un dépassement lève QueryBudgetExceeded au lieu d'un warning
+QUERY_BUDGET_STRICT = False
+
+# Durée de validité (secondes) des jetons délivrés par /login (equipements/tokens.py)
+AUTH_TOKEN_MAX_AGE = 60 * 60 * 12
+
+# Threads dédiés au hachage des mots de passe (/login, /register, cf. equipements/hashing.py)
+PASSWORD_HASHING_WORKERS = os.cpu_count() or 1
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators